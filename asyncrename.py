@@ -0,0 +1,261 @@
+"""asyncio engine renaming many directories concurrently.
+
+Each directory is a job run by its own exiftool process. A semaphore bounds
+how many of them run at the same time. The output of every job can be
+streamed as it comes, and any job can be cancelled or given a timeout without
+disturbing the others:
+
+    async def rename_cards(exiftool, directories):
+        engine = asyncrename.AsyncRenameEngine(exiftool, max_jobs=4)
+        jobs = [engine.submit(directory, "Card_", ["*.*"], True, timeout=3600)
+                for directory in directories]
+        async for stream, line in jobs[0].iter_output():
+            print(line, end="")
+        await engine.wait(jobs)
+        return [job.results for job in jobs]
+
+From a thread that doesn't run the event loop (ex. a GUI), submit the
+coroutines with asyncio.run_coroutine_threadsafe().
+
+"""
+
+# Public
+import asyncio
+import os
+
+# Internal
+import exiftoolwrap
+import metrics
+
+
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_CANCELLED = "cancelled"
+JOB_STATUS_TIMED_OUT = "timed out"
+JOB_STATUS_FAILED = "failed"
+
+
+class RenameJob:
+    """Rename of one directory. Created by AsyncRenameEngine.submit()."""
+
+    directory = None
+
+    # One of the JOB_STATUS_* values
+    status = JOB_STATUS_PENDING
+
+    # exiftool's exit code, None until it exits
+    returncode = None
+
+    # List of exiftoolwrap.RenameResult once the job is over. Partial if the
+    # job was cancelled or timed out.
+    results = None
+
+    # Why the job failed, for JOB_STATUS_FAILED
+    error = None
+
+    _args = None
+    _timeout = None
+    _task = None
+
+    # (stream, line) tuples not consumed by iter_output() yet, None at the
+    # end. Only created once iter_output() is called, so the output of jobs
+    # nobody follows isn't kept.
+    _output_queue = None
+
+    # Results parsed as the output comes
+    _parser = None
+    _results = None
+
+
+    def __init__(self, directory, args, timeout):
+        self.directory = directory
+        self._args = args
+        self._timeout = timeout
+        self._parser = exiftoolwrap.RenameOutputParser()
+        self._results = []
+
+
+    #
+    # Public
+    #
+
+    async def iter_output(self):
+        """Async generator that yields the (stream, line) tuples of the
+        exiftool output as they are produced, until the job ends.
+
+        Only one consumer may iterate. Lines produced before the iteration
+        started are not yielded.
+
+        """
+
+        if self._output_queue == None:
+            if self.is_done():
+                return
+            self._output_queue = asyncio.Queue()
+
+        while True:
+            item = await self._output_queue.get()
+            if item == None:
+                self._output_queue = None
+                return
+            yield item
+
+
+    def cancel(self):
+        """Stops the job. Its exiftool process is killed if it was started."""
+
+        if self._task != None:
+            self._task.cancel()
+
+
+    async def wait(self):
+        """Waits for the job to end. return: self.results"""
+
+        try:
+            await asyncio.shield(self._task)
+        except asyncio.CancelledError:
+            if not self._task.cancelled():
+                # We were cancelled, not the job
+                raise
+        return self.results
+
+
+    def is_done(self):
+        return self.status not in (JOB_STATUS_PENDING, JOB_STATUS_RUNNING)
+
+
+class AsyncRenameEngine:
+    """Runs RenameJob concurrently, at most max_jobs at a time."""
+
+    # Default maximum number of exiftool processes running at the same time
+    DEFAULT_MAX_JOBS = 4
+
+    _exiftool = None
+    _max_jobs = DEFAULT_MAX_JOBS
+    _semaphore = None
+
+
+    def __init__(self, exiftool, max_jobs=None):
+        """
+        Parameters:
+            exiftool: an installed exiftoolwrap.ExiftoolWrap. Only used to find
+                       the executable and build the arguments.
+
+            max_jobs: maximum number of exiftool processes running at the same
+                       time. Defaults to the number of CPU cores, at most
+                       DEFAULT_MAX_JOBS.
+
+        """
+
+        self._exiftool = exiftool
+        if max_jobs == None:
+            max_jobs = min(os.cpu_count() or 1, self.DEFAULT_MAX_JOBS)
+        self._max_jobs = max(1, max_jobs)
+
+
+    #
+    # Public
+    #
+
+    def submit(self, directory, prefix, file_types, use_date_time, timeout=None):
+        """Queues the rename of directory. Must be called from the event loop.
+
+        The directory is renamed by a single exiftool command. It can't
+        group companions nor tell which of several date tags each date came
+        from, see photorenamecore.needs_planned_rename().
+
+        Parameters:
+            timeout: seconds the job may run once started. None for no limit.
+
+            See ExiftoolWrap.launch_file_rename() for the other parameters.
+
+        return: the RenameJob, already scheduled. It fails without running
+                exiftool if file_types selects nothing.
+
+        """
+
+        if self._semaphore == None:
+            # Created here so it belongs to the running loop
+            self._semaphore = asyncio.Semaphore(self._max_jobs)
+
+        job = RenameJob(
+            directory,
+            self._exiftool.get_rename_args(directory, prefix, file_types, use_date_time),
+            timeout)
+        job._task = asyncio.ensure_future(self._run(job))
+        return job
+
+
+    async def wait(self, jobs):
+        """Waits for all the jobs to end, whatever their outcome."""
+
+        for job in jobs:
+            await job.wait()
+
+    #
+    # Private
+    #
+
+    async def _run(self, job):
+        try:
+            if job._args == None:
+                job.status = JOB_STATUS_FAILED
+                job.error = "No file types selected"
+                return
+            async with self._semaphore:
+                job.status = JOB_STATUS_RUNNING
+                with metrics.span("async_job"):
+                    await asyncio.wait_for(self._execute(job), job._timeout)
+                job.status = JOB_STATUS_DONE
+        except asyncio.TimeoutError:
+            job.status = JOB_STATUS_TIMED_OUT
+        except asyncio.CancelledError:
+            job.status = JOB_STATUS_CANCELLED
+            raise
+        except OSError as e:
+            job.status = JOB_STATUS_FAILED
+            job.error = str(e)
+        finally:
+            job.results = job._results
+            if job._output_queue != None:
+                job._output_queue.put_nowait(None)
+
+
+    async def _execute(self, job):
+        argv, argfile_path = exiftoolwrap.make_command(
+            self._exiftool.get_executable_args(), job._args)
+        try:
+            metrics.add("processes")
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+
+            try:
+                await asyncio.gather(
+                    self._read_stream(job, process.stdout, exiftoolwrap.ExiftoolSession.STREAM_STDOUT),
+                    self._read_stream(job, process.stderr, exiftoolwrap.ExiftoolSession.STREAM_STDERR))
+                job.returncode = await process.wait()
+            finally:
+                if process.returncode == None:
+                    # Cancelled or timed out
+                    process.kill()
+                    await asyncio.shield(process.wait())
+        finally:
+            if argfile_path != None:
+                os.remove(argfile_path)
+
+
+    async def _read_stream(self, job, stream_reader, stream):
+        while True:
+            line = await stream_reader.readline()
+            if not line:
+                return
+            line = line.decode("utf-8", errors="replace")
+            event = job._parser.parse_line(line)
+            if isinstance(event, exiftoolwrap.RenameResult):
+                job._results.append(event)
+            if job._output_queue != None:
+                job._output_queue.put_nowait((stream, line))
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""Performance measurements of photorename.
+
+    benchmark.py corpus DIRECTORY [--files N] [--depth N] [--duplicates RATIO]
+    benchmark.py rename DIRECTORY [--exiftool PATH] [--scenario NAME...]
+    benchmark.py exifreader DIRECTORY [--exiftool PATH]
+    benchmark.py startup [--exiftool PATH] [--repeat N]
+    benchmark.py invocation [--exiftool PATH] [--repeat N] [--files N]
+
+corpus: writes a synthetic corpus of photos, RAW-like files, movies and
+    unparseable files to DIRECTORY. See benchmarkcorpus.
+
+rename: renames a copy of the corpus in DIRECTORY with each scenario and
+    reports files/s, the p50/p99 duration of a batch and the peak RSS of
+    photorename and of its exiftool processes. Each scenario runs in its own
+    process so their peak memory can be told apart. The scenarios are:
+        launch      one launch_file_rename() of "*.*" per directory
+        generator   the GUI's generator, one launch_file_rename() of the
+                    file types found in the directory, per directory
+        per-pattern one launch_file_rename() per file type and directory,
+                    the way the GUI used to
+        chunked     rename_file_list() of the recursive scan, per chunk
+        parallel    rename_file_list_in_parallel() of the recursive scan, per
+                    chunk
+
+exifreader: reads the date and time taken of every file of DIRECTORY
+    (recursively) with exifreader and with exiftool, and compares their
+    throughput. Then the same for the creation date of the movies, with
+    quicktimereader.
+
+startup: times finding exiftool at launch, and until its first answer, when
+    the configuration knows nothing about it ("validate"), when it remembers
+    the executable validated last time ("cached") and the way it was done
+    before the configuration remembered it ("legacy": detection, then
+    validation of the configured path).
+
+invocation: times a single exiftool command run through a shell with a
+    quoted command line ("shell", the way commands used to be run), run
+    directly from its argv ("argv") and sent to the running -stay_open
+    session ("session"). Then a command listing many files, with the files
+    on its command line ("argv-files") and in a -@ argument file
+    ("argfile").
+
+--exiftool defaults to exiftoolfake.py, which runs anywhere Python does. Its
+numbers measure photorename's own overhead rather than exiftool's.
+
+"""
+
+# Public
+import argparse
+import json
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Internal
+import benchmarkcorpus
+import dirscan
+import exifreader
+import exiftoolwrap
+import metrics
+import photorenamecore
+import quicktimereader
+
+
+FAKE_EXIFTOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exiftoolfake.py")
+
+RENAME_SCENARIOS = ("launch", "generator", "per-pattern", "chunked", "parallel")
+
+PREFIX = "Bench_"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="photorename benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    corpus_parser = subparsers.add_parser("corpus", help="write a synthetic corpus")
+    corpus_parser.add_argument("directory")
+    corpus_parser.add_argument("--files", type=int, default=10000,
+                               help="number of files (default: 10000)")
+    corpus_parser.add_argument("--depth", type=int, default=1,
+                               help="levels of sub-directories (default: 1)")
+    corpus_parser.add_argument("--duplicates", type=float, default=0.1,
+                               help="share of files with the date and time of "
+                               "the previous one (default: 0.1)")
+    corpus_parser.add_argument("--seed", type=int, default=0)
+
+    rename_parser = subparsers.add_parser("rename", help="benchmark the rename engines")
+    rename_parser.add_argument("directory", help="corpus to rename a copy of")
+    rename_parser.add_argument("--exiftool", default=FAKE_EXIFTOOL,
+                               help="path to the exiftool executable")
+    rename_parser.add_argument("--scenario", action="append", choices=RENAME_SCENARIOS,
+                               help="scenario to run, repeatable (default: all)")
+    rename_parser.add_argument("--workers", type=int, default=None,
+                               help="exiftool processes of the parallel scenario "
+                               "(default: number of CPU cores)")
+    rename_parser.add_argument("--chunk-size", type=int, default=dirscan.DEFAULT_CHUNK_SIZE,
+                               help="files per batch of the chunked and parallel "
+                               "scenarios")
+    rename_parser.add_argument("--json", action="store_true",
+                               help="print one JSON record per scenario")
+    # Used by the parent to run a single scenario in a child process
+    rename_parser.add_argument("--in-process", action="store_true",
+                               help=argparse.SUPPRESS)
+
+    exifreader_parser = subparsers.add_parser(
+        "exifreader", help="compare exifreader with exiftool")
+    exifreader_parser.add_argument("directory", help="photos to benchmark against")
+    exifreader_parser.add_argument("--exiftool", default=FAKE_EXIFTOOL,
+                                   help="path to the exiftool executable")
+
+    startup_parser = subparsers.add_parser("startup", help="time the exiftool discovery")
+    startup_parser.add_argument("--exiftool", default=FAKE_EXIFTOOL,
+                                help="path to the exiftool executable")
+    startup_parser.add_argument("--repeat", type=int, default=5,
+                                help="runs per scenario, the median is reported")
+
+    invocation_parser = subparsers.add_parser(
+        "invocation", help="time the ways of running an exiftool command")
+    invocation_parser.add_argument("--exiftool", default=FAKE_EXIFTOOL,
+                                   help="path to the exiftool executable")
+    invocation_parser.add_argument("--repeat", type=int, default=20,
+                                   help="runs per scenario, the median is reported")
+    invocation_parser.add_argument("--files", type=int, default=2000,
+                                   help="files listed in the argfile scenario "
+                                   "(default: 2000)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "corpus":
+        return _generate_corpus(args)
+    elif args.command == "startup":
+        return benchmark_startup(os.path.abspath(args.exiftool), args.repeat)
+    elif args.command == "invocation":
+        return benchmark_invocation(os.path.abspath(args.exiftool), args.repeat, args.files)
+    elif args.command == "rename":
+        if args.in_process:
+            return _run_rename_scenario(args)
+        return _benchmark_rename(args)
+
+    exiftool = exiftoolwrap.ExiftoolWrap()
+    if not exiftool.set_exiftool_path_manually(args.exiftool):
+        print("Error: Invalid exiftool executable " + args.exiftool, file=sys.stderr)
+        return 2
+
+    try:
+        benchmark_exifreader(exiftool, args.directory)
+    finally:
+        exiftool.close()
+    return 0
+
+
+def benchmark_exifreader(exiftool, directory):
+    """Compares exifreader with exiftool on the files of directory."""
+
+    files = list(dirscan.scan_files(directory, recursive=True))
+    if not files:
+        print("No files in " + directory)
+        return
+
+    start = time.perf_counter()
+    native_tags = [exifreader.read_date_time_original(file) for file in files]
+    native_duration = time.perf_counter() - start
+    native_count = len([tags for tags in native_tags if tags != None])
+
+    # Start the session beforehand so only the reading is measured
+    exiftool.read_tags(files[:1], ["DateTimeOriginal"], workers=1)
+    start = time.perf_counter()
+    exiftool_tags = exiftool.read_tags(
+        files, list(exifreader.EXIF_TAGS.values()), workers=1)
+    exiftool_duration = time.perf_counter() - start
+    exiftool_count = len([tags for tags in exiftool_tags.values()
+                          if "DateTimeOriginal" in tags])
+
+    _print_throughput("exifreader", len(files), native_count, native_duration)
+    _print_throughput("exiftool", len(files), exiftool_count, exiftool_duration)
+    if native_duration > 0:
+        print("exifreader is %.1fx faster" % (exiftool_duration / native_duration))
+
+    movie_files = [file for file in files if quicktimereader.read_date_tags(file) != None]
+    if not movie_files:
+        return
+
+    start = time.perf_counter()
+    native_tags = [quicktimereader.read_date_tags(file) for file in movie_files]
+    native_duration = time.perf_counter() - start
+    native_count = len([tags for tags in native_tags if "CreateDate" in tags])
+
+    start = time.perf_counter()
+    exiftool_tags = exiftool.read_tags(movie_files, ["CreateDate"], workers=1)
+    exiftool_duration = time.perf_counter() - start
+    exiftool_count = len([tags for tags in exiftool_tags.values()
+                          if "CreateDate" in tags])
+
+    _print_throughput("quicktimereader", len(movie_files), native_count, native_duration)
+    _print_throughput("exiftool", len(movie_files), exiftool_count, exiftool_duration)
+    if native_duration > 0:
+        print("quicktimereader is %.1fx faster" % (exiftool_duration / native_duration))
+
+
+def benchmark_startup(path_to_exiftool, repeat=5):
+    """Times the creation of the exiftool wrapper the way the applications do.
+
+    return: the exit code
+
+    """
+
+    with tempfile.TemporaryDirectory(prefix="photorename-bench-") as appdata_path:
+        exiftool = photorenamecore.create_exiftool(
+            {"PathToExiftool": path_to_exiftool}, appdata_path)
+        if not exiftool.is_installed():
+            print("Error: Invalid exiftool executable " + path_to_exiftool, file=sys.stderr)
+            return 2
+        cached_info = {}
+        photorenamecore.set_exiftool_info(cached_info, exiftool)
+        exiftool.close()
+
+        def legacy():
+            exiftool = exiftoolwrap.ExiftoolWrap(appdata_path)
+            exiftool.set_exiftool_path_manually(path_to_exiftool)
+            return exiftool
+
+        scenarios = (("legacy", legacy),
+                     ("validate", lambda: photorenamecore.create_exiftool(
+                         {"PathToExiftool": path_to_exiftool}, appdata_path)),
+                     ("cached", lambda: photorenamecore.create_exiftool(
+                         cached_info, appdata_path)))
+
+        print("%-10s %12s %18s %10s" % ("scenario", "startup ms", "first answer ms",
+                                        "processes"))
+        metrics_were_enabled = metrics.is_enabled()
+        metrics.enable(None)
+        try:
+            for name, create_exiftool in scenarios:
+                startup_durations = []
+                answer_durations = []
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    exiftool = create_exiftool()
+                    startup_durations.append(time.perf_counter() - start)
+                    exiftool.verify_installation()
+                    exiftool.read_tags([path_to_exiftool], ["DateTimeOriginal"], workers=1)
+                    answer_durations.append(time.perf_counter() - start)
+                    exiftool.close()
+                processes = metrics.end_run("startup")["counters"].get("processes", 0)
+
+                print("%-10s %12.1f %18.1f %10.1f" % (
+                    name, _percentile(sorted(startup_durations), 50) * 1000,
+                    _percentile(sorted(answer_durations), 50) * 1000,
+                    processes / float(repeat)))
+        finally:
+            if not metrics_were_enabled:
+                metrics.disable()
+
+    return 0
+
+
+def benchmark_invocation(path_to_exiftool, repeat=20, file_count=2000):
+    """Times the overhead of each way of running an exiftool command.
+
+    return: the exit code
+
+    """
+
+    executable_args = exiftoolwrap.make_executable_args(path_to_exiftool)
+    args = ["-ver"]
+
+    with tempfile.TemporaryDirectory(prefix="photorename-bench-") as directory:
+        # Files exiftool won't find, so only the argument handling is timed
+        file_args = ["-ver"] + [os.path.join(directory, "IMG_%06d.jpg" % i)
+                                for i in range(file_count)]
+
+        def shell():
+            subprocess.run(subprocess.list2cmdline(executable_args + args), shell=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+        def argv():
+            subprocess.run(exiftoolwrap.make_command(executable_args, args)[0],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+        def argv_files():
+            subprocess.run(executable_args + file_args, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=True)
+
+        def argfile():
+            command, argfile_path = exiftoolwrap.make_command(executable_args, file_args)
+            try:
+                subprocess.run(command, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, check=True)
+            finally:
+                if argfile_path != None:
+                    os.remove(argfile_path)
+
+        session = exiftoolwrap.ExiftoolSession(executable_args)
+        try:
+            session.start()
+            scenarios = (("shell", shell),
+                         ("argv", argv),
+                         ("session", lambda: session.execute(args)),
+                         ("argv-files", argv_files),
+                         ("argfile", argfile))
+
+            print("%-10s %10s" % ("scenario", "ms"))
+            durations_by_name = {}
+            for name, run in scenarios:
+                durations = []
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    run()
+                    durations.append(time.perf_counter() - start)
+                durations_by_name[name] = _percentile(sorted(durations), 50)
+                print("%-10s %10.1f" % (name, durations_by_name[name] * 1000))
+        finally:
+            session.close()
+
+    print("shell - argv: %+.1f ms per command, argv - session: %+.1f ms, "
+          "argfile - argv-files: %+.1f ms" % (
+              (durations_by_name["shell"] - durations_by_name["argv"]) * 1000,
+              (durations_by_name["argv"] - durations_by_name["session"]) * 1000,
+              (durations_by_name["argfile"] - durations_by_name["argv-files"]) * 1000))
+    return 0
+
+
+def run_rename_scenario(exiftool, scenario, directory, workers=None,
+                        chunk_size=dirscan.DEFAULT_CHUNK_SIZE):
+    """Renames the files of directory with one of RENAME_SCENARIOS.
+
+    return: list of (file_count, duration) per batch, where a batch is an
+            exiftool command or a chunk of files
+
+    """
+
+    batches = []
+    if scenario in ("chunked", "parallel"):
+        files = dirscan.scan_files(directory, recursive=True)
+        for chunk in dirscan.iter_chunks(files, chunk_size):
+            start = time.perf_counter()
+            if scenario == "chunked":
+                for result in exiftool.rename_file_list(chunk, PREFIX, True, chunk_size):
+                    pass
+            else:
+                exiftool.rename_file_list_in_parallel(chunk, PREFIX, True, workers)
+            batches.append((len(chunk), time.perf_counter() - start))
+        return batches
+
+    for path, names in _list_directories(directory):
+        file_types = sorted(set("*" + os.path.splitext(name)[1].lower() for name in names))
+        if scenario == "launch":
+            commands = [(len(names), ["*.*"])]
+        elif scenario == "generator":
+            commands = [(len(names), file_types)]
+        else:
+            commands = [(_count_file_type(names, file_type), [file_type])
+                        for file_type in file_types]
+
+        for file_count, command_file_types in commands:
+            start = time.perf_counter()
+            command = exiftool.launch_file_rename(path, PREFIX, command_file_types, True)[1]
+            command.communicate()
+            batches.append((file_count, time.perf_counter() - start))
+
+    return batches
+
+#
+# Private
+#
+
+def _generate_corpus(args):
+    start = time.perf_counter()
+    counts = benchmarkcorpus.generate_corpus(
+        args.directory, args.files, depth=args.depth,
+        duplicate_ratio=args.duplicates, seed=args.seed)
+    duration = time.perf_counter() - start
+
+    for extension, count in sorted(counts.items()):
+        print("%-12s %8d files" % (extension, count))
+    print("Wrote %d files to %s in %.1f s" % (sum(counts.values()), args.directory, duration))
+    return 0
+
+
+def _benchmark_rename(args):
+    scenarios = args.scenario or RENAME_SCENARIOS
+    if not args.json:
+        print("%-12s %8s %8s %10s %9s %9s %10s %10s" % (
+            "scenario", "files", "batches", "files/s", "p50 ms", "p99 ms",
+            "RSS MB", "exiftool MB"))
+
+    exit_code = 0
+    for scenario in scenarios:
+        child_args = [sys.executable, os.path.abspath(__file__), "rename", args.directory,
+                      "--exiftool", args.exiftool, "--scenario", scenario,
+                      "--chunk-size", str(args.chunk_size), "--in-process"]
+        if args.workers != None:
+            child_args += ["--workers", str(args.workers)]
+
+        child = subprocess.run(child_args, stdout=subprocess.PIPE, universal_newlines=True)
+        if child.returncode != 0:
+            print("Error: Scenario " + scenario + " failed", file=sys.stderr)
+            exit_code = 1
+            continue
+
+        record = json.loads(child.stdout.splitlines()[-1])
+        if args.json:
+            print(json.dumps(record))
+        else:
+            _print_rename_record(record)
+
+    return exit_code
+
+
+def _run_rename_scenario(args):
+    """Runs a single scenario on a copy of the corpus and prints its JSON
+    record.
+
+    """
+
+    scenario = args.scenario[0]
+    with tempfile.TemporaryDirectory(prefix="photorename-bench-") as temp_path:
+        directory = os.path.join(temp_path, "corpus")
+        shutil.copytree(args.directory, directory)
+
+        exiftool = exiftoolwrap.ExiftoolWrap()
+        if not exiftool.set_exiftool_path_manually(args.exiftool):
+            print("Error: Invalid exiftool executable " + args.exiftool, file=sys.stderr)
+            return 2
+
+        try:
+            start = time.perf_counter()
+            batches = run_rename_scenario(
+                exiftool, scenario, directory, args.workers, args.chunk_size)
+            duration = time.perf_counter() - start
+        finally:
+            # Once closed, the exiftool processes count in RUSAGE_CHILDREN
+            exiftool.close()
+
+    file_count = sum(count for count, batch_duration in batches)
+    batch_durations = sorted(batch_duration for count, batch_duration in batches)
+    record = {"scenario": scenario,
+              "files": file_count,
+              "batches": len(batches),
+              "duration": duration,
+              "files_per_second": file_count / max(duration, 1e-9),
+              "batch_p50": _percentile(batch_durations, 50),
+              "batch_p99": _percentile(batch_durations, 99),
+              "peak_rss": _get_peak_rss("self"),
+              "peak_rss_exiftool": _get_peak_rss("children")}
+    print(json.dumps(record))
+    return 0
+
+
+def _list_directories(directory):
+    """return: list of (path, file names) of the directories holding files"""
+
+    directories = []
+    for path, directory_names, names in os.walk(directory):
+        directory_names.sort()
+        names = [name for name in names if not name.startswith(".")]
+        if names:
+            directories.append((path, names))
+    return directories
+
+
+def _count_file_type(names, file_type):
+    extensions, patterns = dirscan.parse_file_types([file_type])
+    return len([name for name in names if dirscan.has_file_type(name, extensions, patterns)])
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def _get_peak_rss(who):
+    """return: peak resident set size in bytes of this process ("self") or of
+               its terminated child processes ("children"). None if unknown.
+
+    """
+
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+
+    usage = resource.getrusage(
+        resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    if sys.platform == "darwin":
+        return usage.ru_maxrss
+    return usage.ru_maxrss * 1024
+
+
+def _print_rename_record(record):
+    def megabytes(size):
+        if size == None:
+            return "?"
+        return "%.1f" % (size / (1024 * 1024))
+
+    print("%-12s %8d %8d %10.0f %9.1f %9.1f %10s %10s" % (
+        record["scenario"], record["files"], record["batches"],
+        record["files_per_second"], record["batch_p50"] * 1000,
+        record["batch_p99"] * 1000, megabytes(record["peak_rss"]),
+        megabytes(record["peak_rss_exiftool"])))
+
+
+def _print_throughput(name, file_count, found_count, duration):
+    print("%-15s %8d files %8d dates %8.3f s %10.0f files/s" % (
+        name, file_count, found_count, duration, file_count / max(duration, 1e-9)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
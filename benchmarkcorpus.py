@@ -0,0 +1,223 @@
+"""Synthetic photo corpus for the benchmarks.
+
+Generates a tree of small but well formed files:
+    - JPEGs with an EXIF DateTimeOriginal (and sometimes SubSecTimeOriginal)
+    - TIFF based RAW-like files (.cr2) with an EXIF DateTimeOriginal
+    - QuickTime movies (.mov) with a creation date in their mvhd atom only
+    - unparseable files: truncated JPEGs and random data (.dat)
+
+    counts = benchmarkcorpus.generate_corpus("/tmp/corpus", file_count=10000,
+                                             depth=2, duplicate_ratio=0.2)
+
+The content is derived from seed so the same arguments always produce the
+same corpus.
+
+"""
+
+# Public
+import os
+import os.path
+import random
+import struct
+import time
+
+
+# Share of each kind of file in the corpus
+DEFAULT_MIX = (("jpg", 0.80), ("cr2", 0.10), ("mov", 0.05), ("dat", 0.03),
+               ("broken.jpg", 0.02))
+
+# Files per leaf directory
+DEFAULT_FILES_PER_DIRECTORY = 500
+
+# Directories per level of the tree
+_BRANCHING = 4
+
+# Seconds between 1904-01-01 (QuickTime epoch) and 1970-01-01
+_QUICKTIME_EPOCH_OFFSET = 2082844800
+
+_FIRST_DATE_TIME = 1325376000   # 2012-01-01 00:00:00 UTC
+
+#
+# Public
+#
+
+def generate_corpus(path, file_count, depth=0, duplicate_ratio=0.1, seed=0,
+                    files_per_directory=DEFAULT_FILES_PER_DIRECTORY, mix=DEFAULT_MIX):
+    """Writes a corpus of file_count files under path.
+
+    Parameters:
+        path: directory to create the corpus in. Created if needed.
+
+        file_count: number of files to write
+
+        depth: levels of sub-directories. 0 puts all the files in path.
+
+        duplicate_ratio: share of the files taken at the same second as the
+                   file before them, which makes exiftool use copy numbers
+                   (%-c)
+
+        seed: seed of the random generator
+
+        files_per_directory: files written to each leaf directory, new
+                   directories are added as needed
+
+        mix: list of (extension, share) of the kinds of files to write
+
+    return: dictionary of extension to the number of files written
+
+    """
+
+    rng = random.Random(seed)
+    directories = _iter_directories(path, depth)
+    directory = None
+    counts = dict((extension, 0) for extension, share in mix)
+
+    date_time = _FIRST_DATE_TIME
+    for index in range(file_count):
+        if index % files_per_directory == 0:
+            directory = next(directories)
+            os.makedirs(directory, exist_ok=True)
+
+        if index == 0 or rng.random() >= duplicate_ratio:
+            date_time += rng.randint(1, 120)
+
+        extension = _pick_extension(rng, mix)
+        counts[extension] += 1
+        file = os.path.join(directory, "IMG_%06d.%s" % (index, extension))
+        with open(file, "wb") as f:
+            f.write(_make_file_data(rng, extension, date_time))
+
+        # exiftool falls back to nothing for the broken files, but the file
+        # dates shouldn't all be "now" either
+        os.utime(file, (date_time, date_time))
+
+    return counts
+
+
+def make_jpeg(date_time, sub_sec=None, byte_order="II", payload_size=2048):
+    """return: bytes of a JPEG with an EXIF DateTimeOriginal
+
+    Parameters:
+        date_time: seconds since the epoch, written as UTC
+
+        sub_sec: optional SubSecTimeOriginal string (ex. "37")
+
+        byte_order: "II" (little endian) or "MM" (big endian) TIFF data
+
+        payload_size: bytes of fake scan data, to give the file some weight
+
+    """
+
+    exif_data = b"Exif\x00\x00" + make_tiff(date_time, sub_sec, byte_order)
+    jfif_data = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    return (b"\xff\xd8"
+            + b"\xff\xe0" + struct.pack(">H", len(jfif_data) + 2) + jfif_data
+            + b"\xff\xe1" + struct.pack(">H", len(exif_data) + 2) + exif_data
+            + b"\xff\xda" + struct.pack(">H", 2)
+            + b"\x00" * payload_size
+            + b"\xff\xd9")
+
+
+def make_tiff(date_time, sub_sec=None, byte_order="II", payload_size=0):
+    """return: bytes of a TIFF file (the layout of most RAW formats) holding an
+               EXIF IFD with DateTimeOriginal, and payload_size bytes of data.
+
+    """
+
+    endian = "<" if byte_order == "II" else ">"
+    values = [(0x9003, _format_date_time(date_time).encode("ascii") + b"\x00")]
+    if sub_sec != None:
+        values.append((0x9291, sub_sec.encode("ascii") + b"\x00"))
+
+    # Header, IFD0 with a single pointer to the EXIF IFD, EXIF IFD, values
+    ifd0_offset = 8
+    exif_offset = ifd0_offset + 2 + 12 + 4
+    value_offset = exif_offset + 2 + 12 * len(values) + 4
+
+    data = byte_order.encode("ascii") + struct.pack(endian + "HI", 42, ifd0_offset)
+    data += struct.pack(endian + "HHHII", 1, 0x8769, 4, 1, exif_offset)
+    data += struct.pack(endian + "I", 0)
+
+    entries = b""
+    value_data = b""
+    for tag, value in values:
+        if len(value) <= 4:
+            entries += struct.pack(endian + "HHI", tag, 2, len(value)) + value.ljust(4, b"\x00")
+        else:
+            entries += struct.pack(endian + "HHII", tag, 2, len(value),
+                                   value_offset + len(value_data))
+            value_data += value
+    data += struct.pack(endian + "H", len(values)) + entries + struct.pack(endian + "I", 0)
+    return data + value_data + b"\x00" * payload_size
+
+
+def make_quicktime(date_time, payload_size=2048):
+    """return: bytes of a minimal QuickTime movie whose mvhd atom was created
+               at date_time (seconds since the epoch, UTC).
+
+    """
+
+    quicktime_time = date_time + _QUICKTIME_EPOCH_OFFSET
+    # version 0: version/flags, creation, modification, time scale, duration,
+    # then rate, volume, matrix and next track ID we fill with zeros
+    mvhd = struct.pack(">IIIII", 0, quicktime_time, quicktime_time, 600, 600) + b"\x00" * 80
+    moov = _make_atom(b"moov", _make_atom(b"mvhd", mvhd))
+    ftyp = _make_atom(b"ftyp", b"qt  " + struct.pack(">I", 0) + b"qt  ")
+    mdat = _make_atom(b"mdat", b"\x00" * payload_size)
+    return ftyp + mdat + moov
+
+#
+# Private
+#
+
+def _iter_directories(path, depth):
+    """Generator that yields leaf directories, forever, breadth first."""
+
+    if depth == 0:
+        while True:
+            yield path
+
+    index = 0
+    while True:
+        parts = []
+        remainder = index
+        for level in range(depth):
+            parts.append("d%d" % (remainder % _BRANCHING))
+            remainder //= _BRANCHING
+        if remainder:
+            # All the leaves were used once, spread over more of them
+            parts[-1] += "_%d" % remainder
+        yield os.path.join(path, *reversed(parts))
+        index += 1
+
+
+def _pick_extension(rng, mix):
+    value = rng.random()
+    for extension, share in mix:
+        value -= share
+        if value < 0:
+            return extension
+    return mix[-1][0]
+
+
+def _make_file_data(rng, extension, date_time):
+    if extension == "jpg":
+        sub_sec = None
+        if rng.random() < 0.3:
+            sub_sec = "%02d" % rng.randint(0, 99)
+        return make_jpeg(date_time, sub_sec, rng.choice(("II", "MM")))
+    elif extension == "cr2":
+        return make_tiff(date_time, payload_size=4096)
+    elif extension == "mov":
+        return make_quicktime(date_time)
+    elif extension == "broken.jpg":
+        return make_jpeg(date_time)[:40]
+    return bytes(rng.getrandbits(8) for i in range(512))
+
+
+def _format_date_time(date_time):
+    return time.strftime("%Y:%m:%d %H:%M:%S", time.gmtime(date_time))
+
+
+def _make_atom(atom_type, payload):
+    return struct.pack(">I", len(payload) + 8) + atom_type + payload
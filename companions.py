@@ -0,0 +1,101 @@
+"""Grouping of companion files, the files a camera or an editor writes for
+the same shot (ex. IMG_0001.CR2, IMG_0001.JPG and IMG_0001.XMP).
+
+Companions share their directory and their name without extension. They must
+be renamed together, to the same new name and copy number, or the pairing is
+lost. The date and time of a group only needs to be read from one of them,
+its source file: the RAW file when there is one, as converters and editors
+don't always carry the metadata over to the files they write.
+
+    for group in companions.group_companions(files):
+        source = group[0]
+        extensions = companions.get_extensions(group)
+
+"""
+
+# Public
+import os.path
+
+
+# Camera RAW formats, the preferred source of a group
+RAW_EXTENSIONS = frozenset((
+    ".3fr", ".arw", ".cr2", ".cr3", ".crw", ".dcr", ".dng", ".erf", ".iiq",
+    ".kdc", ".mef", ".mos", ".mrw", ".nef", ".nrw", ".orf", ".pef", ".raf",
+    ".raw", ".rw2", ".rwl", ".sr2", ".srf", ".srw", ".x3f"))
+
+# Files describing another file. Editors may name them after the full name of
+# that file (ex. IMG_0001.CR2.xmp).
+SIDECAR_EXTENSIONS = frozenset((".aae", ".dop", ".pp3", ".thm", ".xmp"))
+
+_PRIORITY_RAW = 0
+_PRIORITY_OTHER = 1
+_PRIORITY_SIDECAR = 2
+
+#
+# Public
+#
+
+def group_companions(files):
+    """Groups the files by directory and name without extension, in a single
+    pass over the list.
+
+    Parameters:
+        files: list of file paths
+
+    return: list of groups, in the order of their first file in files. Each
+            group is a list of paths, its source file first, then the other
+            files by preference. Files without companions are alone in their
+            group.
+
+    """
+
+    groups_by_key = {}
+    sidecars = []
+    for index, file in enumerate(files):
+        directory, name = os.path.split(file)
+        stem, extension = os.path.splitext(name)
+        priority = _get_priority(extension)
+        if priority == _PRIORITY_SIDECAR:
+            sidecars.append((index, file, directory, stem))
+        else:
+            key = (directory, os.path.normcase(stem))
+            groups_by_key.setdefault(key, []).append((priority, index, file))
+
+    for index, file, directory, stem in sidecars:
+        key = (directory, os.path.normcase(stem))
+        if key not in groups_by_key:
+            # IMG_0001.CR2.xmp goes with IMG_0001.CR2
+            inner_stem = os.path.splitext(stem)[0]
+            inner_key = (directory, os.path.normcase(inner_stem))
+            if inner_stem != stem and inner_key in groups_by_key:
+                key = inner_key
+        groups_by_key.setdefault(key, []).append((_PRIORITY_SIDECAR, index, file))
+
+    groups = sorted(groups_by_key.values(),
+                    key=lambda members: min(member[1] for member in members))
+    return [[file for priority, index, file in sorted(members)]
+            for members in groups]
+
+
+def get_extensions(group):
+    """return: the end of the name each file of group keeps when the group
+               is renamed, that is what follows their shared name (ex.
+               [".CR2", ".CR2.xmp"])
+
+    """
+
+    names = [os.path.basename(file) for file in group]
+    stem_length = min(len(os.path.splitext(name)[0]) for name in names)
+    return [name[stem_length:] for name in names]
+
+#
+# Private
+#
+
+def _get_priority(extension):
+    extension = extension.lower()
+    if extension in RAW_EXTENSIONS:
+        return _PRIORITY_RAW
+    if extension in SIDECAR_EXTENSIONS:
+        return _PRIORITY_SIDECAR
+    return _PRIORITY_OTHER
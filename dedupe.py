@@ -0,0 +1,185 @@
+"""Detection of byte-identical files, typically copies left by overlapping
+card dumps.
+
+Reading every byte of a multi-TB archive is what we want to avoid, so the
+files are narrowed down in three passes:
+    1. files are bucketed by size. A file of a unique size has no copy.
+    2. files sharing a size are compared on a hash of their first and last
+       SAMPLE_SIZE bytes.
+    3. files still matching are hashed in full.
+
+Files are read with large unbuffered reads into a reused buffer, on a thread
+pool. hashlib releases the GIL while hashing so the threads keep several
+disks, or a RAID, busy.
+
+    for group in dedupe.find_duplicates(files):
+        original, duplicates = group[0], group[1:]
+
+"""
+
+# Public
+import collections
+import concurrent.futures
+import hashlib
+import os
+
+
+# What to do with the duplicates before renaming, see photorenamecore.rename()
+ACTION_SKIP = "skip"
+ACTION_HARDLINK = "hardlink"
+ACTION_REPORT = "report"
+ACTIONS = (ACTION_SKIP, ACTION_HARDLINK, ACTION_REPORT)
+
+# Bytes hashed at the start and at the end of same-size files
+SAMPLE_SIZE = 64 * 1024
+
+# Bytes read at a time when hashing whole files
+READ_SIZE = 1024 * 1024
+
+# Default number of hashing threads
+DEFAULT_WORKERS = 8
+
+# Accelerated by the CPU on most machines, faster than sha1 and md5 there
+HASH_ALGORITHM = "sha256"
+
+#
+# Public
+#
+
+def find_duplicates(files, workers=None):
+    """Groups the files having the same content.
+
+    Empty files aren't considered. Hard links to the same file are
+    duplicates of each other.
+
+    Parameters:
+        files: iterable over file paths
+
+        workers: number of hashing threads. Defaults to DEFAULT_WORKERS.
+
+    return: list of groups of identical files. Each group is a sorted list of
+            at least two paths: the first one is the file to keep. Groups are
+            sorted by their first file.
+
+    """
+
+    if workers == None:
+        workers = DEFAULT_WORKERS
+
+    # Pass 1: size. Hard links are only read once.
+    paths_by_inode = collections.defaultdict(list)
+    inodes_by_size = collections.defaultdict(list)
+    for file in files:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            continue
+        if stat.st_size == 0:
+            continue
+        inode = (stat.st_dev, stat.st_ino)
+        if inode not in paths_by_inode:
+            inodes_by_size[stat.st_size].append(inode)
+        paths_by_inode[inode].append(file)
+
+    groups = []
+    candidates = []
+    for size, inodes in inodes_by_size.items():
+        if len(inodes) > 1:
+            candidates += [(size, inode) for inode in inodes]
+        elif len(paths_by_inode[inodes[0]]) > 1:
+            groups.append(paths_by_inode[inodes[0]])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def hash_all(function, candidates):
+            """return: {(size, digest): [inode, ...]} of the candidates that could be read"""
+
+            inodes_by_key = collections.defaultdict(list)
+            futures = [executor.submit(function, paths_by_inode[inode][0], size)
+                       for size, inode in candidates]
+            for (size, inode), future in zip(candidates, futures):
+                digest = future.result()
+                if digest != None:
+                    inodes_by_key[(size, digest)].append(inode)
+            return inodes_by_key
+
+        # Pass 2: start and end of the files
+        full_candidates = []
+        for (size, digest), inodes in hash_all(_hash_sample, candidates).items():
+            if len(inodes) < 2:
+                continue
+            if size <= 2 * SAMPLE_SIZE:
+                # The sample was the whole file
+                groups.append(_get_paths(inodes, paths_by_inode))
+            else:
+                full_candidates += [(size, inode) for inode in inodes]
+
+        # Pass 3: whole files
+        for inodes in hash_all(_hash_file, full_candidates).values():
+            if len(inodes) > 1:
+                groups.append(_get_paths(inodes, paths_by_inode))
+
+    groups = [sorted(group) for group in groups]
+    groups.sort()
+    return groups
+
+
+def link_duplicate(original, duplicate):
+    """Replaces duplicate by a hard link to original, atomically.
+
+    Raises OSError, for instance when the files are on different volumes.
+
+    """
+
+    if os.path.samefile(original, duplicate):
+        return
+
+    temp_path = duplicate + ".photorename-link"
+    os.link(original, temp_path)
+    try:
+        os.replace(temp_path, duplicate)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+#
+# Private
+#
+
+def _get_paths(inodes, paths_by_inode):
+    return [path for inode in inodes for path in paths_by_inode[inode]]
+
+
+def _hash_sample(path, size):
+    """return: hash of the first and last SAMPLE_SIZE bytes of the file, None
+               if it can't be read
+
+    """
+
+    digest = hashlib.new(HASH_ALGORITHM)
+    try:
+        with open(path, "rb", buffering=0) as file:
+            digest.update(file.read(SAMPLE_SIZE))
+            if size > SAMPLE_SIZE:
+                file.seek(max(SAMPLE_SIZE, size - SAMPLE_SIZE))
+                digest.update(file.read(SAMPLE_SIZE))
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def _hash_file(path, size):
+    """return: hash of the whole file, None if it can't be read"""
+
+    digest = hashlib.new(HASH_ALGORITHM)
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+    try:
+        with open(path, "rb", buffering=0) as file:
+            while True:
+                count = file.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+    except OSError:
+        return None
+    return digest.digest()
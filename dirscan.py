@@ -0,0 +1,262 @@
+"""Streaming directory scanner used to select the files to rename.
+
+Files are produced by a generator so that a huge tree can be renamed while it
+is still being walked. Only one directory listing is kept in memory at a time.
+
+"""
+
+# Public
+import fnmatch
+import os
+import os.path
+import threading
+
+
+# Default number of files handed to exiftool per command
+DEFAULT_CHUNK_SIZE = 1000
+
+#
+# Public
+#
+
+def scan_files(path, file_types=("*.*",), recursive=False, include=None, exclude=None):
+    """Generator that yields the paths of the files to rename.
+
+    Each directory is listed once with os.scandir. Its files are yielded in
+    sorted order, the way exiftool processes them, before its sub-directories
+    are visited. Hidden files and directories are skipped.
+
+    Parameters:
+        path: directory to scan
+
+        file_types: list of file patterns (ex. ["*.jpg", "*.cr2"]) or a string
+                   of patterns separated by ";". Extensions are case
+                   insensitive and "*.*" matches all the files.
+
+        recursive: True to also scan the sub-directories
+
+        include: list of glob patterns. If given, only the files matching one
+                   of them are yielded.
+
+        exclude: list of glob patterns. Files and directories matching one of
+                   them are skipped.
+
+        Include and exclude patterns are matched against the name and against
+        the path relative to path, using "/" as the separator
+        (ex. "*.jpg", "2012/*", "*/.thumbnails").
+
+    """
+
+    extensions, patterns = parse_file_types(file_types)
+    include = include or []
+    exclude = exclude or []
+
+    # Relative paths of the directories left to scan. Visited depth first so
+    # only the pending siblings of our ancestors are waiting here.
+    pending_directories = [""]
+    while pending_directories:
+        relative_directory = pending_directories.pop()
+        try:
+            with os.scandir(os.path.join(path, relative_directory)) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print("Couldn't scan " + os.path.join(path, relative_directory) + ": " + str(e))
+            continue
+
+        sub_directories = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+
+            relative_path = entry.name
+            if relative_directory != "":
+                relative_path = relative_directory + "/" + entry.name
+
+            if _matches_any(entry.name, relative_path, exclude):
+                continue
+
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        sub_directories.append(relative_path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+
+            if include and not _matches_any(entry.name, relative_path, include):
+                continue
+
+            if has_file_type(entry.name, extensions, patterns):
+                yield entry.path
+
+        # Reversed so they are popped in sorted order
+        pending_directories.extend(reversed(sub_directories))
+
+
+def iter_chunks(items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generator that groups items into lists of at most chunk_size items."""
+
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_file_types(file_types):
+    """Splits file patterns into extensions and more specific patterns.
+
+    return: (extensions, patterns) where extensions is a set of lowercase
+            extensions without the dot ("*" for all of them) and patterns the
+            list of the other patterns (ex. "IMG_*.jpg").
+
+    """
+
+    if isinstance(file_types, str):
+        file_types = file_types.split(";")
+
+    extensions = set()
+    patterns = []
+    for file_type in file_types:
+        file_type = file_type.strip()
+        if file_type == "":
+            continue
+        extension = extension_from_pattern(file_type)
+        if extension == None:
+            patterns.append(file_type)
+        else:
+            extensions.add(extension.lower())
+
+    return extensions, patterns
+
+
+def extension_from_pattern(pattern):
+    """Returns the extension matched by patterns such as "*.jpg", ".jpg" or
+    "*.*" ("*" for all extensions). None if the pattern is more specific.
+
+    """
+
+    if pattern in ("*", "*.*"):
+        return "*"
+
+    if pattern.startswith("*."):
+        pattern = pattern[1:]
+    if pattern.startswith(".") and not any(c in pattern for c in "*?[]/\\"):
+        return pattern[1:]
+
+    return None
+
+
+def has_file_type(name, extensions, patterns):
+    """True if name matches the (extensions, patterns) of parse_file_types()"""
+
+    if "*" in extensions:
+        return True
+    if os.path.splitext(name)[1][1:].lower() in extensions:
+        return True
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def count_extensions(path):
+    """Lists the file extensions of a directory (non recursive).
+
+    return: dictionary of lowercase extension (ex. ".jpg") to
+            (file count, total size in bytes). Files without extension are
+            left out.
+
+    """
+
+    counts = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            extension = os.path.splitext(entry.name)[1].lower()
+            if extension == "":
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                # Free on Windows, a stat per file elsewhere
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            count, total_size = counts.get(extension, (0, 0))
+            counts[extension] = (count + 1, total_size + size)
+    return counts
+
+
+class ExtensionCensus:
+    """Cache of count_extensions() results.
+
+    A result is reused as long as the modification time of its directory
+    didn't change, which happens whenever a file is added, removed or renamed
+    in it. The byte totals may be stale if files were rewritten in place.
+
+    Can be shared between threads: the scans typically run on a background
+    thread while the UI only calls get().
+
+    """
+
+    _lock = None
+
+    # Path to (mtime_ns, counts)
+    _results = None
+
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+
+
+    def get(self, path):
+        """return: the counts of path if they are up to date, None otherwise.
+                   Only costs a stat of the directory.
+
+        """
+
+        with self._lock:
+            result = self._results.get(path)
+        if result == None:
+            return None
+
+        try:
+            if os.stat(path).st_mtime_ns != result[0]:
+                return None
+        except OSError:
+            return None
+        return result[1]
+
+
+    def scan(self, path):
+        """Counts the extensions of path, unless get() has them already.
+
+        return: same as count_extensions(). Raises OSError if the directory
+                can't be listed.
+
+        """
+
+        counts = self.get(path)
+        if counts != None:
+            return counts
+
+        # The mtime is taken first so a change made during the scan
+        # invalidates the result.
+        mtime_ns = os.stat(path).st_mtime_ns
+        counts = count_extensions(path)
+        with self._lock:
+            self._results[path] = (mtime_ns, counts)
+        return counts
+
+#
+# Private
+#
+
+def _matches_any(name, relative_path, patterns):
+    for pattern in patterns:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern):
+            return True
+    return False
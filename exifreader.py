@@ -0,0 +1,208 @@
+"""Minimal EXIF reader for the date and time a photo was taken.
+
+Reading DateTimeOriginal from a JPEG or TIFF based file (most RAW formats)
+only takes a few KB of bounded reads, which is much cheaper than asking
+exiftool. Anything this module can't handle is left to exiftool.
+
+    tags = exifreader.read_date_time_original("IMG_0001.JPG")
+    # {"DateTimeOriginal": "2012:02:27 13:45:12", "SubSecTimeOriginal": "37"}
+
+read_date_tags() also returns what it found in files without a
+DateTimeOriginal, such as the CreateDate of scans.
+
+"""
+
+# Public
+import struct
+
+
+# EXIF tags we extract, by tag ID
+EXIF_TAGS = {0x9003: "DateTimeOriginal",
+             0x9291: "SubSecTimeOriginal",
+             0x9011: "OffsetTimeOriginal",
+             0x9004: "CreateDate",
+             0x9292: "SubSecTimeDigitized",
+             0x9012: "OffsetTimeDigitized"}
+
+# Tags of EXIF_TAGS holding a date and time
+DATE_TAGS = ("DateTimeOriginal", "CreateDate")
+
+_TAG_EXIF_IFD_POINTER = 0x8769
+_TYPE_ASCII = 2
+
+_JPEG_SOI = b"\xff\xd8"
+_JPEG_MARKER_APP1 = 0xe1
+_JPEG_MARKER_SOS = 0xda
+_JPEG_MARKER_EOI = 0xd9
+_EXIF_HEADER = b"Exif\x00\x00"
+
+_TIFF_HEADERS = {b"II*\x00": "<", b"MM\x00*": ">"}
+
+# Sanity limits protecting us from corrupted files
+_MAX_JPEG_SEGMENTS = 64
+_MAX_IFD_ENTRIES = 1000
+_MAX_STRING_LENGTH = 64
+
+#
+# Public
+#
+
+def read_date_time_original(path):
+    """Reads the date and time a photo was taken from its EXIF information.
+
+    return: dictionary with the DateTimeOriginal tag and the other EXIF_TAGS
+            that are present. The values are formatted like exiftool's (ex.
+            "2012:02:27 13:45:12"). None if the file isn't supported or has no
+            DateTimeOriginal, in which case exiftool should be asked instead.
+
+    """
+
+    tags = read_date_tags(path)
+    if tags == None or "DateTimeOriginal" not in tags:
+        return None
+    return tags
+
+
+def read_date_tags(path):
+    """Reads EXIF_TAGS from a JPEG or TIFF based file.
+
+    return: dictionary of the tags that are present, see
+            read_date_time_original(). Date tags without a valid date are
+            left out. None if the file isn't supported or can't be read, in
+            which case exiftool should be asked instead.
+
+    """
+
+    try:
+        with open(path, "rb") as file:
+            header = file.read(4)
+
+            if header[:2] == _JPEG_SOI:
+                file.seek(len(_JPEG_SOI))
+                tiff_data = _read_jpeg_exif(file)
+                if tiff_data == None:
+                    return None
+
+                def read_at(offset, size):
+                    data = tiff_data[offset:offset + size]
+                    if offset < 0 or len(data) < size:
+                        raise ValueError("Read past the end of the EXIF data")
+                    return data
+
+            elif header in _TIFF_HEADERS:
+                def read_at(offset, size):
+                    file.seek(offset)
+                    data = file.read(size)
+                    if len(data) < size:
+                        raise ValueError("Read past the end of the file")
+                    return data
+
+            else:
+                return None
+
+            tags = _read_exif_tags(read_at)
+    except (OSError, ValueError, struct.error):
+        return None
+
+    for tag in DATE_TAGS:
+        if tag in tags and not _is_valid_date_time(tags[tag]):
+            del tags[tag]
+    return tags
+
+#
+# Private
+#
+
+def _read_jpeg_exif(file):
+    """return: the TIFF structure of the JPEG EXIF segment, None if there is
+               none. The file must be positioned right after the SOI marker.
+
+    """
+
+    for i in range(_MAX_JPEG_SEGMENTS):
+        marker = file.read(2)
+        # Markers may be preceded by any number of 0xff fill bytes
+        while marker[:1] == b"\xff" and marker[1:] == b"\xff":
+            marker = b"\xff" + file.read(1)
+
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        if marker[1] in (_JPEG_MARKER_SOS, _JPEG_MARKER_EOI):
+            # The image data starts. There is no metadata past this point.
+            return None
+
+        length = struct.unpack(">H", file.read(2))[0]
+        if length < 2:
+            return None
+
+        if marker[1] == _JPEG_MARKER_APP1:
+            segment = file.read(length - 2)
+            if segment.startswith(_EXIF_HEADER):
+                return segment[len(_EXIF_HEADER):]
+            # Probably XMP. EXIF may still follow.
+        else:
+            file.seek(length - 2, 1)
+
+    return None
+
+
+def _read_exif_tags(read_at):
+    """Reads EXIF_TAGS from a TIFF structure.
+
+    Parameters:
+        read_at: function(offset, size) returning size bytes at offset from
+                   the start of the TIFF structure
+
+    return: dictionary of tag name to value for the tags that were found
+
+    """
+
+    header = read_at(0, 8)
+    byte_order = _TIFF_HEADERS.get(header[:4])
+    if byte_order == None:
+        return {}
+
+    ifd0_offset = struct.unpack(byte_order + "I", header[4:8])[0]
+    exif_ifd_offset = None
+    for tag, value_type, count, value in _read_ifd_entries(read_at, byte_order, ifd0_offset):
+        if tag == _TAG_EXIF_IFD_POINTER:
+            exif_ifd_offset = struct.unpack(byte_order + "I", value)[0]
+            break
+
+    tags = {}
+    if exif_ifd_offset == None:
+        return tags
+
+    for tag, value_type, count, value in _read_ifd_entries(read_at, byte_order, exif_ifd_offset):
+        if tag in EXIF_TAGS and value_type == _TYPE_ASCII:
+            count = min(count, _MAX_STRING_LENGTH)
+            if count > 4:
+                value = read_at(struct.unpack(byte_order + "I", value)[0], count)
+            string = value[:count].split(b"\x00")[0].decode("ascii", "replace").strip()
+            if string != "":
+                tags[EXIF_TAGS[tag]] = string
+
+    return tags
+
+
+def _read_ifd_entries(read_at, byte_order, offset):
+    """return: list of (tag, type, count, raw 4 bytes value or offset)"""
+
+    entry_count = struct.unpack(byte_order + "H", read_at(offset, 2))[0]
+    if entry_count > _MAX_IFD_ENTRIES:
+        raise ValueError("Invalid IFD")
+
+    data = read_at(offset + 2, entry_count * 12)
+    entries = []
+    for i in range(entry_count):
+        tag, value_type, count = struct.unpack(
+            byte_order + "HHI", data[i * 12:i * 12 + 8])
+        entries.append((tag, value_type, count, data[i * 12 + 8:i * 12 + 12]))
+    return entries
+
+
+def _is_valid_date_time(value):
+    """Cameras without a clock write blanks or zeros."""
+
+    return (value != None and len(value) >= 19
+            and value[:4].isdigit() and value[:4] != "0000")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Local stand-in for the exiftool executable.
+
+Speaks just enough of the exiftool command line to exercise photorename
+without the real thing:
+
+    exiftoolfake.py -ver
+    exiftoolfake.py "-FileName<Prefix_${DateTimeOriginal}%-c.%e" -d FORMAT FILES
+    exiftoolfake.py "-FileName<${FileModifyDate}" "-FileName<${DateTimeOriginal}" FILES
+    exiftoolfake.py -j -DateTimeOriginal -CreateDate FILES
+    exiftoolfake.py -@ ARGFILE
+    exiftoolfake.py -stay_open True -@ - [-common_args ARGS]
+
+In -stay_open mode, commands are read from stdin one argument per line and run
+on -execute[NUM]. The answer is followed by {ready[NUM]} on stdout, exactly
+like exiftool does.
+
+DateTimeOriginal and the other EXIF tags are read with exifreader, so only
+JPEG and TIFF based files have them. The CreateDate of movies is read with
+quicktimereader and FileModifyDate comes from the file system. Like with
+exiftool, the last -FileName assignment whose tags are all defined is used,
+and renaming fails with a warning when there is none.
+
+"""
+
+# Public
+import glob
+import json
+import os
+import os.path
+import re
+import sys
+import time
+
+# Internal
+import exifreader
+import quicktimereader
+
+
+VERSION = "12.40"
+
+EXIFTOOL_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+_TAG_REFERENCE_RE = re.compile(r"\$\{(\w+)\}")
+
+
+def main(argv):
+    if argv[:2] == ["-stay_open", "True"] and argv[2:4] == ["-@", "-"]:
+        common_args = []
+        if argv[4:5] == ["-common_args"]:
+            common_args = argv[5:]
+        _stay_open(common_args)
+    else:
+        _run_command(argv)
+    return 0
+
+
+#
+# Private
+#
+
+def _stay_open(common_args):
+    args = []
+    for line in sys.stdin:
+        arg = line.strip()
+        if arg == "" or arg.startswith("#"):
+            continue
+
+        if arg.startswith("-execute"):
+            _run_command(args + common_args)
+            print("{ready" + arg[len("-execute"):] + "}")
+            sys.stdout.flush()
+            sys.stderr.flush()
+            args = []
+        elif args[-1:] == ["-stay_open"] and arg.lower() in ("false", "0"):
+            return
+        else:
+            args.append(arg)
+
+
+def _read_argfile(path):
+    """return: the arguments of a -@ argument file, one per line"""
+
+    with open(path, encoding="utf-8") as argfile:
+        return [line.rstrip("\r\n") for line in argfile
+                if line.strip() != "" and not line.startswith("#")]
+
+
+def _run_command(args):
+    options = {"date_format": EXIFTOOL_DATE_FORMAT,
+               "file_names": [],
+               "verbose": False,
+               "progress": False,
+               "extensions": [],
+               "json": False,
+               "tags": [],
+               "echo": []}
+    file_args = []
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "-ver":
+            print(VERSION)
+        elif arg == "-@":
+            i += 1
+            # The arguments of the file take the place of -@ ARGFILE
+            args = args[:i - 1] + _read_argfile(args[i]) + args[i + 1:]
+            i -= 2
+        elif arg == "-d":
+            i += 1
+            options["date_format"] = args[i]
+        elif arg == "-ext":
+            i += 1
+            options["extensions"].append(args[i].lower())
+        elif arg == "-charset":
+            i += 1
+        elif arg.startswith("-echo"):
+            i += 1
+            options["echo"].append((arg[len("-echo"):], args[i]))
+        elif arg == "-progress":
+            options["progress"] = True
+        elif arg.startswith("-v"):
+            options["verbose"] = True
+        elif arg == "-j":
+            options["json"] = True
+        elif arg in ("-fast", "-fast2", "-q"):
+            pass
+        elif arg.lower().startswith("-filename<"):
+            options["file_names"].append(arg[len("-filename<"):])
+        elif arg.startswith("-") and arg[1:].isalnum():
+            options["tags"].append(arg[1:])
+        elif arg.startswith("-"):
+            print("Warning: Unsupported option " + arg, file=sys.stderr)
+        else:
+            file_args.append(arg)
+        i += 1
+
+    files = []
+    for arg in file_args:
+        files += _expand_file_arg(arg, options["extensions"])
+
+    if options["file_names"]:
+        _rename_files(files, options)
+    elif options["json"]:
+        _print_json_tags(files, options)
+
+    for number, text in options["echo"]:
+        stream = sys.stderr if number in ("2", "4") else sys.stdout
+        print(text, file=stream)
+
+
+def _expand_file_arg(arg, extensions):
+    if os.path.isdir(arg):
+        return [os.path.join(arg, name) for name in sorted(os.listdir(arg))
+                if os.path.isfile(os.path.join(arg, name))
+                and _has_extension(name, extensions)]
+
+    matches = sorted(glob.glob(arg))
+    if not matches:
+        print("Error: File not found - " + arg, file=sys.stderr)
+    return matches
+
+
+def _has_extension(name, extensions):
+    if not extensions or "*" in extensions:
+        return True
+    return os.path.splitext(name)[1][1:].lower() in extensions
+
+
+def _rename_files(files, options):
+    updated = 0
+    unchanged = 0
+    errors = 0
+
+    for index, file in enumerate(files):
+        if options["progress"]:
+            print("======== %s [%d/%d]" % (file, index + 1, len(files)))
+            # Like exiftool, so the progress can be followed
+            sys.stdout.flush()
+
+        template = _evaluate_file_name(file, options)
+        if template == None:
+            print("Warning: No writable tags set from " + file, file=sys.stderr)
+            unchanged += 1
+            continue
+
+        directory, name = os.path.split(file)
+        template = template.replace("%e", os.path.splitext(name)[1][1:])
+
+        copy_number = 0
+        while True:
+            if copy_number == 0:
+                new_name = template.replace("%-c", "")
+            else:
+                new_name = template.replace("%-c", "-" + str(copy_number))
+            new_file = os.path.join(directory, new_name)
+
+            if new_name == name:
+                unchanged += 1
+                break
+
+            if not os.path.exists(new_file):
+                try:
+                    os.rename(file, new_file)
+                    updated += 1
+                    if options["verbose"]:
+                        print("'" + file + "' --> '" + new_file + "'")
+                except OSError as e:
+                    print("Error: " + str(e) + " - " + file, file=sys.stderr)
+                    errors += 1
+                break
+
+            copy_number += 1
+
+    print("    1 directories scanned")
+    print("%5d image files updated" % updated)
+    if unchanged:
+        print("%5d image files unchanged" % unchanged)
+    if errors:
+        print("%5d files weren't updated due to errors" % errors)
+
+
+def _evaluate_file_name(file, options):
+    """return: the last -FileName template of options with all its tags
+               defined for file, tags replaced. None if there is none.
+
+    """
+
+    tags = _read_tags(file)
+    missing_tag = None
+    for template in reversed(options["file_names"]):
+        missing_tags = [tag for tag in _TAG_REFERENCE_RE.findall(template)
+                        if tag not in tags]
+        if missing_tags:
+            missing_tag = missing_tag or missing_tags[0]
+            continue
+        return _TAG_REFERENCE_RE.sub(
+            lambda match: time.strftime(
+                options["date_format"],
+                time.strptime(tags[match.group(1)][:19], EXIFTOOL_DATE_FORMAT)),
+            template)
+
+    print("Warning: [minor] Tag '" + missing_tag + "' not defined - " + file,
+          file=sys.stderr)
+    return None
+
+
+def _print_json_tags(files, options):
+    entries = []
+    for file in files:
+        entry = {"SourceFile": file}
+        tags = _read_tags(file)
+        for tag in options["tags"]:
+            if tag in tags:
+                entry[tag] = tags[tag]
+        entries.append(entry)
+
+    if entries:
+        print(json.dumps(entries, indent=2))
+
+
+def _read_tags(file):
+    """return: dictionary of the tags of file we know about"""
+
+    tags = exifreader.read_date_tags(file)
+    if tags == None:
+        tags = quicktimereader.read_date_tags(file) or {}
+    try:
+        local_time = time.localtime(os.stat(file).st_mtime)
+    except OSError:
+        return tags
+
+    offset = local_time.tm_gmtoff
+    tags["FileModifyDate"] = (
+        time.strftime(EXIFTOOL_DATE_FORMAT, local_time)
+        + "%s%02d:%02d" % ("-" if offset < 0 else "+",
+                           abs(offset) // 3600, abs(offset) % 3600 // 60))
+    return tags
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,20 +1,56 @@
-"""Utilities to install exiftool by Phil Harvey directly from the Internet."""
+"""Utilities to install exiftool by Phil Harvey directly from the Internet.
 
+Installer archives are streamed to disk in chunks and kept, by name (which
+includes the version), in a downloads directory of the install path. The next
+install of the same version doesn't download anything. An interrupted
+download is resumed with a range request when the server supports it.
+
+Archives are checked against the checksums published next to them
+(checksums.txt) when there are some, and only the executable and the files it
+needs are extracted.
+
+A local mirror, a directory or a file:// URL holding the installer archives,
+can be used instead of the exiftool homepage. Set it in
+$PHOTORENAME_EXIFTOOL_MIRROR or pass it to try_auto_install_exiftool():
+
+    exiftoolinst.try_auto_install_exiftool(install_path, "/srv/mirror/exiftool")
+
+"""
+
+import hashlib
+import http.client
 import os
 import os.path
-import shutil
+import posixpath
+import re
+import sys
 import urllib.error
 import urllib.parse
 import urllib.request
-import re
-import sys
-import tempfile
 import webbrowser
 import zipfile
 
 
 EXIFTOOL_HOMEPAGE_URL = r"http://www.sno.phy.queensu.ca/~phil/exiftool/"
 
+# Mirror used instead of the homepage when set
+MIRROR_ENVIRONMENT_VARIABLE = "PHOTORENAME_EXIFTOOL_MIRROR"
+
+# Directory of install_path where the installer archives are kept
+DOWNLOADS_DIRECTORY_NAME = "downloads"
+
+# Bytes read from the network at a time
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Seconds without any data before a download is given up
+DOWNLOAD_TIMEOUT = 30
+
+# Published checksums, preferred first
+_CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+_CHECKSUM_LINE_RE = re.compile(r"^\s*(SHA256|SHA1|MD5)\s*\((.+)\)\s*=\s*([0-9a-fA-F]+)\s*$")
+
+_INSTALLER_NAME_RE = re.compile(r"exiftool-[0-9.]+[^\"'/<>\s]*\.zip")
+
 #
 # Public
 #
@@ -23,10 +59,18 @@ def browser_launches_exiftool_homepage():
     webbrowser.open(EXIFTOOL_HOMEPAGE_URL)
 
 
-def try_auto_install_exiftool(install_path):
+def try_auto_install_exiftool(install_path, mirror=None, progress_callback=None):
     """Does a best effort to download exiftool and install it to the install_path
     directory location.
 
+    Parameters:
+        mirror: directory, file:// or http:// URL where to look for the
+                   installer instead of the exiftool homepage, or the URL of
+                   the installer itself. Defaults to
+                   $PHOTORENAME_EXIFTOOL_MIRROR.
+
+        progress_callback: see install_exiftool_from_url()
+
     return: (success, executable_filepath)
 
     note: There is no standard way to install exiftool. We do a best effort by
@@ -39,75 +83,238 @@ def try_auto_install_exiftool(install_path):
     """
 
     ret = (False, None)
-    try:
-        request = urllib.request.urlopen(EXIFTOOL_HOMEPAGE_URL)
-        homepage_content = request.read()
 
-        # Try to find a full url of any version of the installer zip file on the page's content
-        matches = re.findall(
-            r"http://.*/exiftool-.*\.zip",
-            homepage_content.decode())
+    # We only support the win32 version of exiftool
+    if sys.platform != "win32":
+        print("Error: Only the win32 version of exiftool can be installed.")
+        return ret
 
-        installer_full_path = None
-        if matches:
-            installer_full_path = matches[0]
-        else:
-            # Try to find a partial url and join it to the page's base url
-            matches = re.findall(r"exiftool-.*\.zip", homepage_content.decode())
-            if matches:
-                installer_full_path = urllib.parse.urljoin(
-                    EXIFTOOL_HOMEPAGE_URL,
-                    matches[0],
-                    allow_fragments=False)
+    if mirror == None:
+        mirror = os.environ.get(MIRROR_ENVIRONMENT_VARIABLE) or None
+
+    try:
+        installer_full_path = _find_installer_url(mirror or EXIFTOOL_HOMEPAGE_URL)
 
         # We found the path. Download and install exiftool.
         if installer_full_path != None:
-            ret = _install_exiftool_from_installer_path(
+            ret = install_exiftool_from_url(
                         installer_full_path,
-                        install_path)
+                        install_path,
+                        progress_callback=progress_callback)
+        else:
+            print("Couldn't find the installer")
 
-    except (urllib.error.URLError, NameError):
+    except (urllib.error.URLError, OSError, UnicodeDecodeError):
         print("Couldn't download the homepage")
 
     return ret
 
+
+def install_exiftool_from_url(installer_url, install_path, checksum=None,
+                              progress_callback=None):
+    """Installs exiftool from an installer zip file, downloading it unless
+    the same archive was downloaded before.
+
+    Parameters:
+        installer_url: URL of the installer zip file. file:// URLs and local
+                   paths are accepted.
+
+        install_path: Where to install exiftool.
+
+        checksum: expected (algorithm, hex digest) of the archive, for
+                   instance ("sha256", "9f86d0..."). Defaults to the one
+                   published in the checksums.txt file next to the
+                   installer, if any.
+
+        progress_callback: function called with (bytes_done, bytes_total) as
+                   the download progresses. bytes_total is None when the
+                   server doesn't tell.
+
+    return: (success, executable_filepath)
+
+    """
+
+    installer_url = _to_url(installer_url)
+    archive_name = posixpath.basename(urllib.parse.urlparse(installer_url).path)
+    downloads_path = os.path.join(install_path, DOWNLOADS_DIRECTORY_NAME)
+    archive_path = os.path.join(downloads_path, archive_name)
+
+    try:
+        os.makedirs(downloads_path, exist_ok=True)
+
+        if checksum == None:
+            checksum = _find_published_checksum(installer_url, archive_name)
+            if checksum == None:
+                print("Warning: No checksum published for " + archive_name)
+
+        if os.path.exists(archive_path) and not _verify_checksum(archive_path, checksum):
+            print("Cached " + archive_name + " is corrupted. Downloading it again.")
+            os.remove(archive_path)
+
+        if not os.path.exists(archive_path):
+            _download(installer_url, archive_path, progress_callback)
+            if not _verify_checksum(archive_path, checksum):
+                print("Error: " + archive_name + " doesn't match its checksum")
+                os.remove(archive_path)
+                return (False, None)
+    except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+        print("Couldn't download the package or write it to disk: " + str(e))
+        return (False, None)
+
+    return _install_exiftool_from_zip_file(archive_path, install_path)
+
 #
 # Private
 #
 
-def _install_exiftool_from_installer_path(installer_full_path, install_path):
-    """return: (success, executable_filepath)"""
+def _to_url(location):
+    """return: location as a URL. Local paths become file:// URLs."""
+
+    if re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]+://", location):
+        return location
+    return urllib.parse.urljoin(
+        "file:", urllib.request.pathname2url(os.path.abspath(location)))
+
+
+def _find_installer_url(page_url):
+    """Looks for the installer zip file on a web page or in a directory.
+
+    return: URL of the installer, None if there is none
+
+    """
+
+    page_url = _to_url(page_url)
+    parsed_url = urllib.parse.urlparse(page_url)
+    if _INSTALLER_NAME_RE.search(posixpath.basename(parsed_url.path)):
+        # Already the installer
+        return page_url
+
+    if parsed_url.scheme == "file":
+        path = urllib.request.url2pathname(parsed_url.path)
+        names = [name for name in os.listdir(path) if _INSTALLER_NAME_RE.fullmatch(name)]
+        if not names:
+            return None
+        # The most recent version of the mirror
+        name = max(names, key=lambda name: [int(part) for part in
+                                            re.findall(r"\d+", name)])
+        return _to_url(os.path.join(path, name))
+
+    with urllib.request.urlopen(page_url, timeout=DOWNLOAD_TIMEOUT) as request:
+        homepage_content = request.read().decode()
+
+    # Try to find a full url of any version of the installer zip file on the page's content
+    matches = re.findall(r"https?://[^\"'<>\s]*/exiftool-[^\"'<>\s]*\.zip", homepage_content)
+    if matches:
+        return matches[0]
+
+    # Try to find a partial url and join it to the page's base url
+    matches = _INSTALLER_NAME_RE.findall(homepage_content)
+    if matches:
+        return urllib.parse.urljoin(page_url, matches[0], allow_fragments=False)
+    return None
+
+
+def _find_published_checksum(installer_url, archive_name):
+    """return: (algorithm, hex digest) of archive_name in the checksums.txt
+               file next to the installer. None if there is none.
+
+    """
 
-    ret = (False, None)
     try:
-        http_request_installer = urllib.request.urlopen(installer_full_path)
-
-        installer_filepath = None
-
-        try:
-            # Create a temp file to store the installer
-            with tempfile.NamedTemporaryFile(
-                            mode="w+b",
-                            prefix="exiftoolinst",
-                            delete=False) as file:
-                file.write(http_request_installer.read())
-                installer_filepath = file.name
-
-            ret = _install_exiftool_from_zip_file(
-                        installer_filepath,
-                        install_path)
-        finally:
-            # delete our temp file
-            if (installer_filepath != None):
-                os.remove(installer_filepath)
-    except (urllib.error.URLError, NameError):
-        print("Couldn't download the package or write the temp file")
+        with urllib.request.urlopen(urllib.parse.urljoin(installer_url, "checksums.txt"),
+                                    timeout=DOWNLOAD_TIMEOUT) as request:
+            content = request.read().decode("utf-8", errors="replace")
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
 
-    return ret
+    checksums = {}
+    for line in content.splitlines():
+        match = _CHECKSUM_LINE_RE.match(line)
+        if match and match.group(2).strip() == archive_name:
+            checksums[match.group(1).lower()] = match.group(3).lower()
 
+    for algorithm in _CHECKSUM_ALGORITHMS:
+        if algorithm in checksums:
+            return algorithm, checksums[algorithm]
+    return None
+
+
+def _verify_checksum(path, checksum):
+    """return: True if the file at path matches checksum or checksum is None"""
+
+    if checksum == None:
+        return True
+
+    algorithm, expected_digest = checksum
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == expected_digest.lower()
+
+
+def _download(url, path, progress_callback=None):
+    """Streams url to path through a path + ".part" file.
+
+    A .part file left by an interrupted download is resumed with a range
+    request. Servers ignoring the range (and file:// URLs) send everything
+    again.
 
-def _install_exiftool_from_zip_file(installer_filepath, install_path):
     """
+
+    part_path = path + ".part"
+    offset = 0
+    if os.path.exists(part_path):
+        offset = os.path.getsize(part_path)
+
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", "bytes=%d-" % offset)
+    try:
+        response = urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # Range not satisfiable: the .part file doesn't match the archive
+        # anymore. Start over.
+        os.remove(part_path)
+        offset = 0
+        response = urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT)
+
+    with response:
+        if offset and getattr(response, "status", None) != 206:
+            offset = 0
+
+        bytes_total = response.headers.get("Content-Length")
+        if bytes_total != None:
+            bytes_total = int(bytes_total) + offset
+
+        bytes_done = offset
+        with open(part_path, "r+b" if offset else "wb") as file:
+            file.seek(offset)
+            file.truncate()
+            if progress_callback != None:
+                progress_callback(bytes_done, bytes_total)
+
+            while True:
+                chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file.write(chunk)
+                bytes_done += len(chunk)
+                if progress_callback != None:
+                    progress_callback(bytes_done, bytes_total)
+
+    if bytes_total != None and bytes_done != bytes_total:
+        # The .part file is kept for the next attempt to resume
+        raise OSError("download interrupted after %d of %d bytes" % (bytes_done, bytes_total))
+    os.replace(part_path, path)
+
+
+def _install_exiftool_from_zip_file(installer_filepath, install_path):
+    """Extracts the exiftool executable, and the exiftool_files directory it
+    needs in recent versions, to install_path.
+
     Parameters:
         installer_filepath: zip file of the exiftool installer.
 
@@ -122,17 +329,34 @@ def _install_exiftool_from_zip_file(installer_filepath, install_path):
     ret = (False, None)
     try:
         with zipfile.ZipFile(installer_filepath) as installer_zip:
-            original_executable_filename = None
-
-            # Before extracting all the files, try to match the exiftool
-            # executable name.
-            for filename in installer_zip.namelist():
-                matches = re.match(r"exiftool.*\.exe", filename)
-                if matches != None:
-                    original_executable_filename = matches.group(0)
-
-            if original_executable_filename:
-                installer_zip.extractall(install_path)
+            original_executable_member = None
+
+            # Before extracting any file, try to match the exiftool
+            # executable name. It may be in a directory of the archive
+            # (ex. "exiftool-12.40_64/exiftool(-k).exe").
+            for member in installer_zip.namelist():
+                if (re.match(r"^(.*/)?exiftool[^/]*\.exe$", member)
+                        and "exiftool_files/" not in member):
+                    original_executable_member = member
+
+            if original_executable_member:
+                base_member = original_executable_member[
+                    :original_executable_member.rfind("/") + 1]
+                support_member = base_member + "exiftool_files/"
+                members = [original_executable_member] + [
+                    member for member in installer_zip.namelist()
+                    if member.startswith(support_member) and not member.endswith("/")]
+
+                for member in members:
+                    parts = member[len(base_member):].split("/")
+                    if ".." in parts:
+                        continue
+                    target_path = os.path.join(install_path, *parts)
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    with installer_zip.open(member) as source, \
+                            open(target_path, "wb") as target:
+                        for chunk in iter(lambda: source.read(DOWNLOAD_CHUNK_SIZE), b""):
+                            target.write(chunk)
 
                 # The main executable file has a name such as "exiftool(-k).exe".
                 # The Exiftool documentation recommends renaming the executable to
@@ -141,20 +365,14 @@ def _install_exiftool_from_zip_file(installer_filepath, install_path):
 
                 original_executable_filepath = os.path.join(
                                                     install_path,
-                                                    original_executable_filename)
+                                                    posixpath.basename(original_executable_member))
                 final_executable_filepath = os.path.join(
                                                     install_path,
                                                     "exiftool.exe")
-                os.rename(original_executable_filepath, final_executable_filepath)
+                os.replace(original_executable_filepath, final_executable_filepath)
 
                 ret = (True, final_executable_filepath)
-    except:
+    except (zipfile.BadZipFile, OSError, KeyError):
         print("Couldn't extract the installer zip file content")
 
     return ret
-
-
-# OS check since we only support the win32 version of exiftool
-if sys.platform != "win32":
-    print("Error: Only the win32 version of exiftool is supported.")
-    assert(sys.platform == "win32")
@@ -1,42 +1,855 @@
 """Basic facade for the exiftool executable"""
 
 # Public
+import collections
+import json
+import os
 import os.path
-import shlex
+import queue
+import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 
 # Internal
-import exiftoolinst
+import companions
+import dirscan
+import exifreader
+import metrics
+import quicktimereader
+import renameplanner
+
+
+class ExiftoolSessionError(Exception):
+    """Raised when the exiftool process of a session dies or stops answering."""
+    pass
+
+
+class ExiftoolSession:
+    """One long-lived exiftool process driven through its -stay_open protocol.
+
+    Commands are written to the process stdin as an argument file (one argument
+    per line) terminated by -execute. Exiftool answers on stdout and stderr and
+    terminates each answer with a {ready} marker. Paying the Perl startup cost
+    only once makes a big difference when many small commands are sent.
+
+    The process is started lazily. If it crashes, the command that was running
+    fails with an ExiftoolSessionError and the next command restarts it.
+
+    Any program speaking the same protocol can be used in place of exiftool
+    (see exiftoolfake.py).
+
+    Note: a session is not thread safe. Use one session per thread.
+
+    """
+
+    STREAM_STDOUT = "stdout"
+    STREAM_STDERR = "stderr"
+
+    _executable_args = None
+    _process = None
+    _output_queue = None
+    _reader_threads = None
+    _execute_count = 0
+
+
+    def __init__(self, executable_args):
+        """
+        Parameters:
+            executable_args: list of arguments used to launch exiftool
+                       (ex. ["c:\\exiftool\\exiftool.exe"])
+
+        """
+
+        self._executable_args = list(executable_args)
+
+
+    #
+    # Public
+    #
+
+    def start(self):
+        """Starts the exiftool process if it isn't already running."""
+
+        if self.is_running():
+            return
+
+        self._discard_process()
+
+        metrics.add("processes")
+        with metrics.span("process_start"):
+            self._process = subprocess.Popen(
+                self._executable_args + ["-stay_open", "True", "-@", "-",
+                                         "-common_args"] + CHARSET_ARGS,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                encoding="utf-8",
+                errors="replace")
+
+        # Both pipes are consumed by reader threads so that a chatty stderr can
+        # never fill up the OS pipe buffer while we are waiting on stdout.
+        self._output_queue = queue.Queue()
+        self._reader_threads = [
+            self._start_reader(self._process.stdout, self.STREAM_STDOUT),
+            self._start_reader(self._process.stderr, self.STREAM_STDERR)]
+
+
+    def is_running(self):
+        return self._process != None and self._process.poll() == None
+
+
+    def execute(self, args, timeout=None):
+        """Runs one exiftool command and waits for it to complete.
+
+        Parameters:
+            args: list of exiftool arguments (ex. ["-ver"])
+
+            timeout: seconds to wait for each line of output. None waits
+                       forever.
+
+        return: (stdout, stderr) as strings
+
+        """
+
+        outputs = {self.STREAM_STDOUT: [], self.STREAM_STDERR: []}
+        for stream, line in self.execute_lines(args, timeout):
+            outputs[stream].append(line)
+
+        return ("".join(outputs[self.STREAM_STDOUT]),
+                "".join(outputs[self.STREAM_STDERR]))
+
+
+    def execute_lines(self, args, timeout=None):
+        """Generator that runs one exiftool command and yields its output as
+        it is produced.
+
+        Parameters:
+            args: list of exiftool arguments (ex. ["-ver"])
+
+            timeout: seconds to wait for each line of output. None waits
+                       forever.
+
+        return: (stream, line) tuples where stream is STREAM_STDOUT or
+                STREAM_STDERR and line includes its line terminator.
+
+        """
+
+        ready_marker = self._send(args)
+
+        # Keep our own reference: terminate() may be called from another thread
+        output_queue = self._output_queue
+
+        # We need to see the ready marker on both streams before the next
+        # command can be sent.
+        pending_streams = set([self.STREAM_STDOUT, self.STREAM_STDERR])
+        try:
+            while pending_streams:
+                try:
+                    stream, line = output_queue.get(timeout=timeout)
+                except queue.Empty:
+                    self.terminate()
+                    raise ExiftoolSessionError("exiftool stopped answering")
+
+                if line == None:
+                    self._discard_process()
+                    raise ExiftoolSessionError("exiftool exited unexpectedly")
+
+                if line.rstrip("\r\n") == ready_marker:
+                    pending_streams.discard(stream)
+                else:
+                    yield stream, line
+        finally:
+            if pending_streams and self.is_running():
+                # The caller stopped listening midway. Kill the process rather
+                # than leaving the rest of the answer in the pipes where it
+                # would be mistaken for the answer to the next command.
+                self.terminate()
+
+
+    def terminate(self):
+        """Kills the exiftool process. The next command will restart it."""
+
+        if self._process != None:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+        self._discard_process()
+
+
+    def close(self, timeout=5):
+        """Asks exiftool to exit and waits for it to do so."""
+
+        if self.is_running():
+            try:
+                self._process.stdin.write("-stay_open\nFalse\n")
+                self._process.stdin.flush()
+                self._process.stdin.close()
+                self._process.wait(timeout)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                pass
+        self.terminate()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    #
+    # Private
+    #
+
+    def _send(self, args):
+        """Writes the command to exiftool and returns its ready marker.
+
+        A process that already died is restarted once before giving up. This is
+        safe as exiftool never saw the command.
+
+        """
+
+        for attempt in range(2):
+            self.start()
+            self._execute_count += 1
+            command = "".join(arg + "\n" for arg in args)
+            command += "-echo4\n{ready%d}\n-execute%d\n" % (
+                self._execute_count, self._execute_count)
+            try:
+                self._process.stdin.write(command)
+                self._process.stdin.flush()
+                return "{ready%d}" % self._execute_count
+            except (OSError, ValueError):
+                self._discard_process()
+
+        raise ExiftoolSessionError("couldn't send the command to exiftool")
+
+
+    def _start_reader(self, pipe, stream):
+        def read_pipe(output_queue):
+            try:
+                for line in iter(pipe.readline, ""):
+                    output_queue.put((stream, line))
+            except (OSError, ValueError):
+                pass
+            output_queue.put((stream, None))
+
+        thread = threading.Thread(target=read_pipe, args=(self._output_queue,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+    def _discard_process(self):
+        """Forgets about a process that is dead or being replaced."""
+
+        if self._process != None:
+            try:
+                self._process.stdin.close()
+            except (OSError, ValueError):
+                pass
+            try:
+                self._process.wait(1)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+
+            # The readers stop by themselves once the process is gone
+            for thread in self._reader_threads:
+                thread.join(1)
+            self._process.stdout.close()
+            self._process.stderr.close()
+
+        self._process = None
+        self._output_queue = None
+        self._reader_threads = None
+
+
+class ExiftoolCommand:
+    """Popen look-alike for a command sent to an ExiftoolSession.
+
+    The command runs when its output is requested through communicate() or
+    iter_output().
+
+    """
+
+    returncode = None
+
+    _session = None
+    _args = None
+
+
+    def __init__(self, session, args):
+        self._session = session
+        self._args = args
+
+
+    def communicate(self):
+        """Runs the command and waits for it to complete.
+
+        return: (stdout, stderr) as strings
+
+        """
+
+        outputs = {ExiftoolSession.STREAM_STDOUT: [], ExiftoolSession.STREAM_STDERR: []}
+        for stream, line in self.iter_output():
+            outputs[stream].append(line)
+
+        return ("".join(outputs[ExiftoolSession.STREAM_STDOUT]),
+                "".join(outputs[ExiftoolSession.STREAM_STDERR]))
+
+
+    def iter_output(self):
+        """Generator that runs the command and yields (stream, line) tuples as
+        exiftool produces them.
+
+        """
+
+        # Exiftool doesn't report an exit status per command while it stays
+        # open. Error messages are the closest thing we have.
+        self.returncode = 0
+        try:
+            for stream, line in self._session.execute_lines(self._args):
+                if stream == ExiftoolSession.STREAM_STDERR and line.startswith("Error"):
+                    self.returncode = 1
+                yield stream, line
+        except ExiftoolSessionError as e:
+            self.returncode = 1
+            yield ExiftoolSession.STREAM_STDERR, "Error: " + str(e) + "\n"
+
+
+    def terminate(self):
+        self._session.terminate()
+        self.returncode = 1
+
+
+class PlannedRenameCommand:
+    """ExiftoolCommand look-alike renaming files with plan_renames() and
+    apply_renames() rather than an exiftool rename command. Created by
+    ExiftoolWrap.launch_file_list_rename().
+
+    Its output is formatted like exiftool's (see format_rename_result()) so
+    it can be shown and parsed the same way.
+
+    """
+
+    returncode = None
+
+    _exiftool = None
+    _files = None
+    _prefix = ""
+    _use_date_time = True
+    _workers = None
+    _cache = None
+    _group_companions = False
+    _terminated = False
+
+
+    def __init__(self, exiftool, files, prefix, use_date_time, workers, cache,
+                 group_companions):
+        self._exiftool = exiftool
+        self._files = files
+        self._prefix = prefix
+        self._use_date_time = use_date_time
+        self._workers = workers
+        self._cache = cache
+        self._group_companions = group_companions
+
+
+    def communicate(self):
+        """Runs the command and waits for it to complete.
+
+        return: (stdout, stderr) as strings
+
+        """
+
+        outputs = {ExiftoolSession.STREAM_STDOUT: [], ExiftoolSession.STREAM_STDERR: []}
+        for stream, line in self.iter_output():
+            outputs[stream].append(line)
+
+        return ("".join(outputs[ExiftoolSession.STREAM_STDOUT]),
+                "".join(outputs[ExiftoolSession.STREAM_STDERR]))
+
+
+    def iter_output(self):
+        """Generator that plans the renames, then does them unless terminate()
+        was called meanwhile. Yields (stream, line) tuples like
+        ExiftoolCommand.iter_output().
+
+        """
+
+        self.returncode = 0
+        date_sources = {}
+        renames, results = self._exiftool.plan_renames(
+            self._files, self._prefix, self._use_date_time, self._workers,
+            self._cache, self._group_companions, date_sources)
+        if not self._terminated:
+            results += apply_renames(
+                renames, self._exiftool.get_date_source_messages(date_sources))
+
+        for result in results:
+            if result.status == RENAME_STATUS_ERROR:
+                self.returncode = 1
+            yield format_rename_result(result)
+
+
+    def terminate(self):
+        """Cancels the renames if they weren't started yet. Reading the dates
+        can't be interrupted.
+
+        """
+
+        self._terminated = True
+        self.returncode = 1
+
+
+RenameResult = collections.namedtuple(
+    "RenameResult", ["file", "new_file", "status", "message"])
+RenameResult.__doc__ = """Outcome of the rename of a single file.
+
+    file: path of the file before the rename
+
+    new_file: path of the file after the rename. None if it wasn't renamed.
+
+    status: one of RENAME_STATUS_RENAMED, RENAME_STATUS_WARNING or
+            RENAME_STATUS_ERROR
+
+    message: the exiftool message explaining a warning or an error
+
+"""
+
+RenameProgress = collections.namedtuple(
+    "RenameProgress", ["file", "index", "total"])
+RenameProgress.__doc__ = """exiftool starting on a file, from its -progress output.
+
+    file: path of the file
+
+    index: number of the file in the command, starting at 1
+
+    total: number of files the command processes
+
+"""
+
+RENAME_STATUS_RENAMED = "renamed"
+RENAME_STATUS_WARNING = "warning"
+RENAME_STATUS_ERROR = "error"
+
+_RENAMED_LINE_RE = re.compile(r"^\s*'(.*)' --> '(.*)'(?: \((.*)\))?\s*$")
+_MESSAGE_LINE_RE = re.compile(r"^(Warning|Error): (.*?)(?: -| from) (.+?)\s*$")
+_PROGRESS_LINE_RE = re.compile(r"^======== (.*) \[(\d+)/(\d+)\]\s*$")
+
+# Entry of the tags read from a file listing the tags that were looked for,
+# present or not. Entries cached before it existed were read for:
+_READ_TAGS_KEY = "ReadTags"
+_DEFAULT_READ_TAGS = ("DateTimeOriginal",)
+
+_FILE_MODIFY_DATE_TAG = "FileModifyDate"
+
+_DATE_TAG_RE = re.compile(r"^[A-Za-z][A-Za-z0-9]*$")
+
+# Given to every exiftool process so file names are read and written as UTF-8
+# whatever the code page of the system
+CHARSET_ARGS = ["-charset", "filename=utf8"]
+
+# Longest command line make_command() builds before using an argument file.
+# Windows allows 32767 characters. We stay well below so it never matters.
+MAX_COMMAND_LINE_LENGTH = 8000
+
+
+def parse_rename_output(lines):
+    """Turns the output of a verbose exiftool rename command into per file
+    results.
+
+    Parameters:
+        lines: iterable over the stdout and stderr lines of the command
+
+    return: list of RenameResult in the order exiftool reported them. A file
+            with several messages is only reported once, with its first one.
+
+    """
+
+    return list(iter_rename_output(lines))
+
+
+def iter_rename_output(lines):
+    """Generator version of parse_rename_output(), yielding each RenameResult
+    as soon as its line is read.
+
+    """
+
+    for event in iter_rename_events(lines):
+        if isinstance(event, RenameResult):
+            yield event
+
+
+def format_rename_result(result):
+    """Formats result the way exiftool reports it in verbose mode, so that
+    parse_rename_output() gives it back. The message of a renamed file (ex.
+    "from CreateDate") follows it between parentheses, which exiftool never
+    prints.
+
+    return: (stream, line) tuple
+
+    """
+
+    if result.status == RENAME_STATUS_RENAMED:
+        line = "'" + result.file + "' --> '" + result.new_file + "'"
+        if result.message:
+            line += " (" + result.message + ")"
+        return ExiftoolSession.STREAM_STDOUT, line + "\n"
+
+    label = "Error" if result.status == RENAME_STATUS_ERROR else "Warning"
+    return (ExiftoolSession.STREAM_STDERR,
+            label + ": " + result.message + " - " + result.file + "\n")
+
+
+def iter_rename_events(lines):
+    """Generator that parses the output of a rename command as it comes.
+
+    Parameters:
+        lines: iterable over the stdout and stderr lines of the command
+
+    return: yields a RenameProgress when exiftool starts on a file and a
+            RenameResult when it's done with it, in the order of the output.
+            Results are filtered like parse_rename_output() does.
+
+    """
+
+    parser = RenameOutputParser()
+    for line in lines:
+        event = parser.parse_line(line)
+        if event != None:
+            yield event
+
+
+class RenameOutputParser:
+    """Parses the output of a rename command one line at a time, for callers
+    that are handed the lines rather than iterating over them (ex. the
+    readers of asyncrename).
+
+    """
+
+    # Files already reported, to only report them once
+    _reported_files = None
+
+
+    def __init__(self):
+        self._reported_files = set()
+
+
+    def parse_line(self, line):
+        """return: the RenameProgress or RenameResult line stands for, see
+                   iter_rename_events(). None for the other lines.
+
+        """
+
+        result = None
+        match = _RENAMED_LINE_RE.match(line)
+        if match:
+            result = RenameResult(
+                match.group(1), match.group(2), RENAME_STATUS_RENAMED,
+                match.group(3) or "")
+        else:
+            match = _MESSAGE_LINE_RE.match(line)
+            if match:
+                status = RENAME_STATUS_WARNING
+                if match.group(1) == "Error":
+                    status = RENAME_STATUS_ERROR
+                result = RenameResult(
+                    match.group(3), None, status, match.group(2).strip())
+            else:
+                match = _PROGRESS_LINE_RE.match(line)
+                if match:
+                    return RenameProgress(
+                        match.group(1), int(match.group(2)), int(match.group(3)))
+
+        if result == None or result.file in self._reported_files:
+            return None
+        self._reported_files.add(result.file)
+        _add_result_metrics(result)
+        return result
+
+
+def make_executable_args(path_to_bin):
+    """return: the arguments running the exiftool at path_to_bin. That's the
+               executable itself, or perl and the script for the exiftool
+               Perl script when it can't be run directly (a .pl file, or a
+               script without the execute permission as found in the
+               Image-ExifTool archive).
+
+    """
+
+    if path_to_bin.lower().endswith(".pl"):
+        return ["perl", path_to_bin]
+    if (os.name == "posix" and os.path.isfile(path_to_bin)
+            and not os.access(path_to_bin, os.X_OK) and _is_perl_script(path_to_bin)):
+        return ["perl", path_to_bin]
+    return [path_to_bin]
+
+
+def make_command(executable_args, args):
+    """Builds the argv of an exiftool process, without any shell involved.
+
+    Arguments that would make the command line longer than
+    MAX_COMMAND_LINE_LENGTH (ex. long file lists) are written to a temporary
+    argument file given to exiftool with -@, one argument per line. Like the
+    stay_open session, the process gets CHARSET_ARGS.
+
+    Parameters:
+        executable_args: see make_executable_args()
+
+        args: list of exiftool arguments
+
+    return: (argv, argfile_path). argfile_path is None when no argument file
+            was needed. Otherwise delete it once the process exited.
+
+    """
+
+    argv = list(executable_args) + CHARSET_ARGS + list(args)
+    if len(subprocess.list2cmdline(argv)) <= MAX_COMMAND_LINE_LENGTH:
+        return argv, None
+
+    fd, argfile_path = tempfile.mkstemp(prefix="photorename-", suffix=".args")
+    with os.fdopen(fd, "w", encoding="utf-8") as argfile:
+        for arg in args:
+            argfile.write(arg + "\n")
+    return list(executable_args) + CHARSET_ARGS + ["-@", argfile_path], argfile_path
+
+
+def apply_renames(renames, messages=None):
+    """Renames files on disk, never overwriting any.
+
+    Parameters:
+        renames: list of (file, new_file), see renameplanner.execute_renames()
+
+        messages: optional dictionary of file to the message of its result
+                   when it is renamed (ex. where its date came from)
+
+    return: list of RenameResult in the order the renames were done
+
+    """
+
+    with metrics.span("filesystem_renames"):
+        rename_results = renameplanner.execute_renames(renames)
+
+    results = []
+    for file, new_file, error in rename_results:
+        if error == None:
+            message = ""
+            if messages != None:
+                message = messages.get(file, "")
+            result = RenameResult(file, new_file, RENAME_STATUS_RENAMED, message)
+        else:
+            result = RenameResult(file, None, RENAME_STATUS_ERROR, error)
+        _add_result_metrics(result)
+        results.append(result)
+    return results
+
+
+def _is_perl_script(path):
+    try:
+        with open(path, "rb") as file:
+            first_line = file.readline(256)
+    except OSError:
+        return False
+    return first_line.startswith(b"#!") and b"perl" in first_line
+
+
+def _format_date_time(value, date_format):
+    """Formats an exiftool date and time value (ex. "2012:02:27 13:45:12").
+
+    return: the formatted string or None if the value isn't a valid date
+
+    """
+
+    if not isinstance(value, str):
+        return None
+    try:
+        return time.strftime(
+            date_format,
+            time.strptime(value[:19], ExiftoolWrap.EXIFTOOL_DATE_FORMAT))
+    except ValueError:
+        return None
+
+
+def _path_key(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def _find_date_tag(tags, date_tags):
+    """Walks a chain of date tags over the tags read from a file.
+
+    return: (tag, complete). tag is the first of date_tags with a valid date
+            in tags, None if there is none. complete is False if a tag before
+            it wasn't looked for, the file must then be read again.
+
+    """
+
+    read_tags = tags.get(_READ_TAGS_KEY, _DEFAULT_READ_TAGS)
+    for tag in date_tags:
+        if _format_date_time(tags.get(tag), ExiftoolWrap.DATE_FORMAT) != None:
+            return tag, True
+        if tag not in read_tags:
+            return None, False
+    return None, True
+
+
+def _add_file_modify_date(file, tags):
+    """Adds the FileModifyDate of file to tags, formatted like exiftool's
+    (ex. "2012:02:27 13:45:12+01:00").
+
+    """
+
+    try:
+        local_time = time.localtime(os.stat(file).st_mtime)
+    except OSError:
+        return
+
+    offset = local_time.tm_gmtoff
+    tags[_FILE_MODIFY_DATE_TAG] = (
+        time.strftime(ExiftoolWrap.EXIFTOOL_DATE_FORMAT, local_time)
+        + "%s%02d:%02d" % ("-" if offset < 0 else "+",
+                           abs(offset) // 3600, abs(offset) % 3600 // 60))
+    tags[_READ_TAGS_KEY] = tags.get(_READ_TAGS_KEY, []) + [_FILE_MODIFY_DATE_TAG]
+
+
+_COPY_NUMBER_RE = re.compile(r"-[1-9][0-9]*$")
+
+
+def _add_result_metrics(result):
+    """Counts a RenameResult in the run metrics."""
+
+    if not metrics.is_enabled():
+        return
+
+    metrics.add("files")
+    if result.status == RENAME_STATUS_RENAMED:
+        metrics.add("renamed")
+        try:
+            metrics.add("bytes", os.path.getsize(result.new_file))
+        except OSError:
+            pass
+        # Names only get a copy number when they collide with another file
+        if _COPY_NUMBER_RE.search(os.path.splitext(os.path.basename(result.new_file))[0]):
+            metrics.add("collisions")
+    elif result.status == RENAME_STATUS_ERROR:
+        metrics.add("errors")
+    else:
+        metrics.add("warnings")
 
 
 class ExiftoolWrap:
+    # Seconds we wait for a candidate executable to report its version
+    VALIDATION_TIMEOUT = 30
+
+    # Date and time format used in the new file names
+    DATE_FORMAT = "%Y-%m-%d_%Hh%Mm%Ss"
+
+    # Format of the date and time tag values reported by exiftool
+    EXIFTOOL_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+    # Tags the date and time of a file is taken from, the first one it has.
+    # See set_date_tags().
+    DEFAULT_DATE_TAGS = ("DateTimeOriginal",)
+
+    # Chain that also names videos, scans and screenshots, by their creation
+    # date and, as a last resort, their modification date
+    FALLBACK_DATE_TAGS = ("DateTimeOriginal",
+                          "CreateDate",
+                          "MediaCreateDate",
+                          "TrackCreateDate",
+                          "FileModifyDate")
+
+    # QuickTime tags stored in the moov atom, which many cameras write after
+    # the mdat atom holding the media. -fast2 stops reading at mdat.
+    QUICKTIME_DATE_TAGS = ("CreateDate",
+                           "ModifyDate",
+                           "MediaCreateDate",
+                           "MediaModifyDate",
+                           "TrackCreateDate",
+                           "TrackModifyDate")
+
+    # Names the exiftool executable is looked for under. Elsewhere than on
+    # Windows it is the Perl script, installed as "exiftool" by the packages.
+    if sys.platform == "win32":
+        EXECUTABLE_NAMES = ("exiftool.exe",)
+    else:
+        EXECUTABLE_NAMES = ("exiftool", "exiftool.pl")
+
     _path = None
     _path_to_binary = None
+    _session = None
+    _worker_sessions = None
+    _date_tags = DEFAULT_DATE_TAGS
+
+    # Version reported by the executable and (size, mtime_ns) of its file
+    # when it was validated
+    _version = None
+    _binary_stat = None
+
+    # True if the executable was trusted from a previous validation without
+    # being run. See verify_installation().
+    _unverified = False
+
+
+    def __init__(self, path="", installation_info=None):
+        """
+        Parameters:
+            path: directory where exiftool may be installed (ex. our local
+                       application data)
 
+            installation_info: get_installation_info() of a previous run. If
+                       its executable still has the same size and modification
+                       time, it is trusted without being run, which saves
+                       exiftool startups at launch. Otherwise its path is tried
+                       before any other location.
+
+        """
 
-    def __init__(self, path=""):
         self._path = path
-        self._detect_installation()
+        self._worker_sessions = []
+        with metrics.span("detect_installation"):
+            if installation_info != None and installation_info.get("path"):
+                if self._trust_installation(installation_info):
+                    return
+                if self.set_exiftool_path_manually(installation_info["path"]):
+                    return
+            self._detect_installation()
 
 
     #
     # Public
     #
-    def launch_file_rename(self, path_to_images, prefix, file_ext, use_date_time):
-        """Launches exiftool with a command to rename all images files
+    def launch_file_rename(self, path_to_images, prefix, file_types, use_date_time):
+        """Sends exiftool a command to rename all images files
+
+        All the file types are handled by a single exiftool command so the
+        directory is only scanned once.
 
         Parameters:
             path_to_images: directory where to look for images (non recursive)
 
             prefix: prefix to add to the renamed files
 
-            file_ext: which file types to rename specified by file extension
-                       (ex. .jpg)
+            file_types: which file types to rename specified by a list of file
+                       patterns (ex. ["*.jpg", "*.cr2"]). A string of patterns
+                       separated by ";" is also accepted. "*.*" matches all
+                       the files.
 
             use_date_time: True will add the date and time taken to the
                        filename of the images
 
+        return: (command_line, command) where command is an ExiftoolCommand.
+                Its output can be turned into per file results with
+                parse_rename_output(). None if exiftool isn't installed or
+                file_types selects nothing.
+
         """
 
         if not self.is_installed():
@@ -51,20 +864,481 @@ class ExiftoolWrap:
         # date format string.
 
         # The full command should look something like this:
-        # exiftool.exe "-FileName<MyPrefix_${DateTimeOriginal}%-c.%e" -d "%Y-%m-%d_%Hh%Mm%Ss" c:\myfolder
+        # exiftool.exe "-FileName<MyPrefix_${DateTimeOriginal}%-c.%e" -d "%Y-%m-%d_%Hh%Mm%Ss" -v -ext jpg -ext cr2 c:\myfolder
+
+        args = self.get_rename_args(path_to_images, prefix, file_types, use_date_time)
+        if args == None:
+            print("Error: No file types selected")
+            return
+        command_line = subprocess.list2cmdline(self.get_executable_args() + CHARSET_ARGS + args)
+
+        return command_line, ExiftoolCommand(self._session, args)
+
+
+    def get_rename_args(self, path_to_images, prefix, file_types, use_date_time):
+        """return: the exiftool arguments of launch_file_rename(), for callers
+                   running exiftool by themselves (see asyncrename). None if
+                   file_types selects nothing.
+
+        """
+
+        selection_args = self._make_file_selection_args(path_to_images, file_types)
+        if selection_args == None:
+            return None
+        return self._make_rename_args(prefix, use_date_time) + selection_args
+
+
+    def rename_files(self, path_to_images, prefix, file_types, use_date_time):
+        """Same as launch_file_rename() but waits for the command to complete.
+
+        return: list of RenameResult, one per file that exiftool reported on.
+                None if exiftool isn't installed.
+
+        """
+
+        if not self.is_installed():
+            return None
+
+        launched = self.launch_file_rename(
+            path_to_images, prefix, file_types, use_date_time)
+        if launched == None:
+            return []
+        command = launched[1]
+        with metrics.span("exiftool_rename"):
+            return parse_rename_output(
+                line for stream, line in command.iter_output())
+
+
+    def iter_file_rename(self, path_to_images, prefix, file_types, use_date_time):
+        """Generator version of rename_files() following the rename as it
+        goes, for callers without a GUI.
+
+        return: yields RenameProgress and RenameResult, see
+                iter_rename_events(). Nothing if exiftool isn't installed.
+
+        """
+
+        if not self.is_installed():
+            return
+
+        launched = self.launch_file_rename(
+            path_to_images, prefix, file_types, use_date_time)
+        if launched == None:
+            return
+        command = launched[1]
+        with metrics.span("exiftool_rename"):
+            for event in iter_rename_events(
+                    line for stream, line in command.iter_output()):
+                yield event
+
+
+    def rename_file_list(self, files, prefix, use_date_time,
+                         chunk_size=dirscan.DEFAULT_CHUNK_SIZE):
+        """Generator that renames files given by any iterable, typically
+        dirscan.scan_files().
+
+        The files are sent to exiftool in chunks as they come, so renaming
+        starts right away and the whole list is never held in memory. Chunks
+        are renamed one after the other, giving the same names as a single
+        command would.
+
+        Parameters:
+            files: iterable over the paths of the files to rename
+
+            chunk_size: maximum number of files per exiftool command
+
+            See launch_file_rename() for the other parameters.
+
+        return: yields a RenameResult per file that exiftool reported on
+
+        """
+
+        if not self.is_installed():
+            return
+
+        args = self._make_rename_args(prefix, use_date_time)
+        for chunk in dirscan.iter_chunks(files, chunk_size):
+            command = ExiftoolCommand(self._session, args + chunk)
+            with metrics.span("exiftool_rename"):
+                results = parse_rename_output(
+                    line for stream, line in command.iter_output())
+            for result in results:
+                yield result
+
+
+    def rename_files_in_parallel(self, path_to_images, prefix, file_types,
+                                 use_date_time, workers=None, cache=None,
+                                 group_companions=False):
+        """Parallel version of rename_files().
+
+        The files are listed once and handed to rename_file_list_in_parallel().
+
+        Parameters:
+            workers: number of exiftool processes. Defaults to the number of
+                       CPU cores.
+
+            cache: optional metacache.MetadataCache remembering the dates
+                       and times already read.
+
+            group_companions: True to rename the companion files (ex.
+                       IMG_0001.CR2 and IMG_0001.XMP) together, see
+                       plan_renames().
+
+            See launch_file_rename() for the other parameters.
 
-        date_time_original = ""
+        return: list of RenameResult, one per file that was renamed or couldn't
+                be. None if exiftool isn't installed.
+
+        """
+
+        if not self.is_installed():
+            return None
+
+        with metrics.span("scan"):
+            files = sorted(dirscan.scan_files(path_to_images, file_types))
+        return self.rename_file_list_in_parallel(
+            files, prefix, use_date_time, workers, cache, group_companions)
+
+
+    def rename_file_list_in_parallel(self, files, prefix, use_date_time,
+                                     workers=None, cache=None,
+                                     group_companions=False):
+        """Renames a list of files, reading their dates with parallel workers.
+
+        The files are split into one shard per worker. Each worker is a
+        persistent exiftool session reading the date and time of its shard.
+        Files exifreader can handle don't need exiftool at all.
+
+        The new names are then planned in memory by renameplanner, in the
+        same order and with the same copy numbers that exiftool's %-c would
+        give them, and the files are renamed directly.
+
+        Parameters:
+            files: list of the paths of the files to rename, in the order
+                       they must be renamed
+
+            See rename_files_in_parallel() for the other parameters.
+
+        return: list of RenameResult, one per file that was renamed or couldn't
+                be. None if exiftool isn't installed.
+
+        """
+
+        if not self.is_installed():
+            return None
+
+        date_sources = {}
+        renames, results = self.plan_renames(
+            files, prefix, use_date_time, workers, cache, group_companions, date_sources)
+        return results + apply_renames(renames, self.get_date_source_messages(date_sources))
+
+
+    def launch_file_list_rename(self, files, prefix, use_date_time,
+                                workers=None, cache=None, group_companions=False):
+        """Same as rename_file_list_in_parallel() but returns a command to run
+        instead, like launch_file_rename() does.
+
+        return: (description, command) where command is a
+                PlannedRenameCommand. None if exiftool isn't installed.
+
+        """
+
+        if not self.is_installed():
+            return
+
+        description = "Planned rename of %d files" % len(files)
         if use_date_time:
-            date_time_original = "${DateTimeOriginal}"
+            description += ", date tags: " + ";".join(self._date_tags)
+        if group_companions:
+            description += ", companions grouped"
+        return description, PlannedRenameCommand(
+            self, files, prefix, use_date_time, workers, cache, group_companions)
+
+
+    def plan_renames(self, files, prefix, use_date_time, workers=None, cache=None,
+                     group_companions=False, date_sources=None):
+        """Reads the dates and times of files and gives them their new names,
+        without renaming anything. See rename_file_list_in_parallel().
+
+        The date and time of a file comes from the first of the date tags
+        (see set_date_tags()) it has, all read at once.
+
+        With group_companions, files sharing their directory and their name
+        without extension are renamed as a group (see companions). The date
+        and time of a group is read from its source file only, or the next
+        file of the group if the source doesn't have any, and all its files
+        get the same new name and copy number.
+
+        Parameters:
+            date_sources: optional dictionary filled with the tag the date
+                       and time of each renamed file came from
+
+        return: (renames, results) where renames is the list of
+                (file, new_file) to give to apply_renames(), in that order, and
+                results a list of RenameResult for the files that can't be
+                renamed. Files that keep their name are in neither.
+
+        """
+
+        if group_companions:
+            with metrics.span("group_companions"):
+                groups = companions.group_companions(files)
+        else:
+            groups = [[file] for file in files]
+
+        results = []
+        new_bases = []
+        if use_date_time:
+            tags = self._read_group_date_tags(groups, workers, cache)
+            for group in groups:
+                file_tags = tags.get(group[0], {})
+                tag = _find_date_tag(file_tags, self._date_tags)[0]
+                if "Error" in file_tags:
+                    results += [RenameResult(
+                        file, None, RENAME_STATUS_ERROR, file_tags["Error"])
+                        for file in group]
+                elif tag == None:
+                    results += [RenameResult(
+                        file, None, RENAME_STATUS_WARNING,
+                        "[minor] Tag '" + "', '".join(self._date_tags) + "' not defined")
+                        for file in group]
+                else:
+                    metrics.add("date_source_" + tag, len(group))
+                    date_time = _format_date_time(file_tags[tag], self.DATE_FORMAT)
+                    new_bases.append((group, prefix + date_time))
+                    if date_sources != None:
+                        for file in group:
+                            date_sources[file] = tag
+        else:
+            new_bases = [(group, prefix) for group in groups]
+
+        with metrics.span("plan_renames"):
+            planner = renameplanner.RenamePlanner()
+            renames = []
+            for group, new_base in new_bases:
+                if len(group) == 1:
+                    new_files = [planner.add(group[0], new_base)]
+                else:
+                    new_files = planner.add_group(
+                        group, new_base, companions.get_extensions(group))
+                for file, new_file in zip(group, new_files):
+                    if new_file != None:
+                        renames.append((file, new_file))
+
+        for result in results:
+            _add_result_metrics(result)
+        return renames, results
+
+
+    def get_date_source_messages(self, date_sources):
+        """return: dictionary of file to the message telling which tag its
+                   date and time came from (ex. "from CreateDate"), to give
+                   to apply_renames(). None with a single date tag, as the
+                   date can only come from that one.
+
+        Parameters:
+            date_sources: dictionary filled by plan_renames()
+
+        """
+
+        if len(self._date_tags) <= 1:
+            return None
+        return dict((file, "from " + tag) for file, tag in date_sources.items())
+
+
+    def read_date_time_original(self, files, workers=None, cache=None):
+        """Reads DateTimeOriginal, SubSecTimeOriginal and OffsetTimeOriginal.
+
+        JPEG and TIFF based files are read directly by exifreader, which is
+        far cheaper than exiftool. The files it can't handle are read by
+        exiftool.
+
+        Parameters:
+            cache: optional metacache.MetadataCache. Files it knows about
+                       aren't read at all.
+
+        return: same as read_tags()
+
+        """
+
+        tags_by_file = {}
+        if cache != None:
+            with metrics.span("cache_lookup"):
+                tags_by_file, files = cache.get_many(files)
+
+        read_tags_by_file = {}
+        exiftool_files = []
+        with metrics.span("read_exif_native"):
+            for file in files:
+                tags = exifreader.read_date_time_original(file)
+                if tags == None:
+                    exiftool_files.append(file)
+                else:
+                    read_tags_by_file[file] = tags
+
+        if exiftool_files:
+            exiftool_tags_by_file = self.read_tags(
+                exiftool_files, list(exifreader.EXIF_TAGS.values()), workers)
+            for file in exiftool_files:
+                # Remember the files without any date too
+                read_tags_by_file[file] = exiftool_tags_by_file.get(file, {})
 
-        command_line = "\"" + self._path_to_binary + \
-                  "\" \"-FileName<" + \
-                  prefix + \
-                  date_time_original + \
-                  "%-c.%e\" -d %Y-%m-%d_%Hh%Mm%Ss \"" + \
-                  os.path.join(path_to_images, file_ext) + "\""
+        if cache != None:
+            with metrics.span("cache_store"):
+                cache.put_many(read_tags_by_file)
 
-        return command_line, self._createProcess(command_line)
+        tags_by_file.update(read_tags_by_file)
+        return tags_by_file
+
+
+    def read_date_tags(self, files, workers=None, cache=None):
+        """Reads the date tags of files (see set_date_tags()) in one pass.
+
+        JPEG and TIFF based files having the first date tag are read directly
+        by exifreader, and movies by quicktimereader, which only reads their
+        headers. The others are read by exiftool, which is asked for the
+        whole chain at once.
+
+        Parameters:
+            cache: optional metacache.MetadataCache. Files it knows about
+                       aren't read at all, unless they were read for other
+                       date tags than the ones needed now.
+
+        return: same as read_tags(). Each dictionary also lists the tags that
+                were looked for, present or not, so the cached ones can be
+                checked against another chain later.
+
+        """
+
+        date_tags = self._date_tags
+
+        tags_by_file = {}
+        if cache != None:
+            with metrics.span("cache_lookup"):
+                cached_tags_by_file, files = cache.get_many(files)
+            stale_files = []
+            for file, tags in cached_tags_by_file.items():
+                if _find_date_tag(tags, date_tags)[1]:
+                    tags_by_file[file] = tags
+                else:
+                    stale_files.append(file)
+            cache.reject(stale_files)
+            files += stale_files
+
+        read_tags_by_file = {}
+        exiftool_files = []
+        with metrics.span("read_exif_native"):
+            for file in files:
+                tags = exifreader.read_date_tags(file)
+                if tags != None:
+                    # EXIF dates can also be found elsewhere by exiftool
+                    read_tags = [tag for tag in exifreader.DATE_TAGS if tag in tags]
+                else:
+                    tags = quicktimereader.read_date_tags(file)
+                    if tags != None:
+                        read_tags = list(quicktimereader.DATE_TAGS)
+                    else:
+                        tags = {}
+                        read_tags = []
+                tags[_READ_TAGS_KEY] = read_tags
+                if _FILE_MODIFY_DATE_TAG in date_tags:
+                    # The file system has it, but it only matters if every
+                    # tag before it is known to be missing
+                    tag, complete = _find_date_tag(
+                        tags, date_tags[:date_tags.index(_FILE_MODIFY_DATE_TAG)])
+                    if tag == None and complete:
+                        _add_file_modify_date(file, tags)
+
+                if _find_date_tag(tags, date_tags)[1]:
+                    read_tags_by_file[file] = tags
+                else:
+                    exiftool_files.append(file)
+
+        if exiftool_files:
+            tags_to_read = list(date_tags) + [tag for tag in exifreader.EXIF_TAGS.values()
+                                              if tag not in date_tags]
+            exiftool_tags_by_file = self.read_tags(exiftool_files, tags_to_read, workers)
+            for file in exiftool_files:
+                # Remember the files without any date too
+                tags = exiftool_tags_by_file.get(file, {})
+                tags[_READ_TAGS_KEY] = list(date_tags)
+                read_tags_by_file[file] = tags
+
+        if cache != None:
+            with metrics.span("cache_store"):
+                cache.put_many(read_tags_by_file)
+
+        tags_by_file.update(read_tags_by_file)
+        return tags_by_file
+
+
+    def read_tags(self, files, tags, workers=None):
+        """Reads tags from files using a pool of exiftool sessions.
+
+        Parameters:
+            files: list of file paths
+
+            tags: list of tag names (ex. ["DateTimeOriginal"])
+
+            workers: number of exiftool processes sharing the files. Defaults
+                       to the number of CPU cores.
+
+        return: dictionary of file path to a dictionary of tag name to value,
+                as reported by exiftool. Missing tags are absent. Exiftool
+                reports problems reading a file with an "Error" or "Warning"
+                entry.
+
+        """
+
+        if not files:
+            return {}
+
+        if workers == None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(files)))
+
+        # Contiguous shards keep files from the same directory together
+        shard_size = (len(files) + workers - 1) // workers
+        shards = [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+
+        # Only needed here and slow to import
+        import concurrent.futures
+
+        if any(tag in self.QUICKTIME_DATE_TAGS for tag in tags):
+            speed_arg = "-fast"
+        else:
+            speed_arg = "-fast2"
+        args = ["-j", speed_arg] + ["-" + tag for tag in tags]
+        tags_by_file = {}
+        with metrics.span("read_tags_exiftool"), \
+                concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._read_shard_tags, self._get_worker_session(i), args, shard)
+                       for i, shard in enumerate(shards)]
+            for future in futures:
+                tags_by_file.update(future.result())
+
+        return tags_by_file
+
+
+    def set_date_tags(self, date_tags):
+        """Sets the tags the date and time of the files is taken from when
+        renaming, in order of preference (ex. FALLBACK_DATE_TAGS). Each file
+        uses the first one it has.
+
+        Exiftool evaluates the whole chain in the single pass it makes over
+        the files, and so does plan_renames().
+
+        """
+
+        date_tags = tuple(date_tags)
+        for tag in date_tags:
+            if not _DATE_TAG_RE.match(tag):
+                raise ValueError("Invalid tag name: " + tag)
+        self._date_tags = date_tags or self.DEFAULT_DATE_TAGS
+
+
+    def get_date_tags(self):
+        return self._date_tags
 
 
     def is_installed(self):
@@ -89,72 +1363,303 @@ class ExiftoolWrap:
     def get_path_to_binary(self):
         return self._path_to_binary
 
+
+    def get_executable_args(self):
+        """return: the arguments running our exiftool, see
+                   make_executable_args(). None if exiftool isn't installed.
+
+        """
+
+        if self._path_to_binary == None:
+            return None
+        return make_executable_args(self._path_to_binary)
+
+
+    def get_installation_info(self):
+        """return: dictionary describing the executable in use, to be given back
+                   to the constructor on the next run:
+                       {"path": ..., "version": "12.40", "size": ..., "mtime_ns": ...}
+                   None if exiftool isn't installed.
+
+        """
+
+        if self._path_to_binary == None or self._binary_stat == None:
+            return None
+        return {"path": self._path_to_binary,
+                "version": self._version,
+                "size": self._binary_stat[0],
+                "mtime_ns": self._binary_stat[1]}
+
+
+    def get_version(self):
+        return self._version
+
+
+    def verify_installation(self):
+        """Runs an executable that was trusted from its installation_info.
+
+        The check starts our session, so it isn't wasted: the next commands
+        use it. It can run on a background thread as long as nothing else
+        uses this object meanwhile.
+
+        return: True if exiftool is installed and working. If the trusted
+                executable doesn't work, exiftool is detected again.
+
+        """
+
+        if not self._unverified:
+            return self.is_installed()
+
+        self._unverified = False
+        try:
+            with metrics.span("verify_exiftool"):
+                version = self._session.execute(["-ver"], timeout=self.VALIDATION_TIMEOUT)[0]
+            if len(version.strip()) > 0:
+                self._version = version.strip()
+                return True
+        except (OSError, ValueError, ExiftoolSessionError):
+            pass
+
+        print("The exiftool executable doesn't work anymore: " + self._path_to_binary)
+        self.close()
+        self._session = None
+        self._version = None
+        self._binary_stat = None
+        return self._detect_installation()
+
+
+    def close(self):
+        """Shuts down the exiftool session. It will be restarted if needed."""
+
+        if self._session != None:
+            self._session.close()
+
+        for session in self._worker_sessions:
+            session.close()
+        self._worker_sessions = []
+
     #
     # Private
     #
 
+    def _make_rename_args(self, prefix, use_date_time):
+        if use_date_time:
+            # Exiftool uses the last assignment whose tags the file has, so
+            # the preferred tag goes last
+            file_name_args = ["-FileName<" + prefix + "${" + tag + "}%-c.%e"
+                              for tag in reversed(self._date_tags)]
+        else:
+            file_name_args = ["-FileName<" + prefix + "%-c.%e"]
+
+        # -v makes exiftool report every file it renames and -progress every
+        # file it starts on, with its number and the total
+        return file_name_args + ["-d", self.DATE_FORMAT, "-v", "-progress"]
+
+
+    def _make_file_selection_args(self, path_to_images, file_types):
+        """Turns file patterns into exiftool arguments selecting the files.
+
+        Patterns that only filter on the extension become -ext options on a
+        single directory scan. Anything more specific (ex. "IMG_*.jpg") is
+        passed as is for exiftool to expand.
+
+        return: list of arguments. None if file_types selects nothing, as
+                exiftool would rename the whole directory without any.
+
+        """
+
+        extensions, patterns = dirscan.parse_file_types(file_types)
+        if not extensions and not patterns:
+            return None
+        extensions = sorted(extensions)
+        patterns = [os.path.join(path_to_images, pattern) for pattern in patterns]
+
+        if patterns:
+            # Mixing -ext with explicit files would filter the explicit files
+            # too. Fall back to patterns for everything.
+            return patterns + [os.path.join(path_to_images, "*." + e)
+                               for e in extensions]
+
+        args = []
+        for extension in extensions:
+            args += ["-ext", extension]
+        return args + [path_to_images]
+
+
+    def _get_worker_session(self, index):
+        """Worker sessions are kept running between calls. The first worker is
+        our main session.
+
+        """
+
+        if index == 0:
+            return self._session
+
+        while len(self._worker_sessions) < index:
+            self._worker_sessions.append(ExiftoolSession(self.get_executable_args()))
+        return self._worker_sessions[index - 1]
+
+
+    def _read_shard_tags(self, session, args, files):
+        """Runs on a worker thread. return: same as read_tags()"""
+
+        # Exiftool may report paths differently (ex. with / on Windows) so the
+        # paths are matched in their normalized form.
+        files_by_key = dict((_path_key(file), file) for file in files)
+
+        tags_by_file = {}
+        stdout, stderr = session.execute(args + files)
+        try:
+            entries = json.loads(stdout) if stdout.strip() else []
+        except ValueError:
+            entries = []
+        for entry in entries:
+            file = files_by_key.get(_path_key(entry.pop("SourceFile", "")))
+            if file != None:
+                tags_by_file[file] = entry
+
+        # Files exiftool couldn't read at all are only mentioned on stderr
+        for line in stderr.splitlines():
+            match = _MESSAGE_LINE_RE.match(line)
+            if match:
+                file = files_by_key.get(_path_key(match.group(3)))
+                if file != None:
+                    tags_by_file.setdefault(file, {}).setdefault(
+                        match.group(1), match.group(2).strip())
+
+        return tags_by_file
+
+
+    def _read_group_date_tags(self, groups, workers, cache):
+        """Reads the date and time of groups of companion files, see
+        plan_renames(). Only the first file of each group is read, then the
+        next file of the groups that are still without a date, and so on.
+
+        return: dictionary of the first file of each group to the tags of the
+                file the date was found in. The tags of the first file if
+                none had one.
+
+        """
+
+        tags_by_group = {}
+        pending_groups = groups
+        index = 0
+        while pending_groups:
+            tags_by_file = self.read_date_tags(
+                [group[index] for group in pending_groups], workers, cache)
+
+            next_pending_groups = []
+            for group in pending_groups:
+                tags = tags_by_file.get(group[index], {})
+                has_date_time = _find_date_tag(tags, self._date_tags)[0] != None
+                if index == 0 or has_date_time:
+                    tags_by_group[group[0]] = tags
+                if not has_date_time and index + 1 < len(group):
+                    next_pending_groups.append(group)
+
+            pending_groups = next_pending_groups
+            index += 1
+
+        return tags_by_group
+
+
     def _detect_installation(self):
         """Returns True if the installation has been detected successfully."""
 
         self._path_to_binary = None
-        if not self._try_installation_path(self._path, "exiftool.exe"):
-            self._try_installation_path("", "exiftool.exe")
+        for executable_name in self.EXECUTABLE_NAMES:
+            # Our installation first, then the PATH
+            if (self._try_installation_path(self._path, executable_name)
+                    or self._try_installation_path("", executable_name)):
+                break
 
         return self._path_to_binary != None
 
 
+    def _trust_installation(self, installation_info):
+        """Uses the executable of installation_info without running it if its
+        file didn't change since it was validated.
+
+        return: True if it is now our executable
+
+        """
+
+        path_to_bin = installation_info["path"]
+        try:
+            stat = os.stat(path_to_bin)
+        except OSError:
+            return False
+
+        if (installation_info.get("size") != stat.st_size
+                or installation_info.get("mtime_ns") != stat.st_mtime_ns
+                or not installation_info.get("version")):
+            return False
+
+        self.close()
+        self._session = ExiftoolSession(make_executable_args(path_to_bin))
+        self._path_to_binary = path_to_bin
+        self._version = installation_info["version"]
+        self._binary_stat = (stat.st_size, stat.st_mtime_ns)
+        self._unverified = True
+        return True
+
+
     def _try_installation_path(self, path, executable_name):
-        """True if the path to the binary was found and _path_to_binary was set"""
+        """True if the path to the binary was found and _path_to_binary was set.
+        An empty path looks for executable_name in the PATH.
+
+        """
 
         ret = False
-        if self._is_valid_exiftool_executable(os.path.join(path, executable_name)):
+        if path == "":
+            # Resolved here so we remember where it was found
+            path_to_bin = shutil.which(executable_name)
+            if path_to_bin == None:
+                return False
+        else:
+            path_to_bin = os.path.join(path, executable_name)
+
+        if self._is_valid_exiftool_executable(path_to_bin):
             self._path = path
-            self._path_to_binary = os.path.join(path, executable_name)
+            self._path_to_binary = path_to_bin
             ret = True
         return ret
 
 
     def _is_valid_exiftool_executable(self, path_to_bin):
-        """Will check to see if path_to_bin is pointing to a copy of exiftool.exe"""
+        """Will check to see if path_to_bin is pointing to a copy of exiftool
+
+        The check starts a session on path_to_bin. When the executable is valid,
+        that session replaces our current one so the process we just paid for
+        gets reused by the following commands.
+
+        """
+
+        if (self._session != None and path_to_bin == self._path_to_binary
+                and (self._session.is_running() or self._unverified)):
+            return True
+
         ret = False
+        session = ExiftoolSession(make_executable_args(path_to_bin))
         try:
-            popen = self._createProcess("\"" + path_to_bin + "\" -ver")
-            popen.wait()    # returncode is set by wait() as we need to wait for the program to finish
-            if (popen.returncode == 0) and (len(popen.stdout.read()) > 0):
+            # Taken first so a change made meanwhile invalidates it
+            stat = os.stat(path_to_bin)
+            with metrics.span("validate_exiftool"):
+                version = session.execute(["-ver"], timeout=self.VALIDATION_TIMEOUT)[0]
+            if len(version.strip()) > 0:
                 print("Found exiftool: " + path_to_bin)
                 ret = True
-        except:
+        except (OSError, ValueError, ExiftoolSessionError):
             pass
 
-        return ret
+        if ret:
+            self.close()
+            self._session = session
+            self._version = version.strip()
+            self._binary_stat = (stat.st_size, stat.st_mtime_ns)
+            self._unverified = False
+        else:
+            session.close()
 
+        return ret
 
-    def _createProcess(self, command):
-        """Helper that wraps the Popen arguments that we require to launch exiftool"""
-
-        # DJOLY:TODO: Known issues to fix before deployment:
-        #
-        # The current Popen setup works for our needs but breaks the following
-        # rules:
-        #
-        # * Technically we shoud be splitting the command in a list and not
-        #   execute in a shell prompt. Unfortunately, this seems to break on
-        #   Windows and more investigation is needed to understand how we are
-        #   supposed to call exiftool. The drawbacks of this bastardized call
-        #   don't seem severe for this application.
-        #
-        # * The subprocess.Popen documentation has the following note: Do not
-        #   use stdout=PIPE or stderr=PIPE with this function. As the pipes are
-        #   not being read in the current process, the child process may block
-        #   if it generates enough output to a pipe to fill up the OS pipe
-        #   buffer.
-        #
-        # ref: http://docs.python.org/dev/library/subprocess.html
-        return subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-
-
-# OS check since currently we only support win32
-if sys.platform != "win32":
-    print("Error: Only win32 is supported.")
-    assert(sys.platform == "win32")
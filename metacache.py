@@ -0,0 +1,166 @@
+"""Persistent cache of the metadata read from the files.
+
+The same folders are often renamed many times. Files that didn't change since
+their metadata was read don't need to be read again, by exiftool or
+otherwise.
+
+Entries are keyed on the device and inode of the file and validated with its
+size and modification time. Renaming a file keeps its entry valid, which is
+exactly what happens to every file we process.
+
+"""
+
+# Public
+import json
+import os
+import sqlite3
+import time
+
+
+class MetadataCache:
+    """SQLite backed cache of file tags.
+
+    Usage:
+        cache = MetadataCache(os.path.join(local_appdata_path, "metadata.db"))
+        tags_by_file, missing_files = cache.get_many(files)
+        ...read missing_files...
+        cache.put_many(read_tags_by_file)
+        cache.close()
+
+    """
+
+    FILENAME = "metadata.db"
+
+    # Entries that weren't used for that long are evicted on close()
+    DEFAULT_MAX_AGE_DAYS = 90
+
+    hits = 0
+    misses = 0
+
+    _connection = None
+    _max_age_days = DEFAULT_MAX_AGE_DAYS
+
+    # Stat of the files looked up by get_many() and not found. Reused by
+    # put_many() so the key matches what was there when the tags were read.
+    _pending_stats = None
+
+
+    def __init__(self, path, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self._max_age_days = max_age_days
+        self._pending_stats = {}
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER,"
+            " tags TEXT, last_used REAL,"
+            " PRIMARY KEY (device, inode))")
+        self._connection.commit()
+
+
+    #
+    # Public
+    #
+
+    def get_many(self, files):
+        """Looks up files in the cache.
+
+        return: (tags_by_file, missing_files) where tags_by_file is a dictionary
+                of file to the tags cached for it and missing_files the list of
+                files that must be read.
+
+        """
+
+        tags_by_file = {}
+        missing_files = []
+        used_keys = []
+        for file in files:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                missing_files.append(file)
+                continue
+
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, tags FROM files WHERE device = ? AND inode = ?",
+                (stat.st_dev, stat.st_ino)).fetchone()
+            if row != None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                tags_by_file[file] = json.loads(row[2])
+                used_keys.append((stat.st_dev, stat.st_ino))
+            else:
+                self._pending_stats[file] = stat
+                missing_files.append(file)
+
+        self.hits += len(tags_by_file)
+        self.misses += len(missing_files)
+
+        now = time.time()
+        self._connection.executemany(
+            "UPDATE files SET last_used = ? WHERE device = ? AND inode = ?",
+            [(now,) + key for key in used_keys])
+        self._connection.commit()
+
+        return tags_by_file, missing_files
+
+
+    def reject(self, files):
+        """Tells that the tags get_many() found for files are of no use (ex.
+        they were read for other tags) and the files are read again. They
+        count as misses instead of hits.
+
+        """
+
+        self.hits -= len(files)
+        self.misses += len(files)
+
+
+    def put_many(self, tags_by_file):
+        """Stores the tags read from files.
+
+        Tags reporting an error aren't stored so the file is read again next
+        time.
+
+        """
+
+        now = time.time()
+        rows = []
+        for file, tags in tags_by_file.items():
+            if "Error" in tags:
+                continue
+
+            stat = self._pending_stats.pop(file, None)
+            if stat == None:
+                try:
+                    stat = os.stat(file)
+                except OSError:
+                    continue
+
+            rows.append((stat.st_dev, stat.st_ino, stat.st_size,
+                         stat.st_mtime_ns, json.dumps(tags), now))
+
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._connection.commit()
+
+
+    def evict(self):
+        """Removes the entries that weren't used for max_age_days."""
+
+        self._connection.execute(
+            "DELETE FROM files WHERE last_used < ?",
+            (time.time() - self._max_age_days * 24 * 3600,))
+        self._connection.commit()
+
+
+    def close(self):
+        if self._connection != None:
+            self.evict()
+            self._connection.close()
+            self._connection = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,180 @@
+"""Lightweight instrumentation of the rename runs.
+
+Named spans time the phases of a run (exiftool detection, scanning, process
+startup, metadata extraction, renames...) and counters add up files, bytes,
+errors and collisions. end_run() emits everything gathered since the previous
+run as a single JSON record:
+
+    metrics.enable("metrics.jsonl")
+    with metrics.span("scan"):
+        files = ...
+    metrics.add("files", len(files))
+    metrics.end_run("cli")
+
+    {"run": "cli", "start": 1329000000.0, "duration": 1.52,
+     "spans": {"scan": {"count": 1, "seconds": 0.12}}, "counters": {"files": 42}}
+
+Metrics are disabled by default. span() then hands out a shared context
+manager that does nothing and add() returns right away, so the instrumented
+code pays a function call and nothing else.
+
+"""
+
+# Public
+import json
+import sys
+import threading
+import time
+
+
+# Environment variable enabling the metrics of the applications. Its value is
+# the file the records are appended to, "-" for stderr.
+ENVIRONMENT_VARIABLE = "PHOTORENAME_METRICS"
+
+_enabled = False
+_output_path = None
+_lock = threading.Lock()
+
+# Name to [count, seconds]
+_spans = {}
+
+# Name to value
+_counters = {}
+
+_run_start = None
+_run_start_time = None
+
+#
+# Public
+#
+
+def enable(output_path="-"):
+    """Starts gathering metrics.
+
+    Parameters:
+        output_path: file the JSON records are appended to, one per line.
+                   "-" writes them to stderr. None only returns them from
+                   end_run().
+
+    """
+
+    global _enabled, _output_path
+    _output_path = output_path
+    _enabled = True
+    _reset()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name):
+    """return: context manager timing the phase name.
+
+    Spans of the same name add up, and may be entered from any thread.
+
+    """
+
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def add(name, value=1):
+    """Adds value to the counter name."""
+
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def end_run(run_name, **fields):
+    """Emits the record of the run that started with the previous end_run()
+    call, or with enable(), and starts a new one.
+
+    Parameters:
+        run_name: what was run (ex. "cli")
+
+        fields: extra values stored in the record (ex. workers=4)
+
+    return: the record as a dictionary, None if metrics are disabled
+
+    """
+
+    if not _enabled:
+        return None
+
+    with _lock:
+        record = {"run": run_name,
+                  "start": _run_start_time,
+                  "duration": time.perf_counter() - _run_start,
+                  "spans": dict((name, {"count": count, "seconds": seconds})
+                                for name, (count, seconds) in sorted(_spans.items())),
+                  "counters": dict(sorted(_counters.items()))}
+        record.update(fields)
+        _reset()
+
+    if _output_path == "-":
+        print(json.dumps(record), file=sys.stderr)
+    elif _output_path != None:
+        try:
+            with open(_output_path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print("Couldn't write the metrics to " + _output_path + ": " + str(e))
+
+    return record
+
+#
+# Private
+#
+
+class _Span:
+    _name = None
+    _start = None
+
+
+    def __init__(self, name):
+        self._name = name
+
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._start
+        with _lock:
+            total = _spans.get(self._name)
+            if total == None:
+                _spans[self._name] = [1, duration]
+            else:
+                total[0] += 1
+                total[1] += duration
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _reset():
+    global _run_start, _run_start_time
+    _spans.clear()
+    _counters.clear()
+    _run_start = time.perf_counter()
+    _run_start_time = time.time()
@@ -0,0 +1,224 @@
+"""Bounded log of the output of the rename commands.
+
+Only the last lines are kept in memory, in a ring buffer, so a run of any
+size has the same footprint. The full output is spilled to a file on disk,
+rotated when it gets big, where the lines that fell out of the buffer can
+still be read. Error and warning lines are indexed to jump between them.
+
+Lines are numbered from 0, the first line appended, and keep their number
+when older lines are dropped:
+
+    log = outputlog.OutputLog(max_lines=10000, spill_path="/tmp/output.log")
+    log.append_text(text)
+    first, end = log.get_line_range()
+    lines = log.get_lines(max(first, end - 30), 30)
+    error_line = log.find_next_error(first)
+    log.close()
+
+Not thread safe. The output dialog only uses it from the tkinter thread.
+
+"""
+
+# Public
+import bisect
+import collections
+import itertools
+import os
+import os.path
+
+
+# Kinds of lines, see OutputLog.get_line_kind()
+LINE_KIND_ERROR = "error"
+LINE_KIND_WARNING = "warning"
+
+
+class OutputLog:
+    """Ring buffer of output lines, with a spill file and an error index."""
+
+    DIRECTORY_NAME = "logs"
+    FILENAME = "output.log"
+
+    # Lines kept in memory
+    DEFAULT_MAX_LINES = 10000
+
+    # Size of the spill file before it is rotated, and number of old spill
+    # files kept (output.log.1 being the most recent)
+    DEFAULT_SPILL_MAX_BYTES = 16 * 1024 * 1024
+    DEFAULT_SPILL_BACKUP_COUNT = 3
+
+    spill_path = None
+
+    _lines = None
+    _end = 0
+    _partial_line = ""
+
+    # Numbers of the error and warning lines still in _lines, in order
+    _error_lines = None
+
+    _spill_file = None
+    _spill_max_bytes = DEFAULT_SPILL_MAX_BYTES
+    _spill_backup_count = DEFAULT_SPILL_BACKUP_COUNT
+
+
+    def __init__(self, max_lines=None, spill_path=None,
+                 spill_max_bytes=DEFAULT_SPILL_MAX_BYTES,
+                 spill_backup_count=DEFAULT_SPILL_BACKUP_COUNT):
+        """
+        Parameters:
+            max_lines: lines kept in memory. Defaults to DEFAULT_MAX_LINES.
+
+            spill_path: file the full output is written to. None keeps the
+                       output in memory only. An existing spill file, from a
+                       previous run, is rotated first.
+
+            spill_max_bytes, spill_backup_count: rotation of the spill file
+
+        """
+
+        if max_lines == None or max_lines <= 0:
+            max_lines = self.DEFAULT_MAX_LINES
+        self._lines = collections.deque(maxlen=max_lines)
+        self._error_lines = []
+
+        if spill_path != None:
+            self.spill_path = spill_path
+            self._spill_max_bytes = spill_max_bytes
+            self._spill_backup_count = spill_backup_count
+            os.makedirs(os.path.dirname(spill_path), exist_ok=True)
+            if os.path.exists(spill_path) and os.path.getsize(spill_path) > 0:
+                self._rotate_spill_file()
+            self._open_spill_file()
+
+
+    #
+    # Public
+    #
+
+    def append_text(self, text):
+        """Appends output, any number of lines at once. A last line without
+        its line terminator is completed by the next append.
+
+        """
+
+        if self._spill_file != None and text:
+            self._spill(text)
+
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        if not lines:
+            return
+
+        if len(lines) > self._lines.maxlen:
+            # Only the end would be kept anyway
+            self._end += len(lines) - self._lines.maxlen
+            lines = lines[-self._lines.maxlen:]
+
+        for line in lines:
+            if get_line_kind(line) != None:
+                self._error_lines.append(self._end)
+            self._lines.append(line.rstrip("\r"))
+            self._end += 1
+
+        # Forget the errors that fell out of the buffer
+        first = self._end - len(self._lines)
+        if self._error_lines and self._error_lines[0] < first:
+            del self._error_lines[:bisect.bisect_left(self._error_lines, first)]
+
+
+    def get_line_range(self):
+        """return: (first, end) numbers of the lines in memory, end excluded"""
+
+        return self._end - len(self._lines), self._end
+
+
+    def get_lines(self, start, count):
+        """return: list of up to count lines starting at line number start.
+                   Lines that aren't in memory anymore are skipped.
+
+        """
+
+        first = self._end - len(self._lines)
+        start = max(start, first)
+        return list(itertools.islice(self._lines, start - first, start - first + count))
+
+
+    def get_error_count(self):
+        """return: number of error and warning lines in memory"""
+
+        return len(self._error_lines)
+
+
+    def find_next_error(self, line_number):
+        """return: number of the first error or warning line after line_number,
+                   None if there is none
+
+        """
+
+        index = bisect.bisect_right(self._error_lines, line_number)
+        if index < len(self._error_lines):
+            return self._error_lines[index]
+        return None
+
+
+    def find_previous_error(self, line_number):
+        """return: number of the last error or warning line before
+                   line_number, None if there is none
+
+        """
+
+        index = bisect.bisect_left(self._error_lines, line_number)
+        if index > 0:
+            return self._error_lines[index - 1]
+        return None
+
+
+    def flush(self):
+        if self._spill_file != None:
+            self._spill_file.flush()
+
+
+    def close(self):
+        if self._spill_file != None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    #
+    # Private
+    #
+
+    def _spill(self, text):
+        self._spill_file.write(text)
+        if self._spill_file.tell() >= self._spill_max_bytes:
+            self._spill_file.close()
+            self._rotate_spill_file()
+            self._open_spill_file()
+
+
+    def _open_spill_file(self):
+        self._spill_file = open(self.spill_path, "w", encoding="utf-8", errors="replace")
+
+
+    def _rotate_spill_file(self):
+        """output.log becomes output.log.1, output.log.1 output.log.2 and so on."""
+
+        try:
+            for index in range(self._spill_backup_count, 0, -1):
+                source = self.spill_path
+                if index > 1:
+                    source += ".%d" % (index - 1)
+                if os.path.exists(source):
+                    os.replace(source, self.spill_path + ".%d" % index)
+            if self._spill_backup_count <= 0:
+                os.remove(self.spill_path)
+        except OSError as e:
+            print("Couldn't rotate " + self.spill_path + ": " + str(e))
+
+
+def get_line_kind(line):
+    """return: LINE_KIND_ERROR, LINE_KIND_WARNING or None for the other lines"""
+
+    if line.startswith("Error"):
+        return LINE_KIND_ERROR
+    if line.startswith("Warning"):
+        return LINE_KIND_WARNING
+    return None
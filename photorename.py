@@ -1,52 +1,89 @@
 """GUI wrapper application around exiftool to rename photos based on their meta 
 information.
 
+See photorenamecli.py to rename without the GUI.
+
 """
 
 # Coding standards: http://www.python.org/dev/peps/pep-0008/
 
 # Public
-import configparser
 import os
 import os.path
+import queue
 import sys
+import threading
 import time
 import tkinter
 import tkinter.font
 import tkinter.filedialog
+import tkinter.ttk
 
 # Internal
+import dirscan
 import exiftoolwrap
-import exiftoolinst
+import metrics
+import outputlog
+import photorenamecore
 
 class App:
     """The photorename main TKinter UI object."""
 
-    APPLICATION_NAME = "photorename"
+    APPLICATION_NAME = photorenamecore.APPLICATION_NAME
+
+    # How often the background tasks (file types scan, exiftool check) are
+    # checked on
+    BACKGROUND_POLL_INTERVAL_MS = 100
 
     _root = None
     _local_appdata_path = None
 
+    # Extensions found in the medias locations scanned so far
+    _census = None
+    _census_thread = None
+
+    # (path, counts or the OSError raised) handed over by the census thread
+    _census_result = None
+
+    # Runs the exiftool executable we trusted at launch without running it
+    _verification_thread = None
+
+    # Lines of output kept by the output dialog (OutputLogMaxLines)
+    _output_log_max_lines = None
+
+    # Command line settings (OutputFileNameGroupCompanions and
+    # OutputFileNameDateTags), kept as is
+    _output_group_companions = None
+    _output_date_tags = None
+
 
     def __init__(self, root):
+        metrics_path = os.environ.get(metrics.ENVIRONMENT_VARIABLE)
+        if metrics_path:
+            metrics.enable(metrics_path)
+
         self._root = root
+        self._census = dirscan.ExtensionCensus()
         self._ensure_local_appdata()
-        self._exiftool = exiftoolwrap.ExiftoolWrap(self._local_appdata_path)
+
+        # The configuration remembers the exiftool we validated last time. If
+        # it didn't change, it is trusted right away and checked in the
+        # background once the window is up.
+        input_info = photorenamecore.load_config(self._get_config_path())[0]
+        self._exiftool = photorenamecore.create_exiftool(
+            input_info, self._local_appdata_path)
 
         self._create_layout()
         self._set_initial_state()
+        self._start_exiftool_verification()
+
+        metrics.end_run("gui_startup")
 
 
     def _ensure_local_appdata(self):
         """Ensure that we have a local application data directory."""
 
-        # Our local application storage directory (Win32 only)
-        self._local_appdata_path = os.path.join(
-            os.environ['LOCALAPPDATA'], self.APPLICATION_NAME)
-        try:
-            os.mkdir(self._local_appdata_path)
-        except OSError:
-            pass # The directory already exists
+        self._local_appdata_path = photorenamecore.get_local_appdata_path()
 
 
     def _create_layout(self):
@@ -119,6 +156,11 @@ class App:
             variable=self._checkbox_all_file_types_state)
         self._checkbox_all_filetypes.grid(row=ROW_ALL_FILE_TYPES, column=0)
 
+        self._lbl_file_types_census = tkinter.Label(
+            self._frame, justify=tkinter.LEFT, wraplength=350)
+        self._lbl_file_types_census.grid(
+            row=ROW_ALL_FILE_TYPES, column=1, sticky=tkinter.W)
+
         ROW_OUTPUT_INFORMATION = ROW_ALL_FILE_TYPES + 1
 
         tkinter.Label(self._frame, text="-- Output filename informations ------------------").grid(
@@ -190,32 +232,84 @@ class App:
             self._disable_file_types()
         else:
             self._enable_file_types()
+            self._lbl_file_types_census.configure(text="")
 
 
     def _populate_all_file_types(self):
         """Will populate the file types field by reading the different files in
         the medias location and extract their extensions.
 
+        This runs every time an entry loses the focus, so the medias location
+        is scanned on a background thread and its extensions are cached until
+        the directory changes. The field is filled in when the scan completes.
+
         """
 
-        try:
-            allext = {}
-            allfiles = os.listdir(self._entry_medias_location.get())
-            for file in allfiles:
-                ext = os.path.splitext(file)[1]
-                if (ext != None) and (ext != ""):
-                    allext[ext] = ext
+        path = self._entry_medias_location.get()
+        counts = self._census.get(path)
+        if counts != None:
+            self._set_all_file_types(counts)
+            return
+
+        if self._census_thread != None:
+            # _poll_census() starts over if the medias location changed since
+            return
+
+        def scan():
+            try:
+                with metrics.span("scan_file_types"):
+                    self._census_result = (path, self._census.scan(path))
+            except OSError as e:
+                self._census_result = (path, e)
+
+        self._lbl_file_types_census.configure(text="Scanning...")
+        self._census_result = None
+        self._census_thread = threading.Thread(target=scan)
+        self._census_thread.daemon = True
+        self._census_thread.start()
+        self._root.after(self.BACKGROUND_POLL_INTERVAL_MS, self._poll_census)
+
+
+    def _poll_census(self):
+        if self._census_thread.is_alive():
+            self._root.after(self.BACKGROUND_POLL_INTERVAL_MS, self._poll_census)
+            return
+
+        self._census_thread = None
+        path, counts = self._census_result
+        if self._checkbox_all_file_types_state.get() != 1:
+            self._lbl_file_types_census.configure(text="")
+            return
+
+        if path != self._entry_medias_location.get():
+            self._populate_all_file_types()
+        elif isinstance(counts, OSError):
+            print("Couldn't extract all file types from: " + path)
+            self._lbl_file_types_census.configure(text="")
+        else:
+            self._set_all_file_types(counts)
 
-            all_types = ""
-            for key in allext:
-                all_types += "*" + key + ";"
 
-            self._entry_file_types.delete(0, tkinter.END)
-            self._entry_file_types.insert(0, all_types)
-        except:
-            print("Couldn't extract all file types from: " +
-                self._entry_medias_location.get())
-            pass
+    def _set_all_file_types(self, counts):
+        """Fills the file types field with the extensions of counts, the most
+        common first, and shows how many files each has.
+
+        """
+
+        extensions = sorted(counts, key=lambda extension: (-counts[extension][0], extension))
+
+        # We won't be able to write if it's not enabled
+        state = self._entry_file_types.cget("state")
+        self._entry_file_types.configure(state="normal")
+        self._entry_file_types.delete(0, tkinter.END)
+        self._entry_file_types.insert(
+            0, "".join("*" + extension + ";" for extension in extensions))
+        self._entry_file_types.configure(state=state)
+
+        self._lbl_file_types_census.configure(text=", ".join(
+            "%s: %d (%s)" % (extension, counts[extension][0],
+                             _format_size(counts[extension][1]))
+            for extension in extensions))
 
     def _populate_all_file_types_if_needed(self):
         """Will populate the file types field from the files in the medias location
@@ -234,6 +328,31 @@ class App:
             assert(self._checkbox_all_file_types_state.get() == 1)
 
 
+    def _start_exiftool_verification(self):
+        self._verification_thread = threading.Thread(
+            target=self._exiftool.verify_installation)
+        self._verification_thread.daemon = True
+        self._verification_thread.start()
+        self._root.after(self.BACKGROUND_POLL_INTERVAL_MS, self._poll_exiftool_verification)
+
+
+    def _poll_exiftool_verification(self):
+        if self._verification_thread.is_alive():
+            self._root.after(self.BACKGROUND_POLL_INTERVAL_MS, self._poll_exiftool_verification)
+            return
+
+        self._verification_thread = None
+        self._set_exiftool_install_state()
+
+
+    def _wait_for_exiftool_verification(self):
+        """The exiftool object must not be used while it is being verified."""
+
+        thread = self._verification_thread
+        if thread != None:
+            thread.join()
+
+
     def _set_exiftool_install_state(self):
         if self._exiftool.is_installed():
             self._hide_exiftool_install()
@@ -273,7 +392,9 @@ class App:
     def _on_closing(self):
         # Upon closing the application, we will persist the user's choices
         try:
+            self._wait_for_exiftool_verification()
             self._save_config()
+            self._exiftool.close()
             self._root.destroy()
         except:
             pass
@@ -299,34 +420,39 @@ class App:
 
 
     def _on_btn_ok_clicked(self):
+        self._wait_for_exiftool_verification()
         self._save_config()
 
+        # The generator runs on the dialog's reader thread. Read the widgets now
+        # as tkinter must only be used from the main thread.
+        input_info = self._get_user_input_info()
+        output_info = self._get_output_info()
+        try:
+            self._exiftool.set_date_tags(photorenamecore.get_date_tags(output_info))
+        except ValueError as e:
+            print("Ignoring OutputFileNameDateTags: " + str(e))
+            self._exiftool.set_date_tags(exiftoolwrap.ExiftoolWrap.DEFAULT_DATE_TAGS)
+
         def exiftool_popen_generator():
             """Generator that will return:
                 (command_line, popen_object)
 
             """
 
-            input_info = self._get_user_input_info()
-            output_info = self._get_output_info()
-
-            filestypes_to_copy = ["*.*"]
-            if input_info["InputAllFileTypes"] == "0":
-               filestypes_to_copy = input_info["InputFileTypes"].split(";")
-
-            for filetype in filestypes_to_copy:
-                if filetype != "" and filetype != None:
-                    yield self._exiftool.launch_file_rename(
-                            path_to_images=input_info["InputMediaDirectory"],
-                            prefix=output_info["OutputFileNamePrefix"],
-                            file_ext=filetype,
-                            use_date_time=(output_info["OutputFileNameUseDateAndTime"] != "0"))
+            proc_info = photorenamecore.launch_rename(
+                    self._exiftool, input_info, output_info)
+            if proc_info != None:
+                yield proc_info
 
-        dlg = PopenOutputDlg(self._frame, exiftool_popen_generator)
+        recorder = photorenamecore.open_run_history(self._local_appdata_path).create_recorder(
+            "gui " + input_info["InputMediaDirectory"])
+        log = photorenamecore.open_output_log(output_info, self._local_appdata_path)
+        dlg = PopenOutputDlg(self._frame, exiftool_popen_generator, recorder, log)
         dlg.show()
 
 
     def _on_install_exiftool_clicked(self):
+        self._wait_for_exiftool_verification()
         installer = InstallExiftoolDlg(
             self._frame, self._exiftool, self._local_appdata_path)
         installer.show()
@@ -339,22 +465,27 @@ class App:
     #
 
     def _get_user_input_info(self):
-        path_to_exiftool = self._exiftool.get_path_to_binary()
-        if path_to_exiftool == None:
-            path_to_exiftool = ""
-        return {"PathToExiftool" : path_to_exiftool,
-                "InputMediaDirectory" : self._entry_medias_location.get(),
-                "InputFileTypes" : self._entry_file_types.get(),
-                "InputAllFileTypes" : str(self._checkbox_all_file_types_state.get())}
+        input_info = {"InputMediaDirectory" : self._entry_medias_location.get(),
+                      "InputFileTypes" : self._entry_file_types.get(),
+                      "InputAllFileTypes" : str(self._checkbox_all_file_types_state.get())}
+        photorenamecore.set_exiftool_info(input_info, self._exiftool)
+        return input_info
 
 
     def _get_output_info(self):
-        return {"OutputFileNamePrefix" : self._entry_label_file_prefix.get(),
-                "OutputFileNameUseDateAndTime" : str(self._checkbox_include_date_and_time_state.get())}
+        output_info = {"OutputFileNamePrefix" : self._entry_label_file_prefix.get(),
+                       "OutputFileNameUseDateAndTime" : str(self._checkbox_include_date_and_time_state.get())}
+        if self._output_log_max_lines != None:
+            output_info["OutputLogMaxLines"] = self._output_log_max_lines
+        if self._output_group_companions != None:
+            output_info["OutputFileNameGroupCompanions"] = self._output_group_companions
+        if self._output_date_tags != None:
+            output_info["OutputFileNameDateTags"] = self._output_date_tags
+        return output_info
 
 
     def _set_user_input_info(self, input_info):
-        if "PathToExiftool" in input_info:
+        if input_info.get("PathToExiftool", "") not in ("", self._exiftool.get_path_to_binary()):
             self._exiftool.set_exiftool_path_manually(input_info["PathToExiftool"])
 
         if "InputMediaDirectory" in input_info:
@@ -383,28 +514,27 @@ class App:
             else:
                 self._checkbox_include_date_and_time.select()
 
+        # Only set in the configuration file, kept as is
+        self._output_log_max_lines = output_info.get("OutputLogMaxLines")
+        self._output_group_companions = output_info.get("OutputFileNameGroupCompanions")
+        self._output_date_tags = output_info.get("OutputFileNameDateTags")
 
-    def _save_config(self):
-        config = configparser.ConfigParser()
-        config["PHOTOCOPY_USER_INPUT"] = self._get_user_input_info()
-        config["PHOTOCOPY_OUTPUT"] = self._get_output_info()
 
-        with open(self._get_config_path(), "w") as configfile:
-            config.write(configfile)
+    def _save_config(self):
+        photorenamecore.save_config(
+            self._get_config_path(),
+            self._get_user_input_info(),
+            self._get_output_info())
 
 
     def _load_config(self):
-        config = configparser.ConfigParser()
-        config.read(self._get_config_path())
-        if "PHOTOCOPY_USER_INPUT" in config:
-            self._set_user_input_info(config["PHOTOCOPY_USER_INPUT"])
-
-        if "PHOTOCOPY_OUTPUT" in config:
-            self._set_output_info(config["PHOTOCOPY_OUTPUT"])
+        input_info, output_info = photorenamecore.load_config(self._get_config_path())
+        self._set_user_input_info(input_info)
+        self._set_output_info(output_info)
 
 
     def _get_config_path(self):
-        return os.path.join(self._local_appdata_path, "config.ini")
+        return photorenamecore.get_config_path(self._local_appdata_path)
 
 
 class ModalDialog:
@@ -535,7 +665,10 @@ class InstallExiftoolDlg(ModalDialog):
     def _on_auto_install_clicked(self):
         self._set_current_state_to_searching()
 
-        ret = exiftoolinst.try_auto_install_exiftool(self._local_appdata_path)
+        # The installer pulls urllib and zipfile in. Only load it when needed.
+        import exiftoolinst
+        ret = exiftoolinst.try_auto_install_exiftool(
+            self._local_appdata_path, progress_callback=self._on_download_progress)
         if ret[0] == True:
             # We only set our current path if the operation succeeded.
             # That way auto_install can be called multiple times without breaking
@@ -547,6 +680,19 @@ class InstallExiftoolDlg(ModalDialog):
         self._detect_current_state()
 
 
+    def _on_download_progress(self, bytes_done, bytes_total):
+        """Shows the progress of the installer download. The download runs on
+        the UI thread so the label is redrawn right away.
+
+        """
+
+        text = "Status: downloading " + _format_size(bytes_done)
+        if bytes_total:
+            text += " of " + _format_size(bytes_total)
+        self._var_status.set(text)
+        self._lbl_status.update_idletasks()
+
+
     def _on_manual_install_clicked(self):
         """Send the user to the exiftool website for manual download.
 
@@ -555,6 +701,8 @@ class InstallExiftoolDlg(ModalDialog):
         """
 
         self._set_current_state_to_searching()
+
+        import exiftoolinst
         exiftoolinst.browser_launches_exiftool_homepage()
         self._detect_current_state()
 
@@ -565,14 +713,59 @@ class PopenOutputDlg(ModalDialog):
     Simply instantiate and show() the class to pop a modal dialog and execute
     the Popen command automatically.
 
+    The processes are run and read by a background thread. Their output is
+    handed to the UI through a bounded queue that is polled with
+    tkinter.after(), so the dialog stays responsive and a slow UI throttles
+    the reader instead of letting the output pile up in memory.
+
+    The output is kept in an outputlog.OutputLog. The text widget only holds
+    the lines on screen and is redrawn from the log when it changes or is
+    scrolled, so huge outputs cost no more than small ones.
+
     """
 
+    # How often the output queue is polled. This caps the widget refresh rate.
+    POLL_INTERVAL_MS = 50
+
+    # Maximum number of lines moved to the log per poll. They are appended at
+    # once and only the visible ones are drawn.
+    MAX_LINES_PER_POLL = 20000
+
+    # Lines shown at once
+    VIEW_LINES = 30
+
+    # Lines scrolled by a mouse wheel notch
+    WHEEL_LINES = 3
+
+    # Maximum number of lines waiting for the UI before the reader blocks
+    MAX_QUEUED_LINES = 10000
+
     _popen_generator = None
     _current_popen = None
     _aborted = False
+    _output_queue = None
+    _reader_thread = None
+    _done = False
+    _recorder = None
+    _log = None
+
+    # Id of the pending _poll_output() call, cancelled when the dialog closes
+    _poll_id = None
+
+    # Number of the first line on screen. While _follow_output is set the
+    # view sticks to the end of the output.
+    _view_top = 0
+    _follow_output = True
 
+    # Line of the error or warning jumped to last
+    _current_error = None
 
-    def __init__(self, parent, popen_generator):
+    # (index, total, start time) of the running command, from its -progress
+    # output. Set by the reader thread, shown by _poll_output().
+    _progress = None
+
+
+    def __init__(self, parent, popen_generator, recorder=None, log=None):
         """ Will allow the user to launch and cancel the execution of a process
             while seeing its console output.
 
@@ -580,14 +773,30 @@ class PopenOutputDlg(ModalDialog):
                 parent: parent tkinter widget.
 
                 popen_generator: A function that will return (command_line, popen_object).
+                    It is called from a background thread and must not use tkinter.
+
                     command_line: The command line passed to subprocess.open().
 
-                    popen_object: The return value of subprocess.open().
+                    popen_object: The return value of subprocess.open(), an
+                    exiftoolwrap.ExiftoolCommand or an
+                    exiftoolwrap.PlannedRenameCommand.
+
+                recorder: optional renamehistory.RunRecorder the renames are
+                    recorded to, so they can be undone. Closed when the
+                    processes are done.
+
+                log: optional outputlog.OutputLog the output is kept in.
+                    Defaults to one in memory only. Closed with the dialog.
 
         """
 
         ModalDialog.__init__(self, parent)
         self._popen_generator = popen_generator
+        self._recorder = recorder
+        self._log = log
+        if self._log == None:
+            self._log = outputlog.OutputLog()
+        self._output_queue = queue.Queue(self.MAX_QUEUED_LINES)
         self._create_layout()
 
 
@@ -595,57 +804,346 @@ class PopenOutputDlg(ModalDialog):
         self._frame = tkinter.Frame(self.top)
         self._frame.grid()
 
+        self.top.protocol("WM_DELETE_WINDOW", self._on_closing)
+
         # Create the output window
         output_frame = tkinter.Frame(self._frame)
         output_frame.grid(column=0, row=0, sticky=tkinter.W)
 
-        self._text_output = tkinter.Text(output_frame, width=80, height=30)
+        self._text_output = tkinter.Text(
+            output_frame, width=80, height=self.VIEW_LINES, wrap=tkinter.NONE)
         self._text_output.grid(row=0, column=0, sticky=tkinter.W)
         self._text_output.configure(state="disabled")
-
-        output_scrollbar = tkinter.Scrollbar(output_frame)
-        output_scrollbar.grid(row=0, column=1, sticky=tkinter.W+tkinter.E+tkinter.S+tkinter.N)
-
-        # Attach the listbox to the scrollbar
-        self._text_output.config(yscrollcommand=output_scrollbar.set)
-        output_scrollbar.config(command=self._text_output.yview)
+        self._text_output.tag_configure(outputlog.LINE_KIND_ERROR, foreground="red")
+        self._text_output.tag_configure(outputlog.LINE_KIND_WARNING, foreground="dark orange")
+        self._text_output.tag_configure("current_error", background="light yellow")
+
+        # The vertical scrollbar moves through the log, not the widget
+        self._output_scrollbar = tkinter.Scrollbar(output_frame, command=self._on_output_scrolled)
+        self._output_scrollbar.grid(row=0, column=1, sticky=tkinter.W+tkinter.E+tkinter.S+tkinter.N)
+        self._text_output.bind("<MouseWheel>", self._on_mouse_wheel)
+        self._text_output.bind("<Button-4>", self._on_mouse_wheel)
+        self._text_output.bind("<Button-5>", self._on_mouse_wheel)
+
+        x_scrollbar = tkinter.Scrollbar(
+            output_frame, orient=tkinter.HORIZONTAL, command=self._text_output.xview)
+        x_scrollbar.grid(row=1, column=0, sticky=tkinter.W+tkinter.E)
+        self._text_output.config(xscrollcommand=x_scrollbar.set)
+
+        # Create the progress bar
+        progress_frame = tkinter.Frame(self._frame)
+        progress_frame.grid(column=0, row=1, sticky=tkinter.W+tkinter.E)
+        progress_frame.columnconfigure(0, weight=1)
+
+        self._progress_bar = tkinter.ttk.Progressbar(
+            progress_frame, orient=tkinter.HORIZONTAL, mode="determinate")
+        self._progress_bar.grid(row=0, column=0, sticky=tkinter.W+tkinter.E)
+
+        self._lbl_progress = tkinter.Label(progress_frame, text="", width=40, anchor=tkinter.W)
+        self._lbl_progress.grid(row=0, column=1, sticky=tkinter.W)
 
         # Create the commands
         button_frame = tkinter.Frame(self._frame)
-        button_frame.grid(column=0, row=1, sticky=tkinter.E)
+        button_frame.grid(column=0, row=2, sticky=tkinter.W+tkinter.E)
+        button_frame.columnconfigure(0, weight=1)
+
+        self._lbl_errors = tkinter.Label(button_frame, text="", anchor=tkinter.W)
+        self._lbl_errors.grid(row=0, column=0, sticky=tkinter.W)
+
+        tkinter.Button(
+            button_frame, text="Previous error",
+            command=self._on_btn_previous_error_clicked).grid(row=0, column=1, sticky=tkinter.E)
+        tkinter.Button(
+            button_frame, text="Next error",
+            command=self._on_btn_next_error_clicked).grid(row=0, column=2, sticky=tkinter.E)
+
+        self._btn_abort = tkinter.Button(
+            button_frame, text="Abort", command=self._on_btn_abort_clicked)
+        self._btn_abort.grid(row=0, column=3, sticky=tkinter.E)
+
+        if self._log.spill_path != None:
+            tkinter.Label(self._frame, text="Full output: " + self._log.spill_path,
+                          anchor=tkinter.W).grid(column=0, row=3, sticky=tkinter.W)
 
         # Launch the Popen command requested
         self._launch()
 
 
     def _launch(self):
-        for proc_info in self._popen_generator():
-            self._append_output_txt("\n\nCommand: " + proc_info[0] + "\n\n...\n\n")
-            self._current_popen = proc_info[1]
+        self._reader_thread = threading.Thread(target=self._read_processes)
+        self._reader_thread.daemon = True
+        self._reader_thread.start()
+
+        self._poll_id = self.top.after(self.POLL_INTERVAL_MS, self._poll_output)
+
+
+    def _read_processes(self):
+        """Reader thread: runs the processes and queues their output."""
+
+        try:
+            for proc_info in self._popen_generator():
+                if self._aborted:
+                    break
+
+                self._queue_output("\n\nCommand: " + proc_info[0] + "\n\n...\n\n")
+                self._current_popen = proc_info[1]
+                start_time = time.monotonic()
+
+                # The output is parsed as it comes for the progress, the undo
+                # history and the run metrics
+                with metrics.span("exiftool_command"):
+                    for event in exiftoolwrap.iter_rename_events(
+                            self._tee_process_output(self._current_popen)):
+                        if isinstance(event, exiftoolwrap.RenameProgress):
+                            self._progress = (event.index, event.total, start_time)
+                        elif self._recorder != None:
+                            self._recorder.record(event)
+
+                if self._aborted:
+                    self._queue_output("\nAborted\n")
+                    break
+        finally:
+            self._current_popen = None
+            if self._recorder != None:
+                self._recorder.close()
+            self._queue_output(None)
+            metrics.end_run("gui_rename", aborted=self._aborted)
+
+
+    def _queue_output(self, output_txt):
+        """Blocks while the queue is full unless we were aborted, in which case
+        the UI may not be there to drain it anymore.
+
+        """
+
+        while True:
+            try:
+                self._output_queue.put(output_txt, timeout=0.1)
+                return
+            except queue.Full:
+                if self._aborted:
+                    return
+
+
+    def _tee_process_output(self, popen):
+        """Yields the output lines of popen once they are queued for the UI."""
+
+        for line in self._iter_process_output(popen):
+            self._queue_output(line)
+            yield line
+
+
+    def _iter_process_output(self, popen):
+        """Yields the output lines of popen as they are produced."""
+
+        if hasattr(popen, "iter_output"):
+            for stream, line in popen.iter_output():
+                yield line
+            return
+
+        # A plain Popen object. Its stderr is drained by a helper thread so that
+        # neither pipe can fill up and block the process.
+        def read_stderr():
+            for line in iter(popen.stderr.readline, b""):
+                self._queue_output(line.decode(errors="replace"))
+
+        stderr_thread = threading.Thread(target=read_stderr)
+        stderr_thread.daemon = True
+        stderr_thread.start()
+
+        for line in iter(popen.stdout.readline, b""):
+            yield line.decode(errors="replace")
+
+        stderr_thread.join()
+        popen.wait()
+
+
+    def _poll_output(self):
+        """Moves a batch of queued output to the log and redraws the view."""
+
+        lines = []
+        try:
+            while len(lines) < self.MAX_LINES_PER_POLL:
+                line = self._output_queue.get_nowait()
+                if line == None:
+                    self._done = True
+                    self._btn_abort.configure(state="disabled")
+                    break
+                lines.append(line)
+        except queue.Empty:
+            pass
+
+        if lines:
+            self._log.append_text("".join(lines))
+            self._render_output()
+        if self._done:
+            self._log.flush()
+        self._show_progress()
+
+        if self._done:
+            self._poll_id = None
+        else:
+            self._poll_id = self.top.after(self.POLL_INTERVAL_MS, self._poll_output)
+
+
+    def _show_progress(self):
+        """Updates the progress bar with the files done, the throughput and
+        the time left.
 
-            outputs = self._current_popen.communicate()
-            self._append_output_txt(outputs[1]) # stderr
-            self._append_output_txt(outputs[0]) # stdout
+        """
+
+        if self._progress == None:
+            return
 
-            if self._aborted:
-                break
+        index, total, start_time = self._progress
+        # A file is done once exiftool moves on to the next one
+        files_done = index - 1
+        if self._done and not self._aborted:
+            files_done = total
+        self._progress_bar.configure(maximum=max(total, 1), value=files_done)
 
-        self._aborted = False
+        text = "%d/%d files" % (files_done, total)
+        elapsed = time.monotonic() - start_time
+        if files_done > 0 and elapsed > 0:
+            rate = files_done / elapsed
+            text += " - %.0f files/s" % rate
+            if not self._done:
+                text += " - " + _format_duration((total - files_done) / rate) + " left"
+        self._lbl_progress.configure(text=text)
 
 
     def _on_btn_abort_clicked(self):
-        if self._current_popen != None:
-            self._aborted = true
-            self._current_popen.terminate()
+        self._aborted = True
+        popen = self._current_popen
+        if popen != None:
+            popen.terminate()
+
+
+    def _on_closing(self):
+        self._on_btn_abort_clicked()
+        if self._poll_id != None:
+            self.top.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._log.close()
+        self.top.destroy()
+
+
+    def _on_output_scrolled(self, action, value, unit=None):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", count, unit)"""
+
+        first, end = self._log.get_line_range()
+        if action == "moveto":
+            self._scroll_output_to(first + int(float(value) * (end - first)))
+        elif action == "scroll":
+            lines = int(value)
+            if unit == "pages":
+                lines *= self.VIEW_LINES
+            self._scroll_output_to(self._view_top + lines)
+
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4:
+            lines = -self.WHEEL_LINES
+        elif event.num == 5:
+            lines = self.WHEEL_LINES
+        else:
+            lines = -self.WHEEL_LINES if event.delta > 0 else self.WHEEL_LINES
+        self._scroll_output_to(self._view_top + lines)
+        # The widget only holds the visible lines, it has nothing to scroll
+        return "break"
+
+
+    def _on_btn_next_error_clicked(self):
+        start = self._current_error
+        if start == None:
+            start = self._view_top - 1
+        self._jump_to_error(self._log.find_next_error(start))
+
+
+    def _on_btn_previous_error_clicked(self):
+        start = self._current_error
+        if start == None:
+            start = self._view_top + self.VIEW_LINES
+        self._jump_to_error(self._log.find_previous_error(start))
 
 
-    def _append_output_txt(self, output_txt):
+    def _jump_to_error(self, line_number):
+        if line_number == None:
+            self.top.bell()
+            return
+        self._current_error = line_number
+        self._scroll_output_to(line_number - self.VIEW_LINES // 3)
+
+
+    def _scroll_output_to(self, line_number):
+        first, end = self._log.get_line_range()
+        last_top = max(first, end - self.VIEW_LINES)
+        self._view_top = min(max(line_number, first), last_top)
+        # Back at the end, follow the new output again
+        self._follow_output = self._view_top == last_top
+        self._render_output()
+
+
+    def _render_output(self):
+        """Redraws the visible lines of the log."""
+
+        first, end = self._log.get_line_range()
+        if self._follow_output:
+            self._view_top = max(first, end - self.VIEW_LINES)
+        else:
+            # The lines we were looking at may have been dropped since
+            self._view_top = max(self._view_top, first)
+        lines = self._log.get_lines(self._view_top, self.VIEW_LINES)
+
         self._text_output.configure(state="normal")
-        self._text_output.insert(tkinter.INSERT, output_txt)
+        self._text_output.delete("1.0", tkinter.END)
+        self._text_output.insert("1.0", "\n".join(lines))
+        for row, line in enumerate(lines, 1):
+            kind = outputlog.get_line_kind(line)
+            if kind != None:
+                self._text_output.tag_add(kind, "%d.0" % row, "%d.end" % row)
+            if self._view_top + row - 1 == self._current_error:
+                self._text_output.tag_add("current_error", "%d.0" % row, "%d.end" % row)
         self._text_output.configure(state="disabled")
 
+        if end > first:
+            self._output_scrollbar.set((self._view_top - first) / (end - first),
+                                       (self._view_top - first + len(lines)) / (end - first))
+        else:
+            self._output_scrollbar.set(0, 1)
+
+        error_count = self._log.get_error_count()
+        if error_count:
+            self._lbl_errors.configure(text="%d errors and warnings" % error_count)
+
+
+def _format_duration(seconds):
+    """return: a duration as a short human readable string (ex. "2 min 05 s")"""
+
+    seconds = int(seconds + 0.5)
+    if seconds < 60:
+        return "%d s" % seconds
+    if seconds < 3600:
+        return "%d min %02d s" % (seconds // 60, seconds % 60)
+    return "%d h %02d min" % (seconds // 3600, seconds % 3600 // 60)
+
+
+def _format_size(size):
+    """return: size in bytes as a short human readable string (ex. "1.2 GB")"""
+
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = "TB"
+    if unit == "B":
+        return "%d B" % size
+    return "%.1f %s" % (size, unit)
+
 
 # Bootstart
-root = tkinter.Tk()
-app = App(root)
-root.mainloop()
+if __name__ == "__main__":
+    root = tkinter.Tk()
+    app = App(root)
+    root.mainloop()
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""Command line version of photorename.
+
+Renames the files without any GUI, using the same configuration file as the
+photorename application. Command line options override the configuration:
+
+    photorenamecli.py c:\\photos --types "*.jpg;*.cr2" --prefix Holidays_
+
+Several directories are renamed concurrently, each by its own exiftool
+process:
+
+    photorenamecli.py /media/card1 /media/card2 /media/card3 --jobs 2
+
+Long renames can go through the resumable job queue instead. If the process
+dies, running the queue again picks up where it stopped:
+
+    photorenamecli.py /archive/2011 /archive/2012 --queue --recursive
+    photorenamecli.py --queue
+
+Every run is recorded and can be undone, the last one by default:
+
+    photorenamecli.py --list-runs
+    photorenamecli.py --undo
+
+"""
+
+# Public
+import argparse
+import os
+import sys
+
+# Internal
+import dirscan
+import exiftoolwrap
+import metrics
+import photorenamecore
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    metrics_path = args.metrics or os.environ.get(metrics.ENVIRONMENT_VARIABLE)
+    if metrics_path:
+        metrics.enable(metrics_path)
+    try:
+        return _run(args)
+    finally:
+        if not args.watch:
+            metrics.end_run("cli", workers=args.workers, recursive=args.recursive)
+
+#
+# Private
+#
+
+def _run(args):
+    if args.list_runs:
+        return _list_runs()
+    if args.undo != None:
+        return _undo(args)
+
+    config_path = args.config
+    if config_path == None:
+        config_path = photorenamecore.get_config_path(
+            photorenamecore.get_local_appdata_path())
+    input_info, output_info = photorenamecore.load_config(config_path)
+    _apply_args(args, input_info, output_info)
+
+    if input_info.get("InputMediaDirectory", "") == "" and not args.queue:
+        print("Error: No medias location given", file=sys.stderr)
+        return 2
+    if dirscan.parse_file_types(photorenamecore.get_file_types(input_info)) == (set(), []):
+        print("Error: No file types selected", file=sys.stderr)
+        return 2
+
+    exiftool = photorenamecore.create_exiftool(input_info)
+    try:
+        if not exiftool.is_installed():
+            print("Error: Exiftool is missing. Use --exiftool to locate it.",
+                  file=sys.stderr)
+            return 2
+
+        try:
+            exiftool.set_date_tags(photorenamecore.get_date_tags(output_info))
+        except ValueError as e:
+            print("Error: " + str(e), file=sys.stderr)
+            return 2
+
+        if args.save_config:
+            photorenamecore.set_exiftool_info(input_info, exiftool)
+            photorenamecore.save_config(config_path, input_info, output_info)
+        elif args.config == None or os.path.exists(config_path):
+            # Lets the next runs skip the exiftool detection
+            photorenamecore.save_exiftool_info(config_path, exiftool)
+
+        # Only opened in the modes reading the dates without exiftool's help.
+        # The job queue always plans its renames.
+        cache = None
+        if not args.no_cache and (args.queue or photorenamecore.uses_metadata_cache(
+                output_info, args.workers, args.recursive, args.include, args.exclude)):
+            cache = photorenamecore.open_metadata_cache()
+
+        recorder = photorenamecore.open_run_history().create_recorder(
+            "cli " + " ".join(args.directories or [input_info.get("InputMediaDirectory", "")]))
+
+        try:
+            if args.queue:
+                return _run_job_queue(exiftool, input_info, output_info, args, cache, recorder)
+            if args.watch:
+                return _watch(exiftool, input_info, output_info, args, cache, recorder)
+            if len(args.directories) > 1:
+                return _rename_directories(exiftool, input_info, output_info, args, cache, recorder)
+
+            # The results are printed as they come: in recursive mode the files
+            # are renamed while the tree is being scanned.
+            results = photorenamecore.rename(
+                exiftool, input_info, output_info, args.workers,
+                args.recursive, args.include, args.exclude, cache, args.dedupe)
+            return _print_results(results, args.quiet, recorder)
+        finally:
+            recorder.close()
+            if cache != None:
+                if cache.hits or cache.misses:
+                    print("Metadata cache: %d hits, %d misses" % (cache.hits, cache.misses))
+                cache.close()
+    finally:
+        exiftool.close()
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Renames photos and videos based on the date and time "
+                    "they were taken. Options default to the values saved "
+                    "by the photorename application.")
+    parser.add_argument(
+        "directories", nargs="*", metavar="directory",
+        help="medias location. Several can be given, they are then renamed "
+             "concurrently.")
+    parser.add_argument(
+        "--types",
+        help="file types to rename separated by ';' (ex. \"*.jpg;*.cr2\")")
+    parser.add_argument(
+        "--all-types", action="store_true",
+        help="rename all file types")
+    parser.add_argument(
+        "--prefix",
+        help="prefix to add to the renamed files")
+    parser.add_argument(
+        "--date-time", dest="date_time", action="store_true", default=None,
+        help="include the date and time in the file names")
+    parser.add_argument(
+        "--no-date-time", dest="date_time", action="store_false",
+        help="don't include the date and time in the file names")
+    parser.add_argument(
+        "--date-tags", metavar="TAGS",
+        help="tags the date and time is taken from, separated by ';'. Each "
+             "file uses the first one it has (ex. \"" +
+             ";".join(exiftoolwrap.ExiftoolWrap.FALLBACK_DATE_TAGS) + "\"). "
+             "Default: DateTimeOriginal")
+    parser.add_argument(
+        "--group-companions", dest="group_companions", action="store_true",
+        default=None,
+        help="rename the files sharing a name but not their extension (ex. "
+             "IMG_0001.CR2, IMG_0001.JPG and IMG_0001.XMP) together, to the "
+             "same new name, from the date and time of the RAW file")
+    parser.add_argument(
+        "--no-group-companions", dest="group_companions", action="store_false",
+        help="rename every file on its own")
+    parser.add_argument(
+        "--exiftool",
+        help="path to the exiftool executable")
+    parser.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="also rename the files of the sub-directories")
+    parser.add_argument(
+        "--include", action="append", metavar="GLOB",
+        help="only rename the files matching this pattern. Matched against "
+             "the name and the path relative to the medias location. "
+             "Can be repeated.")
+    parser.add_argument(
+        "--exclude", action="append", metavar="GLOB",
+        help="skip the files and directories matching this pattern. "
+             "Can be repeated.")
+    # dedupe.ACTIONS, spelled out not to import dedupe on every run
+    parser.add_argument(
+        "--dedupe", choices=("skip", "hardlink", "report"),
+        help="find the files with the same content as another one before "
+             "renaming. They aren't renamed with a copy number but skipped, "
+             "replaced by hard links to the file kept, or only reported "
+             "(nothing is renamed then).")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="keep running and rename the new files of the medias location "
+             "as they arrive")
+    parser.add_argument(
+        "--settle-time", type=float, metavar="SECONDS",
+        help="with --watch, how long a new file must stay unchanged before "
+             "it is renamed. Default: 2")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of exiftool processes to use. 0 uses one per CPU core. "
+             "Default: 1")
+    parser.add_argument(
+        "--queue", action="store_true",
+        help="add the directories to the resumable job queue, then process "
+             "the queue, including what an interrupted run left. Without "
+             "directories, only resumes the queue.")
+    parser.add_argument(
+        "--priority", type=int, default=0,
+        help="with --queue, priority of the added directories. Higher "
+             "priorities are processed first. Default: 0")
+    parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="with several directories, how many are renamed at the same "
+             "time. Default: number of CPU cores, at most 4")
+    parser.add_argument(
+        "--timeout", type=float, metavar="SECONDS",
+        help="with several directories, stop renaming a directory after "
+             "that long")
+    parser.add_argument(
+        "--undo", nargs="?", const="", metavar="RUN",
+        help="give the files renamed by a previous run their names back. "
+             "Defaults to the last run. See --list-runs.")
+    parser.add_argument(
+        "--list-runs", action="store_true",
+        help="list the recorded runs that can be undone")
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="read the metadata of every file instead of using the metadata "
+             "cache of the previous runs. The cache is only used when the "
+             "dates aren't read by a single exiftool command: with --queue, "
+             "--workers, --group-companions or several --date-tags.")
+    parser.add_argument(
+        "--config",
+        help="configuration file to use instead of the photorename one")
+    parser.add_argument(
+        "--save-config", action="store_true",
+        help="save the resulting settings to the configuration file")
+    parser.add_argument(
+        "--metrics", metavar="FILE",
+        help="append a JSON record of the time spent in each phase and of "
+             "the files processed to FILE, \"-\" for stderr. Defaults to "
+             "$" + metrics.ENVIRONMENT_VARIABLE + ".")
+    parser.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="only report warnings and errors")
+
+    args = parser.parse_args(argv)
+    if args.queue and args.watch:
+        parser.error("--queue can't be combined with --watch")
+    if not args.queue and args.workers != 1 and (args.recursive or args.include
+                                                 or args.exclude):
+        parser.error("--workers can't be combined with --recursive, --include "
+                     "or --exclude")
+    if args.watch and (args.recursive or args.include or args.exclude):
+        parser.error("--watch can't be combined with --recursive, --include "
+                     "or --exclude")
+    if len(args.directories) > 1 and not args.queue and (args.watch or args.workers != 1 or args.recursive
+                                      or args.include or args.exclude):
+        parser.error("several directories can't be combined with --watch, "
+                     "--workers, --recursive, --include or --exclude")
+    if args.dedupe and (args.queue or args.watch or args.workers != 1
+                        or len(args.directories) > 1):
+        parser.error("--dedupe can't be combined with --queue, --watch, "
+                     "--workers or several directories")
+    if args.workers == 0:
+        args.workers = None
+    return args
+
+
+def _apply_args(args, input_info, output_info):
+    if args.directories:
+        input_info["InputMediaDirectory"] = args.directories[0]
+    if args.types != None:
+        input_info["InputFileTypes"] = args.types
+        input_info["InputAllFileTypes"] = "0"
+    if args.all_types:
+        input_info["InputAllFileTypes"] = "1"
+    if args.exiftool != None and args.exiftool != input_info.get("PathToExiftool"):
+        input_info["PathToExiftool"] = args.exiftool
+        # What we know about the configured executable doesn't apply
+        for key in ("ExiftoolVersion", "ExiftoolSize", "ExiftoolMtimeNs"):
+            input_info.pop(key, None)
+    if args.prefix != None:
+        output_info["OutputFileNamePrefix"] = args.prefix
+    if args.date_time != None:
+        output_info["OutputFileNameUseDateAndTime"] = "1" if args.date_time else "0"
+    if args.date_tags != None:
+        output_info["OutputFileNameDateTags"] = args.date_tags
+    if args.group_companions != None:
+        output_info["OutputFileNameGroupCompanions"] = "1" if args.group_companions else "0"
+
+
+def _list_runs():
+    """Prints the recorded runs, the last one first. return: the exit code"""
+
+    import time
+
+    history = photorenamecore.open_run_history()
+    for run_id in reversed(history.get_run_ids()):
+        try:
+            info = history.get_run_info(run_id)
+        except (OSError, ValueError):
+            continue
+        print("%s  %s  %s" % (run_id,
+                              time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info["created"])),
+                              info["description"]))
+    return 0
+
+
+def _undo(args):
+    """Undoes the run given by args.undo, the last one if empty.
+
+    return: the exit code
+
+    """
+
+    history = photorenamecore.open_run_history()
+    try:
+        results = history.undo(args.undo or None)
+    except OSError as e:
+        print("Error: Can't read run " + args.undo + ": " + str(e), file=sys.stderr)
+        return 2
+    if results == None:
+        print("Error: No run to undo", file=sys.stderr)
+        return 2
+    return _print_results(results, args.quiet)
+
+
+def _watch(exiftool, input_info, output_info, args, cache, recorder):
+    """Renames the new files until interrupted. return: the exit code"""
+
+    print("Watching " + input_info["InputMediaDirectory"] + ". Press Ctrl+C to stop.")
+    try:
+        for results in photorenamecore.watch(
+                exiftool, input_info, output_info, args.settle_time,
+                args.workers, cache):
+            _print_results(results, args.quiet, recorder)
+            recorder.flush()
+            metrics.end_run("watch", workers=args.workers)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _run_job_queue(exiftool, input_info, output_info, args, cache, recorder):
+    """Queues the directories of args and processes the job queue.
+
+    return: the exit code
+
+    """
+
+    import itertools
+
+    job_queue = photorenamecore.open_job_queue()
+    for directory in args.directories:
+        job_queue.add(directory,
+                      output_info.get("OutputFileNamePrefix", ""),
+                      photorenamecore.get_file_types(input_info),
+                      output_info.get("OutputFileNameUseDateAndTime", "1") != "0",
+                      args.recursive, args.include, args.exclude, args.priority,
+                      output_info.get("OutputFileNameGroupCompanions", "0") != "0")
+
+    exit_code = 0
+    try:
+        # Results come in batches, grouped here by job
+        for job, batches in itertools.groupby(
+                job_queue.run(exiftool, args.workers, cache), key=lambda batch: batch[0]):
+            print("\n" + job.directory + " (job " + job.id + ")")
+            results = (result for batch_job, batch in batches for result in batch)
+            if _print_results(results, args.quiet, recorder) != 0:
+                exit_code = 1
+    except KeyboardInterrupt:
+        print("Interrupted. Run with --queue to resume.")
+        return 1
+    return exit_code
+
+
+def _rename_directories(exiftool, input_info, output_info, args, cache, recorder):
+    """Renames all the directories of args concurrently.
+
+    return: the exit code
+
+    """
+
+    if photorenamecore.needs_planned_rename(output_info):
+        return _rename_directories_in_turn(
+            exiftool, input_info, output_info, args, cache, recorder)
+
+    # Only needed here and slow to import
+    import asyncio
+    import asyncrename
+
+    prefix = output_info.get("OutputFileNamePrefix", "")
+    use_date_time = output_info.get("OutputFileNameUseDateAndTime", "1") != "0"
+    file_types = photorenamecore.get_file_types(input_info)
+
+    async def wait_for_job(job):
+        await job.wait()
+        return job
+
+    async def rename_directories():
+        engine = asyncrename.AsyncRenameEngine(exiftool, args.jobs)
+        jobs = [engine.submit(directory, prefix, file_types, use_date_time, args.timeout)
+                for directory in args.directories]
+
+        exit_code = 0
+        for next_job in asyncio.as_completed([wait_for_job(job) for job in jobs]):
+            job = await next_job
+            print("\n" + job.directory + ": " + job.status)
+            if job.error != None:
+                print("Error: " + job.error, file=sys.stderr)
+            if _print_results(job.results, args.quiet, recorder) != 0 or job.status != asyncrename.JOB_STATUS_DONE:
+                exit_code = 1
+        return exit_code
+
+    try:
+        return asyncio.run(rename_directories())
+    except KeyboardInterrupt:
+        # asyncio.run() cancelled the jobs and killed their processes
+        return 1
+
+
+def _rename_directories_in_turn(exiftool, input_info, output_info, args, cache, recorder):
+    """Renames the directories of args one after the other, for the renames
+    the asyncrename engine can't do (see photorenamecore.needs_planned_rename()).
+    --jobs and --timeout don't apply.
+
+    return: the exit code
+
+    """
+
+    exit_code = 0
+    for directory in args.directories:
+        print("\n" + directory)
+        directory_input_info = dict(input_info, InputMediaDirectory=directory)
+        results = photorenamecore.rename(
+            exiftool, directory_input_info, output_info, cache=cache)
+        if _print_results(results, args.quiet, recorder) != 0:
+            exit_code = 1
+    return exit_code
+
+
+def _print_results(results, quiet, recorder=None):
+    """Prints results, and records them to recorder (a
+    renamehistory.RunRecorder) if given.
+
+    return: the exit code
+
+    """
+
+    counts = {exiftoolwrap.RENAME_STATUS_RENAMED: 0,
+              exiftoolwrap.RENAME_STATUS_WARNING: 0,
+              exiftoolwrap.RENAME_STATUS_ERROR: 0}
+
+    for result in results:
+        counts[result.status] += 1
+        if recorder != None:
+            recorder.record(result)
+        if result.status == exiftoolwrap.RENAME_STATUS_RENAMED:
+            if not quiet:
+                if result.message:
+                    print(result.file + " --> " + result.new_file + " (" + result.message + ")")
+                else:
+                    print(result.file + " --> " + result.new_file)
+        else:
+            print(result.status.capitalize() + ": " + result.message + " - " +
+                  result.file, file=sys.stderr)
+
+    print("%d files renamed, %d warnings, %d errors" % (
+        counts[exiftoolwrap.RENAME_STATUS_RENAMED],
+        counts[exiftoolwrap.RENAME_STATUS_WARNING],
+        counts[exiftoolwrap.RENAME_STATUS_ERROR]))
+
+    if counts[exiftoolwrap.RENAME_STATUS_ERROR]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
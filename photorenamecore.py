@@ -0,0 +1,489 @@
+"""Rename logic shared by the photorename GUI and its command line.
+
+Nothing in here depends on tkinter so it can be imported by scripts and
+pipeline workers:
+
+    import photorenamecore
+
+    input_info, output_info = photorenamecore.load_config(config_path)
+    exiftool = photorenamecore.create_exiftool(input_info)
+    try:
+        results = photorenamecore.rename(exiftool, input_info, output_info)
+    finally:
+        exiftool.close()
+
+"""
+
+# Public
+import configparser
+import os
+import os.path
+import sys
+
+# Internal
+import dirscan
+import exiftoolwrap
+
+
+APPLICATION_NAME = "photorename"
+
+CONFIG_FILENAME = "config.ini"
+
+# Configuration sections. The names predate photorename and are kept for
+# compatibility with existing configuration files.
+CONFIG_SECTION_USER_INPUT = "PHOTOCOPY_USER_INPUT"
+CONFIG_SECTION_OUTPUT = "PHOTOCOPY_OUTPUT"
+
+# Keys of each configuration section
+CONFIG_USER_INPUT_KEYS = ("PathToExiftool",
+                          "InputMediaDirectory",
+                          "InputFileTypes",
+                          "InputAllFileTypes",
+                          "ExiftoolVersion",
+                          "ExiftoolSize",
+                          "ExiftoolMtimeNs")
+CONFIG_OUTPUT_KEYS = ("OutputFileNamePrefix",
+                      "OutputFileNameUseDateAndTime",
+                      "OutputFileNameGroupCompanions",
+                      "OutputFileNameDateTags",
+                      "OutputLogMaxLines")
+
+#
+# Public
+#
+
+def get_local_appdata_path():
+    """Returns our local application data directory, creating it if needed.
+
+    This is %LOCALAPPDATA%\\photorename on Windows and
+    $XDG_DATA_HOME/photorename (~/.local/share/photorename) elsewhere.
+
+    """
+
+    if sys.platform == "win32":
+        base_path = os.environ["LOCALAPPDATA"]
+    else:
+        base_path = os.environ.get("XDG_DATA_HOME") or os.path.join(
+            os.path.expanduser("~"), ".local", "share")
+
+    local_appdata_path = os.path.join(base_path, APPLICATION_NAME)
+    try:
+        os.makedirs(local_appdata_path)
+    except OSError:
+        pass # The directory already exists
+
+    return local_appdata_path
+
+
+def get_config_path(local_appdata_path):
+    return os.path.join(local_appdata_path, CONFIG_FILENAME)
+
+
+def load_config(config_path):
+    """return: (input_info, output_info) dictionaries. Only the keys found in
+               the configuration file are set.
+
+    """
+
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    # configparser lowercases the keys. Give them back their usual names.
+    def read_section(section_name, keys):
+        values = {}
+        if section_name in config:
+            for key in keys:
+                if key in config[section_name]:
+                    values[key] = config[section_name][key]
+        return values
+
+    return (read_section(CONFIG_SECTION_USER_INPUT, CONFIG_USER_INPUT_KEYS),
+            read_section(CONFIG_SECTION_OUTPUT, CONFIG_OUTPUT_KEYS))
+
+
+def save_config(config_path, input_info, output_info):
+    config = configparser.ConfigParser()
+    config[CONFIG_SECTION_USER_INPUT] = input_info
+    config[CONFIG_SECTION_OUTPUT] = output_info
+
+    with open(config_path, "w") as configfile:
+        config.write(configfile)
+
+
+def create_exiftool(input_info, local_appdata_path=None):
+    """Finds exiftool at the PathToExiftool location of input_info, in
+    local_appdata_path or the PATH.
+
+    If input_info also describes the PathToExiftool executable (see
+    set_exiftool_info()) and its file didn't change, it is used without
+    being run. Call verify_installation() on the result, ideally in the
+    background, to make sure it works.
+
+    return: an ExiftoolWrap. Check is_installed() before using it.
+
+    """
+
+    if local_appdata_path == None:
+        local_appdata_path = get_local_appdata_path()
+
+    installation_info = None
+    path_to_exiftool = input_info.get("PathToExiftool", "")
+    if path_to_exiftool != "":
+        installation_info = {"path": path_to_exiftool,
+                             "version": input_info.get("ExiftoolVersion"),
+                             "size": _parse_int(input_info.get("ExiftoolSize")),
+                             "mtime_ns": _parse_int(input_info.get("ExiftoolMtimeNs"))}
+
+    return exiftoolwrap.ExiftoolWrap(local_appdata_path, installation_info)
+
+
+def set_exiftool_info(input_info, exiftool):
+    """Stores the exiftool executable in use, and what is needed to trust it
+    at the next launch, in input_info.
+
+    return: True if input_info changed
+
+    """
+
+    installation_info = exiftool.get_installation_info()
+    if installation_info == None:
+        values = {"PathToExiftool": exiftool.get_path_to_binary() or ""}
+    else:
+        values = {"PathToExiftool": installation_info["path"],
+                  "ExiftoolVersion": installation_info["version"],
+                  "ExiftoolSize": str(installation_info["size"]),
+                  "ExiftoolMtimeNs": str(installation_info["mtime_ns"])}
+
+    changed = False
+    for key in ("ExiftoolVersion", "ExiftoolSize", "ExiftoolMtimeNs"):
+        if key not in values and key in input_info:
+            del input_info[key]
+            changed = True
+    for key, value in values.items():
+        if input_info.get(key) != value:
+            input_info[key] = value
+            changed = True
+    return changed
+
+
+def save_exiftool_info(config_path, exiftool):
+    """Records the exiftool executable in use in the configuration file,
+    unless it is configured to use another one.
+
+    Only the exiftool keys are updated. The file isn't written if they didn't
+    change.
+
+    """
+
+    input_info, output_info = load_config(config_path)
+    if input_info.get("PathToExiftool", "") not in ("", exiftool.get_path_to_binary()):
+        return
+    if set_exiftool_info(input_info, exiftool):
+        save_config(config_path, input_info, output_info)
+
+
+def open_metadata_cache(local_appdata_path=None):
+    """return: the metacache.MetadataCache stored in our application data"""
+
+    # sqlite3 is only loaded when a cache is used
+    import metacache
+
+    if local_appdata_path == None:
+        local_appdata_path = get_local_appdata_path()
+    return metacache.MetadataCache(
+        os.path.join(local_appdata_path, metacache.MetadataCache.FILENAME))
+
+
+def open_job_queue(local_appdata_path=None):
+    """return: the renamejobs.JobQueue stored in our application data"""
+
+    import renamejobs
+
+    if local_appdata_path == None:
+        local_appdata_path = get_local_appdata_path()
+    return renamejobs.JobQueue(
+        os.path.join(local_appdata_path, renamejobs.JobQueue.DIRECTORY_NAME))
+
+
+def open_run_history(local_appdata_path=None):
+    """return: the renamehistory.RunHistory stored in our application data"""
+
+    import renamehistory
+
+    if local_appdata_path == None:
+        local_appdata_path = get_local_appdata_path()
+    return renamehistory.RunHistory(
+        os.path.join(local_appdata_path, renamehistory.RunHistory.DIRECTORY_NAME))
+
+
+def open_output_log(output_info, local_appdata_path=None):
+    """return: an outputlog.OutputLog keeping the OutputLogMaxLines last lines
+               of output_info in memory and spilling the full output to our
+               application data
+
+    """
+
+    import outputlog
+
+    if local_appdata_path == None:
+        local_appdata_path = get_local_appdata_path()
+    return outputlog.OutputLog(
+        _parse_int(output_info.get("OutputLogMaxLines")),
+        os.path.join(local_appdata_path, outputlog.OutputLog.DIRECTORY_NAME,
+                     outputlog.OutputLog.FILENAME))
+
+
+def get_file_types(input_info):
+    """return: list of file patterns to rename (ex. ["*.jpg", "*.cr2"])"""
+
+    if input_info.get("InputAllFileTypes", "1") != "0":
+        return ["*.*"]
+    return [file_type for file_type in input_info.get("InputFileTypes", "").split(";")
+            if file_type != ""]
+
+
+def get_date_tags(output_info):
+    """return: list of the tags the date and time of the files is taken from,
+               in order of preference (ex. ["DateTimeOriginal", "CreateDate"])
+
+    """
+
+    date_tags = [tag for tag in output_info.get("OutputFileNameDateTags", "").split(";")
+                 if tag != ""]
+    return date_tags or list(exiftoolwrap.ExiftoolWrap.DEFAULT_DATE_TAGS)
+
+
+def needs_planned_rename(output_info):
+    """return: True if the files must be renamed by
+               ExiftoolWrap.plan_renames() rather than by an exiftool rename
+               command, that is when companions are grouped or when the date
+               and time may come from several tags. exiftool doesn't tell
+               which of them it used.
+
+    """
+
+    if output_info.get("OutputFileNameGroupCompanions", "0") != "0":
+        return True
+    use_date_time = output_info.get("OutputFileNameUseDateAndTime", "1") != "0"
+    return use_date_time and len(get_date_tags(output_info)) > 1
+
+
+def uses_metadata_cache(output_info, workers=1, recursive=False, include=None,
+                        exclude=None):
+    """return: True if rename() and watch() make use of a metadata cache with
+               these parameters. That's when they read the dates themselves:
+               for planned renames (see needs_planned_rename()) and with
+               several workers. Otherwise a single exiftool command reads
+               the dates and renames the files, which no cache can spare.
+
+    """
+
+    if needs_planned_rename(output_info):
+        return True
+    return workers != 1 and not (recursive or include or exclude)
+
+
+def launch_rename(exiftool, input_info, output_info):
+    """Starts the rename described by the configuration, for callers showing
+    the output as it comes (ex. the GUI). The medias location is renamed non
+    recursively.
+
+    return: (command_line, command), see ExiftoolWrap.launch_file_rename()
+            and ExiftoolWrap.launch_file_list_rename(). None if exiftool
+            isn't installed or no file type is selected.
+
+    """
+
+    path_to_images = input_info["InputMediaDirectory"]
+    file_types = get_file_types(input_info)
+    prefix = output_info.get("OutputFileNamePrefix", "")
+    use_date_time = output_info.get("OutputFileNameUseDateAndTime", "1") != "0"
+
+    if not needs_planned_rename(output_info):
+        # All the file types are renamed by a single exiftool command
+        return exiftool.launch_file_rename(
+            path_to_images, prefix, file_types, use_date_time)
+
+    if dirscan.parse_file_types(file_types) == (set(), []):
+        print("Error: No file types selected")
+        return None
+    group_companions = output_info.get("OutputFileNameGroupCompanions", "0") != "0"
+    files = sorted(dirscan.scan_files(path_to_images, file_types))
+    return exiftool.launch_file_list_rename(
+        files, prefix, use_date_time, group_companions=group_companions)
+
+
+def rename(exiftool, input_info, output_info, workers=1,
+           recursive=False, include=None, exclude=None, cache=None,
+           dedupe_action=None):
+    """Renames the files described by the configuration.
+
+    Parameters:
+        exiftool: an installed ExiftoolWrap
+
+        input_info: PHOTOCOPY_USER_INPUT configuration values
+
+        output_info: PHOTOCOPY_OUTPUT configuration values
+
+        workers: number of exiftool processes. 1 renames with a single exiftool
+                   command. None uses one process per CPU core. Only used
+                   when not recursive, unless the rename is planned (see
+                   needs_planned_rename()).
+
+        recursive: True to also rename the files of the sub-directories. The
+                   tree is streamed to exiftool while it is being scanned.
+
+        include, exclude: glob patterns selecting the files, see
+                   dirscan.scan_files()
+
+        cache: optional metacache.MetadataCache, see open_metadata_cache().
+                   Used when workers isn't 1 or the rename is planned, as
+                   exiftool reads the dates itself otherwise.
+
+        dedupe_action: None, or what to do with the files having the same
+                   content as another one instead of renaming them with a
+                   copy number. They are reported as warnings.
+                       dedupe.ACTION_SKIP: leave them alone
+                       dedupe.ACTION_HARDLINK: replace them by hard links to
+                           the file kept
+                       dedupe.ACTION_REPORT: only report them, nothing is
+                           renamed
+
+    The date and time of each file comes from the first of the
+    OutputFileNameDateTags of output_info it has, see get_date_tags(). With
+    several tags, the result of each renamed file tells which one it was
+    (ex. "from CreateDate").
+
+    The companion files (ex. IMG_0001.CR2 and IMG_0001.XMP) are renamed
+    together, from one date and time read, when OutputFileNameGroupCompanions
+    is set in output_info.
+
+    Both need a planned rename: the files are all listed before renaming,
+    with workers exiftool processes reading their dates.
+
+    return: iterable over exiftoolwrap.RenameResult. In recursive mode the
+            files are renamed as the results are consumed.
+
+    """
+
+    path_to_images = input_info["InputMediaDirectory"]
+    file_types = get_file_types(input_info)
+    prefix = output_info.get("OutputFileNamePrefix", "")
+    use_date_time = output_info.get("OutputFileNameUseDateAndTime", "1") != "0"
+    group_companions = output_info.get("OutputFileNameGroupCompanions", "0") != "0"
+    exiftool.set_date_tags(get_date_tags(output_info))
+
+    if dedupe_action != None:
+        files = dirscan.scan_files(
+            path_to_images, file_types, recursive, include, exclude)
+        return _rename_deduplicated(
+            exiftool, files, prefix, use_date_time, dedupe_action,
+            needs_planned_rename(output_info), group_companions, workers, cache)
+
+    if needs_planned_rename(output_info):
+        files = sorted(dirscan.scan_files(
+            path_to_images, file_types, recursive, include, exclude))
+        return exiftool.rename_file_list_in_parallel(
+            files, prefix, use_date_time, workers, cache, group_companions)
+
+    if recursive or include or exclude:
+        files = dirscan.scan_files(
+            path_to_images, file_types, recursive, include, exclude)
+        return exiftool.rename_file_list(files, prefix, use_date_time)
+
+    if workers == 1:
+        return exiftool.rename_files(
+            path_to_images, prefix, file_types, use_date_time)
+    return exiftool.rename_files_in_parallel(
+        path_to_images, prefix, file_types, use_date_time, workers, cache)
+
+
+def watch(exiftool, input_info, output_info, settle_time=None, workers=1, cache=None):
+    """Generator that renames the files arriving in the medias location.
+
+    Parameters:
+        settle_time: seconds a new file must stay unchanged before it is
+                   renamed. Defaults to watchfolder.FolderWatcher.DEFAULT_SETTLE_TIME.
+
+        See rename() for the other parameters.
+
+    return: yields a list of exiftoolwrap.RenameResult per batch of new files.
+            Never ends.
+
+    """
+
+    import watchfolder
+
+    if settle_time == None:
+        settle_time = watchfolder.FolderWatcher.DEFAULT_SETTLE_TIME
+
+    prefix = output_info.get("OutputFileNamePrefix", "")
+    use_date_time = output_info.get("OutputFileNameUseDateAndTime", "1") != "0"
+    group_companions = output_info.get("OutputFileNameGroupCompanions", "0") != "0"
+    exiftool.set_date_tags(get_date_tags(output_info))
+
+    watcher = watchfolder.FolderWatcher(
+        input_info["InputMediaDirectory"], get_file_types(input_info), settle_time)
+    try:
+        for files in watcher.batches():
+            if workers == 1 and not needs_planned_rename(output_info):
+                results = list(exiftool.rename_file_list(files, prefix, use_date_time))
+            else:
+                results = exiftool.rename_file_list_in_parallel(
+                    files, prefix, use_date_time, workers, cache, group_companions)
+
+            # Our own renames look like new files to the watcher
+            watcher.ignore([result.new_file for result in results
+                            if result.new_file != None])
+            yield results
+    finally:
+        watcher.close()
+
+#
+# Private
+#
+
+def _rename_deduplicated(exiftool, files, prefix, use_date_time, dedupe_action,
+                         planned, group_companions, workers, cache):
+    """Generator that handles the duplicates of files, then renames the
+    others. See rename().
+
+    """
+
+    import dedupe
+
+    files = list(files)
+    duplicates = set()
+    for group in dedupe.find_duplicates(files):
+        original = group[0]
+        for file in group[1:]:
+            duplicates.add(file)
+            message = "Duplicate of " + original
+            status = exiftoolwrap.RENAME_STATUS_WARNING
+            if dedupe_action == dedupe.ACTION_HARDLINK:
+                try:
+                    dedupe.link_duplicate(original, file)
+                    message += ", hard linked"
+                except OSError as e:
+                    message += ", couldn't hard link it: " + str(e)
+                    status = exiftoolwrap.RENAME_STATUS_ERROR
+            yield exiftoolwrap.RenameResult(file, None, status, message)
+
+    if dedupe_action == dedupe.ACTION_REPORT:
+        return
+
+    files = [file for file in files if file not in duplicates]
+    if planned:
+        results = exiftool.rename_file_list_in_parallel(
+            sorted(files), prefix, use_date_time, workers, cache, group_companions)
+    else:
+        results = exiftool.rename_file_list(files, prefix, use_date_time)
+    for result in results:
+        yield result
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,149 @@
+"""Minimal QuickTime and ISO base media (MOV, MP4, 3GP...) reader for the date
+and time a movie was created.
+
+Movies are big and the moov atom describing them is often written after the
+media data, at the end of the file. The top-level atoms are walked with seeks,
+reading only their headers, then the headers of the moov children and the
+mvhd (movie header) atom. That's a few hundred bytes whatever the size of the
+movie, where exiftool would be handed the whole file.
+
+    tags = quicktimereader.read_date_tags("MVI_0001.MOV")
+    # {"CreateDate": "2012:02:27 13:45:12"}
+
+Like exiftool's, the value is the creation time as stored in the movie,
+normally UTC.
+
+"""
+
+# Public
+import datetime
+import os
+import struct
+
+
+# Tags read_date_tags() reports when the file has them. Movies it accepts
+# don't have the others.
+DATE_TAGS = ("DateTimeOriginal", "CreateDate")
+
+# Types a movie file may start with
+_FIRST_ATOM_TYPES = frozenset((b"ftyp", b"moov", b"mdat", b"free", b"skip",
+                               b"wide", b"pnot"))
+
+# Atoms where exiftool may find EXIF or XMP dates (ex. the DateTimeOriginal of
+# cameras, edited dates). Movies having any are left to exiftool.
+_METADATA_ATOM_TYPES = frozenset((
+    b"uuid",                                    # XMP, Sony, GoPro...
+    b"XMP_",
+    b"CNTH", b"CMT1", b"CMT2", b"CMT3", b"CMT4",    # Canon
+    b"NCDT",                                    # Nikon
+    b"PANA",                                    # Panasonic
+    b"TAGS"))                                   # Pentax, Kodak...
+
+_QUICKTIME_EPOCH = datetime.datetime(1904, 1, 1)
+
+_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# Sanity limit protecting us from corrupted files
+_MAX_ATOMS = 1000
+
+#
+# Public
+#
+
+def read_date_tags(path):
+    """Reads the creation date and time of a movie from its mvhd atom.
+
+    return: dictionary with the CreateDate tag, formatted like exiftool's
+            (ex. "2012:02:27 13:45:12"), empty if the movie has no creation
+            time. The movie has none of the other DATE_TAGS. None if the file
+            isn't a movie this module can handle, in which case exiftool
+            should be asked instead.
+
+    """
+
+    try:
+        with open(path, "rb") as file:
+            file_size = os.fstat(file.fileno()).st_size
+
+            moov = None
+            for atom_type, offset, size, header_size in _iter_atoms(file, 0, file_size):
+                if offset == 0 and atom_type not in _FIRST_ATOM_TYPES:
+                    return None
+                if atom_type in _METADATA_ATOM_TYPES:
+                    return None
+                if atom_type == b"moov":
+                    moov = (offset + header_size, offset + size)
+            if moov == None:
+                return None
+
+            creation_time = None
+            for atom_type, offset, size, header_size in _iter_atoms(file, *moov):
+                if atom_type in _METADATA_ATOM_TYPES:
+                    return None
+                if atom_type == b"mvhd":
+                    creation_time = _read_creation_time(file, offset + header_size)
+                elif atom_type == b"udta":
+                    for child in _iter_atoms(file, offset + header_size, offset + size):
+                        if child[0] in _METADATA_ATOM_TYPES:
+                            return None
+            if creation_time == None:
+                return None
+    except (OSError, ValueError, OverflowError, struct.error):
+        return None
+
+    tags = {}
+    if creation_time != 0:
+        # 0 means it wasn't set
+        tags["CreateDate"] = (_QUICKTIME_EPOCH + datetime.timedelta(
+            seconds=creation_time)).strftime(_DATE_FORMAT)
+    return tags
+
+#
+# Private
+#
+
+def _iter_atoms(file, start, end):
+    """Generator that walks the atoms between offsets start and end of file,
+    reading their headers only.
+
+    return: yields (type, offset, size, header size) per atom
+
+    """
+
+    offset = start
+    for i in range(_MAX_ATOMS):
+        if offset + 8 > end:
+            return
+
+        file.seek(offset)
+        size, atom_type = struct.unpack(">I4s", file.read(8))
+        header_size = 8
+        if size == 1:
+            # 64-bit size, typical of the mdat of big movies
+            size = struct.unpack(">Q", file.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            # Last atom, up to the end
+            size = end - offset
+
+        if size < header_size or offset + size > end:
+            raise ValueError("Invalid atom size")
+
+        yield atom_type, offset, size, header_size
+        offset += size
+
+    raise ValueError("Too many atoms")
+
+
+def _read_creation_time(file, offset):
+    """return: creation time of the mvhd atom whose data is at offset, in
+               seconds since the QuickTime epoch
+
+    """
+
+    file.seek(offset)
+    data = file.read(12)
+    if data[:1] == b"\x01":
+        # Version 1 has 64-bit times
+        return struct.unpack(">Q", data[4:12])[0]
+    return struct.unpack(">I", data[4:8])[0]
@@ -0,0 +1,224 @@
+"""History of the rename runs, and their undo.
+
+Every run records what it renamed in its own file of JSON lines, in the
+history directory of our application data. Names are grouped by directory so
+each rename only costs its two names, plus the size and modification time of
+the renamed file to detect files changed since:
+
+    ["run", {"created": 1329000000.0, "description": "cli /media/card1"}]
+    ["d", "/media/card1"]
+    ["IMG_0001.JPG", "2012-02-27_13h45m12s.JPG", 3145728, 1329000000000000000]
+
+Undoing a run reads its file once, checks the renamed files didn't change and
+gives them back their names directory by directory, going through temporary
+names where files swapped names:
+
+    history = renamehistory.RunHistory(os.path.join(local_appdata_path, "history"))
+    recorder = history.create_recorder("cli /media/card1")
+    for result in results:
+        recorder.record(result)
+    recorder.close()
+    ...
+    results = history.undo()
+
+"""
+
+# Public
+import json
+import os
+import os.path
+import time
+
+# Internal
+import exiftoolwrap
+
+
+class RunRecorder:
+    """Records the renames of a run. Created by RunHistory.create_recorder()."""
+
+    path = None
+    count = 0
+
+    _file = None
+    _directory = None
+
+
+    def __init__(self, path, description):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._write(["run", {"created": time.time(), "description": description}])
+
+
+    def record(self, result):
+        """Records an exiftoolwrap.RenameResult. Only renamed files are kept."""
+
+        if result.status != exiftoolwrap.RENAME_STATUS_RENAMED:
+            return
+
+        # exiftool reports paths relative to the current directory
+        new_file = os.path.abspath(result.new_file)
+        directory, new_name = os.path.split(new_file)
+        try:
+            stat = os.stat(new_file)
+        except OSError:
+            # Gone already, it couldn't be undone anyway
+            return
+
+        if directory != self._directory:
+            self._directory = directory
+            self._write(["d", directory])
+        self._write([os.path.relpath(os.path.abspath(result.file), directory), new_name,
+                     stat.st_size, stat.st_mtime_ns])
+        self.count += 1
+
+
+    def flush(self):
+        """Writes what was recorded so far to disk, for long runs."""
+
+        self._file.flush()
+
+
+    def close(self):
+        """Closes the record. A run that renamed nothing isn't kept."""
+
+        if self._file == None:
+            return
+        self._file.close()
+        self._file = None
+        if self.count == 0:
+            os.remove(self.path)
+
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+class RunHistory:
+    """The recorded runs, the most recent ones only."""
+
+    DIRECTORY_NAME = "history"
+
+    # Number of runs kept
+    MAX_RUNS = 100
+
+    _path = None
+
+
+    def __init__(self, path):
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+
+
+    #
+    # Public
+    #
+
+    def create_recorder(self, description):
+        """Starts recording a run, forgetting the oldest runs beyond MAX_RUNS.
+
+        return: a RunRecorder. Close it when the run is over.
+
+        """
+
+        run_ids = self.get_run_ids()
+        for run_id in run_ids[:max(0, len(run_ids) - self.MAX_RUNS + 1)]:
+            try:
+                os.remove(self._get_run_path(run_id))
+            except OSError:
+                pass
+
+        # Sortable and unique
+        run_id = "%s-%09d-%d" % (time.strftime("%Y%m%d-%H%M%S"),
+                                 time.time_ns() % 1000000000, os.getpid())
+        return RunRecorder(self._get_run_path(run_id), description)
+
+
+    def get_run_ids(self):
+        """return: list of the recorded runs, the oldest first"""
+
+        return sorted(name[:-len(_RUN_EXTENSION)] for name in os.listdir(self._path)
+                      if name.endswith(_RUN_EXTENSION))
+
+
+    def get_run_info(self, run_id):
+        """return: the "run" header of a run (ex. {"created": ..., "description": ...})"""
+
+        with open(self._get_run_path(run_id), encoding="utf-8") as file:
+            return json.loads(file.readline())[1]
+
+
+    def undo(self, run_id=None):
+        """Gives the files renamed by a run their previous names back.
+
+        Files that were changed, moved or deleted since the run are left
+        alone and reported as errors, as are files whose previous name is
+        taken by another file. The undo is recorded as a run itself, so it
+        can be undone too.
+
+        Parameters:
+            run_id: run to undo. Defaults to the most recent one.
+
+        return: list of exiftoolwrap.RenameResult. None if there is no run
+                to undo.
+
+        """
+
+        if run_id == None:
+            run_ids = self.get_run_ids()
+            if not run_ids:
+                return None
+            run_id = run_ids[-1]
+
+        results = []
+        renames_by_directory = {}
+        with open(self._get_run_path(run_id), encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Cut short when the run was interrupted
+                    break
+
+                if record[0] == "run":
+                    continue
+                elif record[0] == "d":
+                    directory = record[1]
+                    renames = renames_by_directory.setdefault(directory, [])
+                    continue
+
+                name, new_name, size, mtime_ns = record
+                file_path = os.path.join(directory, new_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    results.append(exiftoolwrap.RenameResult(
+                        file_path, None, exiftoolwrap.RENAME_STATUS_ERROR,
+                        "File not found"))
+                    continue
+                if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                    results.append(exiftoolwrap.RenameResult(
+                        file_path, None, exiftoolwrap.RENAME_STATUS_ERROR,
+                        "File changed since it was renamed"))
+                    continue
+                renames.append((file_path, os.path.join(directory, name)))
+
+        recorder = self.create_recorder("undo " + run_id)
+        try:
+            for renames in renames_by_directory.values():
+                for result in exiftoolwrap.apply_renames(renames):
+                    recorder.record(result)
+                    results.append(result)
+        finally:
+            recorder.close()
+
+        return results
+
+    #
+    # Private
+    #
+
+    def _get_run_path(self, run_id):
+        return os.path.join(self._path, run_id + _RUN_EXTENSION)
+
+
+_RUN_EXTENSION = ".jsonl"
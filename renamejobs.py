@@ -0,0 +1,379 @@
+"""Resumable rename jobs.
+
+Every queued media directory is a job with its own journal, an append-only
+file of JSON lines in the jobs directory of our application data:
+
+    ["job", {"directory": ..., "prefix": ..., "priority": 0, ...}]
+    ["plan", "IMG_0001.JPG", "2012-02-27_13h45m12s.JPG"]   one per rename
+    ["plan", "MVI_0002.MOV", "2012-02-27_13h46m01s.MOV", "from CreateDate"]
+    ["skip", "notes.txt", "warning", "[minor] Tag 'DateTimeOriginal' not defined"]
+    ["planned", 1]
+    ["done", "IMG_0001.JPG", "2012-02-27_13h45m12s.JPG", null]
+    ["finished"]
+
+Paths are relative to the job directory. The renames are planned once, with
+the metadata of all the files, and journaled before any file is touched. A
+plan line may end with the message of the rename, telling which of several
+date tags the date and time came from.
+They are then done in batches, each journaled and synced to disk with a
+single fsync.
+
+If the process dies, running the queue again resumes each job after its last
+complete line: a planned job doesn't read any metadata again and only the
+renames that aren't journaled as done are left. A rename that happened but
+didn't make it to the journal is recognized by its file being already at its
+new name.
+
+    queue = renamejobs.JobQueue(os.path.join(local_appdata_path, "jobs"))
+    queue.add("/media/card1", "Holidays_", ["*.*"], True, priority=1)
+    for job, results in queue.run(exiftool):
+        ...
+
+Only one process may run a queue at a time.
+
+"""
+
+# Public
+import itertools
+import json
+import os
+import os.path
+import time
+
+# Internal
+import dirscan
+import exiftoolwrap
+
+
+class Job:
+    """A queued media directory. See JobQueue.add() for the attributes."""
+
+    id = None
+    directory = None
+    prefix = ""
+    file_types = None
+    use_date_time = True
+    recursive = False
+    include = None
+    exclude = None
+    group_companions = False
+    priority = 0
+    created = 0
+
+    # Path of the journal
+    path = None
+
+
+    def __init__(self, job_id, path, settings):
+        self.id = job_id
+        self.path = path
+        for key in ("directory", "prefix", "file_types", "use_date_time",
+                    "recursive", "include", "exclude", "group_companions",
+                    "priority", "created"):
+            if key in settings:
+                setattr(self, key, settings[key])
+
+
+class JobQueue:
+    """Queue of rename jobs processed in priority order.
+
+    Journals of finished jobs are kept as the record of what was renamed.
+
+    """
+
+    DIRECTORY_NAME = "jobs"
+
+    # Renames done between two journal syncs
+    COMMIT_INTERVAL = 500
+
+    _path = None
+
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path: directory holding the job journals. Created if needed.
+
+        """
+
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+
+
+    #
+    # Public
+    #
+
+    def add(self, directory, prefix, file_types, use_date_time, recursive=False,
+            include=None, exclude=None, priority=0, group_companions=False):
+        """Queues the rename of the files of directory.
+
+        Parameters:
+            priority: jobs with a higher priority run first. Jobs with the same
+                       priority run in the order they were added.
+
+            group_companions: True to rename the companion files together,
+                       see ExiftoolWrap.plan_renames()
+
+            See ExiftoolWrap.launch_file_rename() and dirscan.scan_files()
+            for the other parameters.
+
+        return: the queued Job
+
+        """
+
+        if isinstance(file_types, str):
+            file_types = file_types.split(";")
+
+        settings = {"directory": os.path.abspath(directory),
+                    "prefix": prefix,
+                    "file_types": [file_type for file_type in file_types
+                                   if file_type.strip() != ""],
+                    "use_date_time": use_date_time,
+                    "recursive": recursive,
+                    "include": include,
+                    "exclude": exclude,
+                    "group_companions": group_companions,
+                    "priority": priority,
+                    "created": time.time()}
+
+        job_id = "%s-%d-%d" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid(),
+                               next(_job_counter))
+        path = os.path.join(self._path, job_id + _JOURNAL_EXTENSION)
+        journal = _Journal(path)
+        try:
+            journal.append(["job", settings])
+            journal.commit()
+        finally:
+            journal.close()
+        _sync_directory(self._path)
+
+        return Job(job_id, path, settings)
+
+
+    def get_pending_jobs(self):
+        """return: list of the unfinished Job, in the order they will run"""
+
+        jobs = []
+        for name in os.listdir(self._path):
+            if not name.endswith(_JOURNAL_EXTENSION):
+                continue
+            path = os.path.join(self._path, name)
+            settings, finished = _read_header_and_state(path)
+            if settings != None and not finished:
+                jobs.append(Job(name[:-len(_JOURNAL_EXTENSION)], path, settings))
+
+        jobs.sort(key=lambda job: (-job.priority, job.created, job.id))
+        return jobs
+
+
+    def run(self, exiftool, workers=1, cache=None):
+        """Generator that processes the pending jobs, the highest priority
+        first, until there are none left.
+
+        Parameters:
+            exiftool: an installed exiftoolwrap.ExiftoolWrap
+
+            workers, cache: see ExiftoolWrap.plan_renames()
+
+        return: yields (job, results) where results is a list of
+                exiftoolwrap.RenameResult, once they are journaled
+
+        """
+
+        while True:
+            jobs = self.get_pending_jobs()
+            if not jobs:
+                return
+            for results in self._run_job(jobs[0], exiftool, workers, cache):
+                yield jobs[0], results
+
+    #
+    # Private
+    #
+
+    def _run_job(self, job, exiftool, workers, cache):
+        """Generator that runs or resumes job. return: yields RenameResult lists"""
+
+        plan, done_files, planned, valid_size = _read_journal(job.path)
+
+        def absolute(relative_path):
+            return os.path.join(job.directory, relative_path)
+
+        def relative(path):
+            return os.path.relpath(path, job.directory)
+
+        journal = _Journal(job.path, valid_size)
+        try:
+            if not planned:
+                files = sorted(dirscan.scan_files(
+                    job.directory, job.file_types, job.recursive, job.include, job.exclude))
+                date_sources = {}
+                renames, results = exiftool.plan_renames(
+                    files, job.prefix, job.use_date_time, workers, cache,
+                    job.group_companions, date_sources)
+                messages = exiftool.get_date_source_messages(date_sources) or {}
+
+                plan = []
+                for file, new_file in renames:
+                    record = ["plan", relative(file), relative(new_file)]
+                    if file in messages:
+                        record.append(messages[file])
+                    journal.append(record)
+                    plan.append(tuple(record[1:]))
+                for result in results:
+                    journal.append(["skip", relative(result.file), result.status, result.message])
+                journal.append(["planned", len(renames)])
+                journal.commit()
+
+                if results:
+                    yield results
+
+            remaining = []
+            for step in plan:
+                if step[0] not in done_files:
+                    message = step[2] if len(step) > 2 else ""
+                    remaining.append((absolute(step[0]), absolute(step[1]), message))
+            for chunk in dirscan.iter_chunks(remaining, self.COMMIT_INTERVAL):
+                results = []
+                renames = []
+                messages = {}
+                for file, new_file, message in chunk:
+                    if not os.path.lexists(file) and os.path.lexists(new_file):
+                        # Renamed before the process died, but not journaled
+                        results.append(exiftoolwrap.RenameResult(
+                            file, new_file, exiftoolwrap.RENAME_STATUS_RENAMED, message))
+                    else:
+                        renames.append((file, new_file))
+                        if message:
+                            messages[file] = message
+                results += exiftoolwrap.apply_renames(renames, messages)
+
+                for result in results:
+                    journal.append(["done", relative(result.file),
+                                    None if result.new_file == None else relative(result.new_file),
+                                    result.message or None])
+                journal.commit()
+                yield results
+
+            journal.append(["finished"])
+            journal.commit()
+        finally:
+            journal.close()
+
+
+_JOURNAL_EXTENSION = ".jsonl"
+
+_job_counter = itertools.count()
+
+
+class _Journal:
+    """Append-only file of JSON lines, synced to disk by commit()."""
+
+    _file = None
+
+
+    def __init__(self, path, valid_size=None):
+        """
+        Parameters:
+            valid_size: size of the complete lines of an existing journal.
+                       Whatever follows, typically half a line written when the
+                       process died, is cut.
+
+        """
+
+        self._file = open(path, "ab")
+        if valid_size != None and self._file.tell() > valid_size:
+            self._file.truncate(valid_size)
+            self._file.seek(valid_size)
+
+
+    def append(self, record):
+        self._file.write(
+            json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+
+
+    def commit(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+    def close(self):
+        self._file.close()
+
+
+def _read_journal(path):
+    """return: (plan, done_files, planned, valid_size) where plan is the list
+               of (file, new_file) or (file, new_file, message) planned,
+               done_files the set of files
+               journaled as done, planned True if the plan is complete and
+               valid_size the size of the complete lines.
+
+    """
+
+    plan = []
+    done_files = set()
+    planned = False
+    valid_size = 0
+    header_size = None
+    with open(path, "rb") as file:
+        for line in file:
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            valid_size += len(line)
+            if header_size == None:
+                header_size = valid_size
+
+            if record[0] == "plan":
+                plan.append(tuple(record[1:]))
+            elif record[0] == "planned":
+                planned = True
+            elif record[0] == "done":
+                done_files.add(record[1])
+
+    if not planned:
+        # The plan is started over
+        plan = []
+        valid_size = header_size
+    return plan, done_files, planned, valid_size
+
+
+def _read_header_and_state(path):
+    """Reads the first and last lines of a journal only.
+
+    return: (settings, finished). settings is None if the journal is invalid.
+
+    """
+
+    try:
+        with open(path, "rb") as file:
+            header = json.loads(file.readline().decode("utf-8"))
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            file.seek(max(0, size - 64))
+            finished = file.read().endswith(b'["finished"]\n')
+    except (OSError, ValueError):
+        return None, False
+
+    if not isinstance(header, list) or header[:1] != ["job"]:
+        return None, False
+    return header[1], finished
+
+
+def _sync_directory(path):
+    """Makes a new file in path survive a power loss (POSIX only)."""
+
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,329 @@
+"""Plans renames in memory before touching the disk.
+
+RenamePlanner gives new names to files the way exiftool's "%-c.%e" does,
+copy numbers included, without probing the file system for every candidate
+name. execute_renames() then applies any old to new mapping in an order that
+never overwrites a file, going through temporary names to break cycles such
+as a -> b, b -> a.
+
+    planner = RenamePlanner()
+    renames = [(file, planner.add(file, base)) for file, base in new_bases]
+    results = execute_renames([r for r in renames if r[1] != None])
+
+"""
+
+# Public
+import heapq
+import itertools
+import os
+import os.path
+
+
+class RenamePlanner:
+    """Simulates exiftool's "%-c.%e" renaming of files, one after the other.
+
+    A file gets the first of "base.ext", "base-1.ext", "base-2.ext"... that no
+    file of its directory uses at that moment, unless it already has one of
+    these names, in which case it keeps it.
+
+    The names of each directory are listed once and kept in a set. For each
+    base name, the lowest copy number that may be free is remembered so a
+    directory holding thousands of files with the same date and time isn't
+    probed from copy number 0 for every file.
+
+    """
+
+    _directories = None
+
+
+    def __init__(self):
+        self._directories = {}
+
+
+    def add(self, file, new_base):
+        """Plans the rename of file, after all the files added before it.
+
+        Parameters:
+            file: path of the file
+
+            new_base: new name of the file without copy number nor extension
+
+        return: the new path of the file. None if it keeps its name.
+
+        """
+
+        return self.add_group([file], new_base)[0]
+
+
+    def add_group(self, files, new_base, extensions=None):
+        """Plans the rename of companion files (ex. IMG_0001.CR2 and
+        IMG_0001.XMP) to the same new base name. They get the first copy
+        number that is free for all of them.
+
+        Parameters:
+            files: paths of the files, all in the same directory
+
+            new_base: new name of the files without copy number nor extension
+
+            extensions: what each file keeps after new_base and the copy
+                       number (ex. ".CR2.xmp"). Defaults to their extension.
+
+        return: list of the new path of each file. None for the files keeping
+                their name, which they all do if they already share one of
+                the candidate names.
+
+        """
+
+        directory = os.path.dirname(files[0])
+        names = [os.path.basename(file) for file in files]
+        if extensions == None:
+            extensions = [os.path.splitext(name)[1] for name in names]
+        state = self._get_directory_state(directory)
+
+        all_copy_numbers = []
+        for extension in extensions:
+            key = os.path.normcase(new_base + extension)
+            copy_numbers = state.copy_numbers.get(key)
+            if copy_numbers == None:
+                copy_numbers = _CopyNumbers()
+                state.copy_numbers[key] = copy_numbers
+            all_copy_numbers.append(copy_numbers)
+
+        def is_taken_by_extension(extension):
+            return lambda copy_number: os.path.normcase(
+                _make_name(new_base, copy_number, extension)) in state.names
+
+        # The first number free for every file, then the first above it that
+        # is free for all of them
+        copy_number = max(
+            copy_numbers.first_free(is_taken_by_extension(extension))
+            for copy_numbers, extension in zip(all_copy_numbers, extensions))
+        while any(is_taken_by_extension(extension)(copy_number) for extension in extensions):
+            copy_number += 1
+
+        # Files that have one of the candidate names before the first free one
+        # are left alone, exiftool stops on them.
+        own_copy_numbers = set(
+            _parse_copy_number(name, new_base, extension)
+            for name, extension in zip(names, extensions))
+        if len(own_copy_numbers) == 1:
+            own_copy_number = own_copy_numbers.pop()
+            if own_copy_number != None and own_copy_number < copy_number:
+                return [None] * len(files)
+
+        new_files = []
+        for name, extension, copy_numbers in zip(names, extensions, all_copy_numbers):
+            new_name = _make_name(new_base, copy_number, extension)
+            copy_numbers.claim(copy_number)
+            state.names.add(os.path.normcase(new_name))
+            state.names.discard(os.path.normcase(name))
+            state.release(name, extension)
+            new_files.append(os.path.join(directory, new_name))
+
+        return new_files
+
+
+    def _get_directory_state(self, directory):
+        state = self._directories.get(directory)
+        if state == None:
+            state = _DirectoryState(os.listdir(directory or "."))
+            self._directories[directory] = state
+        return state
+
+
+def execute_renames(renames):
+    """Renames files without ever overwriting one.
+
+    The mapping is applied in an order where each file is renamed once its
+    new name has been freed by the file holding it. Files renaming each other
+    in a cycle go through a temporary name.
+
+    Parameters:
+        renames: list of (file, new_file). The files and the new files must
+                   all be different.
+
+    return: list of (file, new_file, error) in the order the renames were
+            done. error is None on success, the reason otherwise.
+
+    """
+
+    new_files_by_key = dict(
+        (_path_key(file), new_file) for file, new_file in renames)
+
+    results = []
+    done = set()
+    for file, new_file in renames:
+        if _path_key(file) in done:
+            continue
+
+        # Follow the files holding the names we need until a free name or a
+        # cycle is reached.
+        chain = [(file, new_file)]
+        chain_keys = set([_path_key(file)])
+        cycle = False
+        while True:
+            next_key = _path_key(chain[-1][1])
+            if next_key in chain_keys:
+                cycle = next_key == _path_key(chain[0][0])
+                break
+            if next_key in done or next_key not in new_files_by_key:
+                break
+            chain.append((chain[-1][1], new_files_by_key[next_key]))
+            chain_keys.add(next_key)
+
+        done.update(chain_keys)
+
+        if cycle:
+            # Free the name of the first file of the cycle, run the rest of
+            # the cycle, then move the first file in place.
+            temporary_file = _make_temporary_file(chain[0][0])
+            error = _rename(chain[0][0], temporary_file)
+            for link in reversed(chain[1:]):
+                results.append(link + (_rename(*link),))
+            if error == None:
+                error = _rename(temporary_file, chain[0][1])
+            results.append(chain[0] + (error,))
+        else:
+            for link in reversed(chain):
+                results.append(link + (_rename(*link),))
+
+    return results
+
+#
+# Private
+#
+
+class _DirectoryState:
+    """Names used in a directory and the copy numbers handed out in it."""
+
+    # Normalized names of the files currently in the directory
+    names = None
+
+    # Normalized "base.ext" to _CopyNumbers
+    copy_numbers = None
+
+
+    def __init__(self, names):
+        self.names = set(os.path.normcase(name) for name in names)
+        self.copy_numbers = {}
+
+
+    def release(self, name, extension):
+        """Lets the copy numbers know that name was freed.
+
+        Parameters:
+            name: name of the file renamed
+
+            extension: what the file kept after the base name and the copy
+                       number (ex. ".CR2.xmp")
+
+        """
+
+        copy_numbers = self.copy_numbers.get(os.path.normcase(name))
+        if copy_numbers != None:
+            copy_numbers.release(0)
+
+        base = name[:len(name) - len(extension)].rpartition("-")[0]
+        copy_number = _parse_copy_number(name, base, extension)
+        if base != "" and copy_number != None:
+            copy_numbers = self.copy_numbers.get(os.path.normcase(base + extension))
+            if copy_numbers != None:
+                copy_numbers.release(copy_number)
+
+
+class _CopyNumbers:
+    """Finds the lowest free copy number of a base name.
+
+    Copy numbers below the frontier are known to be taken unless they were
+    released since, in which case they wait in a heap. Claimed numbers are
+    never probed again so finding copy numbers is linear overall.
+
+    """
+
+    _frontier = 0
+    _released = None
+
+
+    def __init__(self):
+        self._released = []
+
+
+    def first_free(self, is_taken):
+        while self._released and (self._released[0] >= self._frontier
+                                  or is_taken(self._released[0])):
+            heapq.heappop(self._released)
+        if self._released:
+            return self._released[0]
+
+        while is_taken(self._frontier):
+            self._frontier += 1
+        return self._frontier
+
+
+    def claim(self, copy_number):
+        if self._released and self._released[0] == copy_number:
+            heapq.heappop(self._released)
+        elif copy_number == self._frontier:
+            self._frontier += 1
+
+
+    def release(self, copy_number):
+        if copy_number < self._frontier:
+            heapq.heappush(self._released, copy_number)
+
+
+_temporary_counter = itertools.count()
+
+
+def _make_temporary_file(file):
+    directory = os.path.dirname(file)
+    while True:
+        temporary_file = os.path.join(directory, "~photorename_%d_%d.tmp" % (
+            os.getpid(), next(_temporary_counter)))
+        if not os.path.lexists(temporary_file):
+            return temporary_file
+
+
+def _rename(file, new_file):
+    """return: None on success, the error message otherwise"""
+
+    # os.rename silently replaces existing files on POSIX. Changing the case
+    # of a name on a case insensitive file system is fine though.
+    if os.path.lexists(new_file) and _path_key(file) != _path_key(new_file):
+        return "File already exists: " + new_file
+    try:
+        os.rename(file, new_file)
+    except OSError as e:
+        return str(e)
+    return None
+
+
+def _make_name(base, copy_number, extension):
+    if copy_number == 0:
+        return base + extension
+    return base + "-" + str(copy_number) + extension
+
+
+def _parse_copy_number(name, base, extension):
+    """return: copy_number if name is _make_name(base, copy_number, extension),
+               None otherwise.
+
+    """
+
+    name = os.path.normcase(name)
+    prefix = os.path.normcase(base)
+    extension = os.path.normcase(extension)
+    if (len(name) < len(prefix) + len(extension)
+            or not name.startswith(prefix) or not name.endswith(extension)):
+        return None
+
+    middle = name[len(prefix):len(name) - len(extension)]
+    if middle == "":
+        return 0
+    if middle.startswith("-") and middle[1:].isdigit() and not middle.startswith("-0"):
+        return int(middle[1:])
+    return None
+
+
+def _path_key(path):
+    return os.path.normcase(os.path.normpath(path))
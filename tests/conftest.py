@@ -0,0 +1,45 @@
+"""Fixtures shared by the tests.
+
+The modules of photorename sit at the root of the repository, next to
+exiftoolfake.py, the stand-in for exiftool the tests rename with.
+
+"""
+
+# Public
+import os
+import os.path
+import sys
+
+import pytest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+# Internal
+import exiftoolwrap
+
+
+EXIFTOOL_FAKE_PATH = os.path.join(ROOT_PATH, "exiftoolfake.py")
+
+
+@pytest.fixture
+def exiftool():
+    """An ExiftoolWrap running exiftoolfake.py"""
+
+    wrap = exiftoolwrap.ExiftoolWrap(installation_info={"path": EXIFTOOL_FAKE_PATH})
+    assert wrap.is_installed()
+    yield wrap
+    wrap.close()
+
+
+@pytest.fixture
+def appdata(tmp_path, monkeypatch):
+    """Application data of photorename in tmp_path rather than in the home of
+    the user running the tests.
+
+    """
+
+    path = tmp_path / "appdata"
+    monkeypatch.setenv("XDG_DATA_HOME", str(path))
+    monkeypatch.setenv("LOCALAPPDATA", str(path))
+    return path
@@ -0,0 +1,131 @@
+"""Writes the small files the tests rename."""
+
+# Public
+import calendar
+import os
+import struct
+import time
+
+
+# Seconds between 1904-01-01, the QuickTime epoch, and 1970-01-01
+QUICKTIME_EPOCH_OFFSET = 2082844800
+
+# IDs of the EXIF tags make_tiff_data() can write
+EXIF_TAG_IDS = {"DateTimeOriginal": 0x9003,
+                "CreateDate": 0x9004,
+                "OffsetTimeOriginal": 0x9011,
+                "SubSecTimeOriginal": 0x9291}
+
+
+def make_tiff_data(tags, byte_order="II"):
+    """return: bytes of a TIFF header, an IFD0 pointing to an EXIF IFD and
+               that EXIF IFD holding tags, a dictionary of EXIF_TAG_IDS
+               names and string values.
+
+    """
+
+    endian = "<" if byte_order == "II" else ">"
+    values = sorted((EXIF_TAG_IDS[name], value.encode("ascii") + b"\x00")
+                    for name, value in tags.items())
+
+    ifd0_offset = 8
+    exif_offset = ifd0_offset + 2 + 12 + 4
+    value_offset = exif_offset + 2 + 12 * len(values) + 4
+
+    data = byte_order.encode("ascii") + struct.pack(endian + "HI", 42, ifd0_offset)
+    data += struct.pack(endian + "HHHIII", 1, 0x8769, 4, 1, exif_offset, 0)
+
+    entries = b""
+    value_data = b""
+    for tag, value in values:
+        if len(value) <= 4:
+            entries += struct.pack(endian + "HHI", tag, 2, len(value)) + value.ljust(4, b"\x00")
+        else:
+            entries += struct.pack(endian + "HHII", tag, 2, len(value),
+                                   value_offset + len(value_data))
+            value_data += value
+    data += struct.pack(endian + "H", len(values)) + entries + struct.pack(endian + "I", 0)
+    return data + value_data
+
+
+def write_exif_jpeg(path, tags, byte_order="II"):
+    """Writes a JPEG holding tags, see make_tiff_data(). return: path"""
+
+    exif_data = b"Exif\x00\x00" + make_tiff_data(tags, byte_order)
+    path.write_bytes(b"\xff\xd8"
+                     + b"\xff\xe1" + struct.pack(">H", len(exif_data) + 2) + exif_data
+                     + b"\xff\xda" + struct.pack(">H", 2) + b"\x00" * 64
+                     + b"\xff\xd9")
+    return path
+
+
+def write_jpeg(path, date_time_original, sub_sec=None, byte_order="II"):
+    """Writes a JPEG whose DateTimeOriginal is date_time_original (ex.
+    "2012:02:27 13:45:12").
+
+    return: path
+
+    """
+
+    tags = {"DateTimeOriginal": date_time_original}
+    if sub_sec != None:
+        tags["SubSecTimeOriginal"] = sub_sec
+    return write_exif_jpeg(path, tags, byte_order)
+
+
+def write_tiff(path, date_time_original, byte_order="MM"):
+    """Writes a TIFF file, the layout of most RAW formats, whose
+    DateTimeOriginal is date_time_original. return: path
+
+    """
+
+    path.write_bytes(make_tiff_data({"DateTimeOriginal": date_time_original}, byte_order))
+    return path
+
+
+def make_atom(atom_type, data):
+    """return: bytes of a QuickTime atom"""
+
+    return struct.pack(">I4s", len(data) + 8, atom_type) + data
+
+
+def write_movie(path, create_date, atoms=()):
+    """Writes a QuickTime movie whose mvhd atom was created at create_date
+    (ex. "2012:02:27 13:45:12"), None to leave it unset. atoms are appended
+    after the moov atom.
+
+    return: path
+
+    """
+
+    creation_time = 0
+    if create_date != None:
+        creation_time = calendar.timegm(time.strptime(
+            create_date, "%Y:%m:%d %H:%M:%S")) + QUICKTIME_EPOCH_OFFSET
+    # Version 0: version/flags, creation, modification, time scale, duration,
+    # then the rest of the atom left to zeros
+    mvhd = struct.pack(">IIIII", 0, creation_time, creation_time, 600, 600) + b"\x00" * 80
+    path.write_bytes(make_atom(b"ftyp", b"qt  \x00\x00\x00\x00qt  ")
+                     + make_atom(b"mdat", b"\x00" * 64)
+                     + make_atom(b"moov", make_atom(b"mvhd", mvhd))
+                     + b"".join(atoms))
+    return path
+
+
+def write_file(path, data=b"data", modify_date=None):
+    """Writes a file without any metadata, modified at modify_date (ex.
+    "2012:02:27 13:45:12" in local time) if given.
+
+    return: path
+
+    """
+
+    path.write_bytes(data)
+    if modify_date != None:
+        mtime = time.mktime(time.strptime(modify_date, "%Y:%m:%d %H:%M:%S"))
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def list_names(path):
+    return sorted(os.listdir(path))
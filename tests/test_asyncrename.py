@@ -0,0 +1,119 @@
+"""Concurrent directory renames of the asyncio engine."""
+
+# Public
+import asyncio
+import os
+
+# Internal
+import asyncrename
+import exiftoolwrap
+from media import list_names, write_jpeg
+
+
+def make_directories(tmp_path, count):
+    directories = []
+    for index in range(count):
+        directory = tmp_path / ("card%d" % index)
+        directory.mkdir()
+        write_jpeg(directory / "IMG_0001.jpg", "2012:02:27 13:45:1%d" % index)
+        directories.append(directory)
+    return directories
+
+
+def use_sleeping_exiftool(exiftool, tmp_path, monkeypatch):
+    """Makes the jobs run an executable that never answers."""
+
+    path = tmp_path / "sleeping_exiftool"
+    path.write_text("#!/bin/sh\nexec sleep 30\n")
+    os.chmod(path, 0o755)
+    monkeypatch.setattr(exiftool, "get_executable_args", lambda: [str(path)])
+
+
+def test_renames_directories_concurrently(exiftool, tmp_path):
+    directories = make_directories(tmp_path, 3)
+
+    async def rename():
+        engine = asyncrename.AsyncRenameEngine(exiftool, max_jobs=2)
+        jobs = [engine.submit(str(directory), "X_", ["*.jpg"], True)
+                for directory in directories]
+        lines = [line async for stream, line in jobs[0].iter_output()]
+        await engine.wait(jobs)
+        return jobs, lines
+
+    jobs, lines = asyncio.run(rename())
+
+    assert "    1 image files updated\n" in lines
+    for index, job in enumerate(jobs):
+        assert job.status == asyncrename.JOB_STATUS_DONE
+        assert [result.status for result in job.results] == [exiftoolwrap.RENAME_STATUS_RENAMED]
+        assert list_names(directories[index]) == ["X_2012-02-27_13h45m1%ds.jpg" % index]
+
+
+def test_timeout_and_cancel_stop_the_job_only(exiftool, tmp_path, monkeypatch):
+    directories = make_directories(tmp_path, 1)
+    use_sleeping_exiftool(exiftool, tmp_path, monkeypatch)
+
+    async def rename():
+        engine = asyncrename.AsyncRenameEngine(exiftool)
+        timed_out = engine.submit(str(directories[0]), "X_", ["*.jpg"], True, timeout=0.2)
+        cancelled = engine.submit(str(directories[0]), "X_", ["*.jpg"], True)
+        await asyncio.sleep(0.2)
+        cancelled.cancel()
+        await engine.wait([timed_out, cancelled])
+        return timed_out, cancelled
+
+    timed_out, cancelled = asyncio.run(asyncio.wait_for(rename(), 10))
+
+    assert timed_out.status == asyncrename.JOB_STATUS_TIMED_OUT
+    assert cancelled.status == asyncrename.JOB_STATUS_CANCELLED
+    assert timed_out.results == cancelled.results == []
+
+
+def test_missing_executable_fails_the_job(exiftool, tmp_path, monkeypatch):
+    directories = make_directories(tmp_path, 1)
+    monkeypatch.setattr(exiftool, "get_executable_args", lambda: [str(tmp_path / "missing")])
+
+    async def rename():
+        engine = asyncrename.AsyncRenameEngine(exiftool)
+        job = engine.submit(str(directories[0]), "X_", ["*.jpg"], True)
+        await job.wait()
+        return job
+
+    job = asyncio.run(rename())
+
+    assert job.status == asyncrename.JOB_STATUS_FAILED
+    assert job.error
+    assert list_names(directories[0]) == ["IMG_0001.jpg"]
+
+
+def test_empty_type_selection_fails_the_job(exiftool, tmp_path):
+    directories = make_directories(tmp_path, 1)
+
+    async def rename():
+        engine = asyncrename.AsyncRenameEngine(exiftool)
+        job = engine.submit(str(directories[0]), "X_", " ; ", True)
+        await job.wait()
+        return job
+
+    job = asyncio.run(rename())
+
+    assert job.status == asyncrename.JOB_STATUS_FAILED
+    assert job.error == "No file types selected"
+    assert list_names(directories[0]) == ["IMG_0001.jpg"]
+
+
+def test_output_isnt_kept_for_later_consumers(exiftool, tmp_path):
+    directories = make_directories(tmp_path, 1)
+
+    async def rename():
+        engine = asyncrename.AsyncRenameEngine(exiftool)
+        job = engine.submit(str(directories[0]), "X_", ["*.jpg"], True)
+        await job.wait()
+        # Nothing read the output while the job ran
+        lines = [line async for stream, line in job.iter_output()]
+        return job, lines
+
+    job, lines = asyncio.run(asyncio.wait_for(rename(), 10))
+
+    assert lines == []
+    assert [result.status for result in job.results] == [exiftoolwrap.RENAME_STATUS_RENAMED]
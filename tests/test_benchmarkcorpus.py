@@ -0,0 +1,38 @@
+"""Synthetic corpus of the benchmarks."""
+
+# Public
+import os
+
+# Internal
+import benchmarkcorpus
+import dirscan
+import exifreader
+
+
+def list_tree(path):
+    return sorted(os.path.relpath(file, path)
+                  for file in dirscan.scan_files(str(path), recursive=True))
+
+
+def test_corpus_is_reproducible(tmp_path):
+    counts = benchmarkcorpus.generate_corpus(str(tmp_path / "a"), 50, depth=1,
+                                             files_per_directory=20)
+    benchmarkcorpus.generate_corpus(str(tmp_path / "b"), 50, depth=1, files_per_directory=20)
+
+    assert sum(counts.values()) == 50
+    assert list_tree(tmp_path / "a") == list_tree(tmp_path / "b")
+    for relative_path in list_tree(tmp_path / "a"):
+        assert ((tmp_path / "a" / relative_path).read_bytes()
+                == (tmp_path / "b" / relative_path).read_bytes())
+
+
+def test_photos_have_their_date(tmp_path):
+    for byte_order in ("II", "MM"):
+        (tmp_path / "a.jpg").write_bytes(
+            benchmarkcorpus.make_jpeg(1330350312, "37", byte_order))
+        (tmp_path / "a.cr2").write_bytes(benchmarkcorpus.make_tiff(1330350312, None, byte_order))
+
+        assert exifreader.read_date_time_original(str(tmp_path / "a.jpg")) == {
+            "DateTimeOriginal": "2012:02:27 13:45:12", "SubSecTimeOriginal": "37"}
+        assert exifreader.read_date_time_original(str(tmp_path / "a.cr2")) == {
+            "DateTimeOriginal": "2012:02:27 13:45:12"}
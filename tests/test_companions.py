@@ -0,0 +1,32 @@
+"""Grouping of companion files."""
+
+# Public
+import os.path
+
+# Internal
+import companions
+
+
+def test_groups_by_directory_and_name():
+    files = [os.path.join("d", name) for name in
+             ("IMG_0001.JPG", "IMG_0002.JPG", "IMG_0001.xmp", "IMG_0001.CR2",
+              "IMG_0001.CR2.xmp")]
+    files.append(os.path.join("e", "IMG_0001.JPG"))
+
+    groups = companions.group_companions(files)
+
+    assert groups == [
+        [os.path.join("d", "IMG_0001.CR2"), os.path.join("d", "IMG_0001.JPG"),
+         os.path.join("d", "IMG_0001.xmp"), os.path.join("d", "IMG_0001.CR2.xmp")],
+        [os.path.join("d", "IMG_0002.JPG")],
+        [os.path.join("e", "IMG_0001.JPG")]]
+
+
+def test_lone_sidecar_is_its_own_group():
+    assert companions.group_companions(["IMG_0003.xmp"]) == [["IMG_0003.xmp"]]
+
+
+def test_get_extensions_keeps_what_follows_the_shared_name():
+    group = ["IMG_0001.CR2", "IMG_0001.JPG", "IMG_0001.CR2.xmp"]
+
+    assert companions.get_extensions(group) == [".CR2", ".JPG", ".CR2.xmp"]
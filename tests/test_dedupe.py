@@ -0,0 +1,38 @@
+"""Detection of identical files."""
+
+# Public
+import os
+
+# Internal
+import dedupe
+from media import write_file
+
+
+def test_find_duplicates_groups_identical_files(tmp_path):
+    first = str(write_file(tmp_path / "a.jpg", b"x" * 100000))
+    copy = str(write_file(tmp_path / "b.jpg", b"x" * 100000))
+    # Same size, same start and end, different middle
+    write_file(tmp_path / "c.jpg", b"x" * 50000 + b"y" + b"x" * 49999)
+    write_file(tmp_path / "d.jpg", b"")
+    write_file(tmp_path / "e.jpg", b"")
+    files = [str(tmp_path / name) for name in ("a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg")]
+
+    assert dedupe.find_duplicates(files, workers=2) == [[first, copy]]
+
+
+def test_hard_links_are_duplicates(tmp_path):
+    first = str(write_file(tmp_path / "a.jpg", b"data"))
+    link = str(tmp_path / "b.jpg")
+    os.link(first, link)
+
+    assert dedupe.find_duplicates([first, link]) == [[first, link]]
+
+
+def test_link_duplicate_replaces_the_copy(tmp_path):
+    first = str(write_file(tmp_path / "a.jpg", b"data"))
+    copy = str(write_file(tmp_path / "b.jpg", b"data"))
+
+    dedupe.link_duplicate(first, copy)
+
+    assert os.path.samefile(first, copy)
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg"]
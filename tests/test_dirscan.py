@@ -0,0 +1,60 @@
+"""Streaming directory scans and chunked renames."""
+
+# Public
+import os
+
+# Internal
+import dirscan
+from media import list_names, write_file, write_jpeg
+
+
+def make_tree(path):
+    for relative_path in ("b.jpg", "a.JPG", "c.txt", ".hidden.jpg",
+                          "2012/x.jpg", "2012/.thumbnails/t.jpg", "2013/y.cr2",
+                          ".git/z.jpg"):
+        (path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        write_file(path / relative_path)
+
+
+def scan(path, *args, **kwargs):
+    return [os.path.relpath(file, path).replace(os.sep, "/")
+            for file in dirscan.scan_files(str(path), *args, **kwargs)]
+
+
+def test_scan_yields_the_files_of_a_directory_before_its_sub_directories(tmp_path):
+    make_tree(tmp_path)
+
+    assert scan(tmp_path) == ["a.JPG", "b.jpg", "c.txt"]
+    assert scan(tmp_path, "*.jpg;*.cr2", recursive=True) == [
+        "a.JPG", "b.jpg", "2012/x.jpg", "2013/y.cr2"]
+
+
+def test_scan_include_and_exclude(tmp_path):
+    make_tree(tmp_path)
+
+    assert scan(tmp_path, recursive=True, exclude=["2012"]) == [
+        "a.JPG", "b.jpg", "c.txt", "2013/y.cr2"]
+    assert scan(tmp_path, recursive=True, include=["2012/*", "*.txt"]) == [
+        "c.txt", "2012/x.jpg"]
+
+
+def test_parse_file_types():
+    assert dirscan.parse_file_types("*.JPG; .cr2;IMG_*.mov") == ({"jpg", "cr2"}, ["IMG_*.mov"])
+    assert dirscan.parse_file_types(["*.*"]) == ({"*"}, [])
+
+
+def test_iter_chunks():
+    assert list(dirscan.iter_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_chunks_get_the_copy_numbers_of_a_single_command(exiftool, tmp_path):
+    for name in ("1.jpg", "2.jpg", "3.jpg"):
+        write_jpeg(tmp_path / name, "2012:02:27 13:45:12")
+
+    results = list(exiftool.rename_file_list(
+        dirscan.scan_files(str(tmp_path)), "", True, chunk_size=1))
+
+    assert len(results) == 3
+    assert list_names(tmp_path) == ["2012-02-27_13h45m12s-1.jpg",
+                                    "2012-02-27_13h45m12s-2.jpg",
+                                    "2012-02-27_13h45m12s.jpg"]
@@ -0,0 +1,48 @@
+"""Native EXIF reads and their exiftool fallback."""
+
+# Internal
+import exifreader
+from media import make_tiff_data, write_exif_jpeg, write_file, write_jpeg, write_tiff
+
+
+def test_reads_jpeg_dates(tmp_path):
+    photo = write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12", sub_sec="37")
+
+    assert exifreader.read_date_time_original(str(photo)) == {
+        "DateTimeOriginal": "2012:02:27 13:45:12", "SubSecTimeOriginal": "37"}
+
+
+def test_reads_both_tiff_byte_orders(tmp_path):
+    for byte_order in ("II", "MM"):
+        raw = write_tiff(tmp_path / "IMG_0001.CR2", "2012:02:27 13:45:12", byte_order)
+
+        assert exifreader.read_date_time_original(str(raw)) == {
+            "DateTimeOriginal": "2012:02:27 13:45:12"}
+
+
+def test_leaves_other_files_to_exiftool(tmp_path):
+    other = write_file(tmp_path / "notes.txt")
+    truncated = write_file(tmp_path / "cut.jpg", b"\xff\xd8\xff")
+    cut_tiff = write_file(tmp_path / "cut.CR2", make_tiff_data(
+        {"DateTimeOriginal": "2012:02:27 13:45:12"})[:30])
+    unset = write_tiff(tmp_path / "unset.CR2", "0000:00:00 00:00:00")
+
+    for file in (other, truncated, cut_tiff, unset, tmp_path / "missing.jpg"):
+        assert exifreader.read_date_time_original(str(file)) == None
+
+
+def test_exiftool_reads_what_exifreader_cant(exiftool, tmp_path):
+    photo = str(write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12"))
+    other = str(write_file(tmp_path / "notes.txt"))
+
+    tags = exiftool.read_date_time_original([photo, other], workers=1)
+
+    assert tags[photo] == {"DateTimeOriginal": "2012:02:27 13:45:12"}
+    assert tags[other] == {}
+
+
+def test_read_date_tags_reads_the_create_date_of_scans(tmp_path):
+    scan = write_exif_jpeg(tmp_path / "scan.jpg", {"CreateDate": "2013:05:01 10:20:30"})
+
+    assert exifreader.read_date_time_original(str(scan)) == None
+    assert exifreader.read_date_tags(str(scan)) == {"CreateDate": "2013:05:01 10:20:30"}
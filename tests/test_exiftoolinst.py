@@ -0,0 +1,62 @@
+"""Installing exiftool from a local installer archive."""
+
+# Public
+import hashlib
+import os
+import zipfile
+
+# Internal
+import exiftoolinst
+
+
+def write_installer(path):
+    with zipfile.ZipFile(path, "w") as installer_zip:
+        installer_zip.writestr("exiftool-12.40/exiftool(-k).exe", b"exe")
+        installer_zip.writestr("exiftool-12.40/exiftool_files/perl.dll", b"dll")
+        installer_zip.writestr("exiftool-12.40/README", b"readme")
+    with open(path, "rb") as file:
+        return ("sha256", hashlib.sha256(file.read()).hexdigest())
+
+
+def test_install_from_file_url(tmp_path):
+    installer_path = tmp_path / "exiftool-12.40.zip"
+    checksum = write_installer(installer_path)
+    install_path = str(tmp_path / "install")
+
+    ret = exiftoolinst.install_exiftool_from_url(installer_path.as_uri(), install_path, checksum)
+
+    assert ret == (True, os.path.join(install_path, "exiftool.exe"))
+    assert open(ret[1], "rb").read() == b"exe"
+    assert os.path.exists(os.path.join(install_path, "exiftool_files", "perl.dll"))
+    assert not os.path.exists(os.path.join(install_path, "README"))
+
+    # Over a previous installation, from the downloaded archive
+    os.remove(installer_path)
+    assert exiftoolinst.install_exiftool_from_url(
+        installer_path.as_uri(), install_path, checksum) == ret
+
+
+def test_install_rejects_a_wrong_checksum(tmp_path):
+    installer_path = tmp_path / "exiftool-12.40.zip"
+    write_installer(installer_path)
+    install_path = str(tmp_path / "install")
+
+    ret = exiftoolinst.install_exiftool_from_url(
+        installer_path.as_uri(), install_path, ("sha256", "0" * 64))
+
+    assert ret == (False, None)
+    assert not os.path.exists(os.path.join(install_path, "exiftool.exe"))
+
+
+def test_install_checks_the_published_checksum(tmp_path):
+    installer_path = tmp_path / "exiftool-12.40.zip"
+    algorithm, digest = write_installer(installer_path)
+    checksums_path = tmp_path / "checksums.txt"
+
+    checksums_path.write_text("SHA256(exiftool-12.40.zip)= " + "0" * 64 + "\n")
+    assert exiftoolinst.install_exiftool_from_url(
+        str(installer_path), str(tmp_path / "install")) == (False, None)
+
+    checksums_path.write_text("SHA256(exiftool-12.40.zip)= " + digest + "\n")
+    assert exiftoolinst.install_exiftool_from_url(
+        str(installer_path), str(tmp_path / "install"))[0]
@@ -0,0 +1,284 @@
+"""ExiftoolWrap, with exiftoolfake.py standing in for exiftool."""
+
+# Public
+import os
+import shutil
+import sys
+
+import pytest
+
+# Internal
+import exiftoolwrap
+import metacache
+from conftest import EXIFTOOL_FAKE_PATH
+from media import list_names, write_exif_jpeg, write_file, write_jpeg, write_tiff
+
+
+CHAIN = ["DateTimeOriginal", "CreateDate", "FileModifyDate"]
+
+
+def write_launcher(path, command):
+    """Writes an executable shell script running command, padded so that
+    other commands give a file of the same size.
+
+    """
+
+    path.write_text(("#!/bin/sh\n" + command + "\n").ljust(1000))
+    os.chmod(path, 0o755)
+    return path
+
+
+def test_installation_info_is_trusted_until_the_file_changes(tmp_path):
+    launcher = write_launcher(tmp_path / "exiftool",
+                              'exec "%s" "%s" "$@"' % (sys.executable, EXIFTOOL_FAKE_PATH))
+    exiftool = exiftoolwrap.ExiftoolWrap(str(tmp_path / "none"),
+                                         installation_info={"path": str(launcher)})
+    installation_info = exiftool.get_installation_info()
+    exiftool.close()
+    assert installation_info["version"] == "12.40"
+
+    # Same size and mtime: trusted without being run
+    stat = os.stat(launcher)
+    write_launcher(launcher, "exit 1")
+    os.utime(launcher, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    exiftool = exiftoolwrap.ExiftoolWrap(str(tmp_path / "none"), installation_info)
+    try:
+        assert exiftool.is_installed()
+        assert exiftool.get_version() == "12.40"
+        assert not exiftool.verify_installation()
+    finally:
+        exiftool.close()
+
+    # Changed: validated again
+    os.utime(launcher, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    exiftool = exiftoolwrap.ExiftoolWrap(str(tmp_path / "none"), installation_info)
+    assert not exiftool.is_installed()
+
+
+def test_iter_file_rename_reports_the_progress(exiftool, tmp_path):
+    photo = str(write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12"))
+    other = str(write_file(tmp_path / "notes.txt"))
+
+    events = list(exiftool.iter_file_rename(str(tmp_path), "X_", ["*.*"], True))
+
+    assert events[0] == exiftoolwrap.RenameProgress(photo, 1, 2)
+    assert events[1] == exiftoolwrap.RenameResult(
+        photo, str(tmp_path / "X_2012-02-27_13h45m12s.jpg"),
+        exiftoolwrap.RENAME_STATUS_RENAMED, "")
+    assert events[2] == exiftoolwrap.RenameProgress(other, 2, 2)
+    assert [(event.file, event.status) for event in events[3:]] == [
+        (other, exiftoolwrap.RENAME_STATUS_WARNING)]
+
+
+def test_make_command_moves_long_argument_lists_to_a_file(tmp_path):
+    argv, argfile_path = exiftoolwrap.make_command(["exiftool"], ["-ver"])
+
+    assert argv == ["exiftool"] + exiftoolwrap.CHARSET_ARGS + ["-ver"]
+    assert argfile_path == None
+
+    files = [str(tmp_path / ("IMG_%05d.jpg" % i)) for i in range(1000)]
+    argv, argfile_path = exiftoolwrap.make_command(["exiftool"], files)
+    try:
+        # The charset must come before the file names it decodes
+        assert argv == ["exiftool"] + exiftoolwrap.CHARSET_ARGS + ["-@", argfile_path]
+        assert open(argfile_path, encoding="utf-8").read().splitlines() == files
+    finally:
+        os.remove(argfile_path)
+
+
+def test_perl_script_without_execute_permission_runs_through_perl(tmp_path):
+    script = tmp_path / "exiftool"
+    script.write_text("#!/usr/bin/perl\n")
+
+    assert exiftoolwrap.make_executable_args(str(script)) == ["perl", str(script)]
+    assert exiftoolwrap.make_executable_args("exiftool.pl") == ["perl", "exiftool.pl"]
+    os.chmod(script, 0o755)
+    assert exiftoolwrap.make_executable_args(str(script)) == [str(script)]
+
+
+def test_companions_are_renamed_together(exiftool, tmp_path):
+    write_tiff(tmp_path / "IMG_0001.CR2", "2012:02:27 13:45:12")
+    write_file(tmp_path / "IMG_0001.JPG")
+    write_file(tmp_path / "IMG_0001.xmp")
+    write_file(tmp_path / "IMG_0001.CR2.xmp")
+    write_jpeg(tmp_path / "IMG_0002.JPG", "2012:02:27 13:45:12")
+    files = [str(tmp_path / name) for name in list_names(tmp_path)]
+
+    results = exiftool.rename_file_list_in_parallel(
+        files, "", True, workers=1, group_companions=True)
+
+    assert all(result.status == exiftoolwrap.RENAME_STATUS_RENAMED for result in results)
+    names = list_names(tmp_path)
+    assert "2012-02-27_13h45m12s.CR2" in names
+    assert "2012-02-27_13h45m12s.CR2.xmp" in names
+    assert "2012-02-27_13h45m12s.xmp" in names
+    # The JPG of the group took the name, the other JPG gets a copy number
+    assert "2012-02-27_13h45m12s.JPG" in names
+    assert "2012-02-27_13h45m12s-1.JPG" in names
+
+
+def test_date_chain_falls_back_and_reports_the_source_tag(exiftool, tmp_path):
+    photo = write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    scan = write_exif_jpeg(tmp_path / "scan.jpg", {"CreateDate": "2013:05:01 10:20:30"})
+    other = write_file(tmp_path / "scan.bin", modify_date="2014:07:14 09:00:00")
+    exiftool.set_date_tags(CHAIN)
+
+    results = exiftool.rename_file_list_in_parallel(
+        [str(photo), str(scan), str(other)], "", True, workers=1)
+
+    assert list_names(tmp_path) == ["2012-02-27_13h45m12s.jpg",
+                                    "2013-05-01_10h20m30s.jpg",
+                                    "2014-07-14_09h00m00s.bin"]
+    messages = dict((result.file, result.message) for result in results)
+    assert messages == {str(photo): "from DateTimeOriginal",
+                        str(scan): "from CreateDate",
+                        str(other): "from FileModifyDate"}
+
+
+def test_date_chain_single_command_matches_planned_renames(exiftool, tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    write_jpeg(source / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_jpeg(source / "IMG_0002.jpg", "2012:02:27 13:45:12")
+    write_exif_jpeg(source / "scan.jpg", {"CreateDate": "2012:02:27 13:45:12"})
+    write_file(source / "scan.bin", modify_date="2012:02:27 13:45:12")
+    command_path = tmp_path / "command"
+    planned_path = tmp_path / "planned"
+    shutil.copytree(source, command_path)
+    shutil.copytree(source, planned_path)
+    exiftool.set_date_tags(CHAIN)
+
+    exiftool.rename_files(str(command_path), "X_", ["*.*"], True)
+    exiftool.rename_files_in_parallel(str(planned_path), "X_", ["*.*"], True, workers=2)
+
+    assert list_names(command_path) == list_names(planned_path)
+    assert len(set(list_names(planned_path))) == 4
+
+
+def test_set_date_tags_rejects_invalid_names(exiftool):
+    with pytest.raises(ValueError):
+        exiftool.set_date_tags(["DateTimeOriginal", "${Evil}"])
+    with pytest.raises(ValueError):
+        exiftool.set_date_tags(["Date Time"])
+
+    exiftool.set_date_tags([])
+    assert exiftool.get_date_tags() == exiftoolwrap.ExiftoolWrap.DEFAULT_DATE_TAGS
+
+
+def test_read_date_tags_reads_stale_cache_entries_again(exiftool, tmp_path):
+    scan = str(write_file(tmp_path / "scan.bin", modify_date="2014:07:14 09:00:00"))
+    cache = metacache.MetadataCache(str(tmp_path / "metadata.db"))
+    try:
+        exiftool.read_date_tags([scan], workers=1, cache=cache)
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        # Cached for DateTimeOriginal only, FileModifyDate wasn't looked for
+        exiftool.set_date_tags(["DateTimeOriginal", "FileModifyDate"])
+        tags = exiftool.read_date_tags([scan], workers=1, cache=cache)
+        assert tags[scan]["FileModifyDate"].startswith("2014:07:14 09:00:00")
+        assert (cache.hits, cache.misses) == (0, 2)
+
+        exiftool.read_date_tags([scan], workers=1, cache=cache)
+        assert (cache.hits, cache.misses) == (1, 2)
+    finally:
+        cache.close()
+
+
+def test_rename_files_only_renames_the_selected_types(exiftool, tmp_path):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_file(tmp_path / "notes.txt")
+
+    exiftool.rename_files(str(tmp_path), "X_", ["*.txt"], False)
+
+    assert list_names(tmp_path) == ["IMG_0001.jpg", "X_.txt"]
+
+
+@pytest.mark.parametrize("file_types", [";", "", " ; ", [" ", ""], []])
+def test_empty_type_selection_renames_nothing(exiftool, tmp_path, file_types):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_file(tmp_path / "a.txt")
+
+    assert exiftool.get_rename_args(str(tmp_path), "X", file_types, False) == None
+    assert exiftool.launch_file_rename(str(tmp_path), "X", file_types, False) == None
+    assert exiftool.rename_files(str(tmp_path), "X", file_types, False) == []
+    assert list(exiftool.iter_file_rename(str(tmp_path), "X", file_types, False)) == []
+    assert list_names(tmp_path) == ["IMG_0001.jpg", "a.txt"]
+
+
+def test_rename_output_parser_takes_one_line_at_a_time(exiftool, tmp_path):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    command_line, command = exiftool.launch_file_rename(str(tmp_path), "X_", ["*.*"], True)
+    parser = exiftoolwrap.RenameOutputParser()
+
+    events = [parser.parse_line(line) for stream, line in command.iter_output()]
+
+    assert [event for event in events if isinstance(event, exiftoolwrap.RenameResult)] == [
+        exiftoolwrap.RenameResult(str(tmp_path / "IMG_0001.jpg"),
+                                  str(tmp_path / "X_2012-02-27_13h45m12s.jpg"),
+                                  exiftoolwrap.RENAME_STATUS_RENAMED, "")]
+
+
+def test_planned_rename_command_output_parses_back(exiftool, tmp_path):
+    photo = write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    other = write_file(tmp_path / "notes.txt")
+    exiftool.set_date_tags(["DateTimeOriginal", "CreateDate"])
+
+    description, command = exiftool.launch_file_list_rename(
+        [str(photo), str(other)], "", True, workers=1)
+    lines = [line for stream, line in command.iter_output()]
+    results = exiftoolwrap.parse_rename_output(lines)
+
+    assert "2 files" in description
+    assert [(result.status, result.message) for result in results] == [
+        (exiftoolwrap.RENAME_STATUS_WARNING, "[minor] Tag 'DateTimeOriginal', 'CreateDate' not defined"),
+        (exiftoolwrap.RENAME_STATUS_RENAMED, "from DateTimeOriginal")]
+    assert list_names(tmp_path) == ["2012-02-27_13h45m12s.jpg", "notes.txt"]
+
+
+def test_rename_files_through_the_session(exiftool, tmp_path):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_jpeg(tmp_path / "IMG_0002.jpg", "2012:02:27 13:45:12")
+    write_jpeg(tmp_path / "IMG_0003.jpg", "2012:02:28 08:00:00")
+    write_file(tmp_path / "notes.txt")
+
+    results = exiftool.rename_files(str(tmp_path), "X_", "*.jpg;*.txt", True)
+
+    assert list_names(tmp_path) == ["X_2012-02-27_13h45m12s-1.jpg",
+                                    "X_2012-02-27_13h45m12s.jpg",
+                                    "X_2012-02-28_08h00m00s.jpg",
+                                    "notes.txt"]
+    statuses = dict((result.file, result.status) for result in results)
+    assert statuses[str(tmp_path / "notes.txt")] == exiftoolwrap.RENAME_STATUS_WARNING
+    assert statuses[str(tmp_path / "IMG_0001.jpg")] == exiftoolwrap.RENAME_STATUS_RENAMED
+
+
+def test_session_is_restarted_after_its_process_ended():
+    session = exiftoolwrap.ExiftoolSession(exiftoolwrap.make_executable_args(EXIFTOOL_FAKE_PATH))
+    try:
+        assert session.execute(["-ver"]) == ("12.40\n", "")
+
+        session.terminate()
+        assert not session.is_running()
+        assert session.execute(["-ver"]) == ("12.40\n", "")
+        assert session.is_running()
+    finally:
+        session.close()
+    assert not session.is_running()
+
+
+@pytest.mark.parametrize("tags, speed_arg", [(["DateTimeOriginal"], "-fast2"),
+                                             (CHAIN, "-fast"),
+                                             (["TrackCreateDate"], "-fast")])
+def test_quicktime_dates_are_read_past_the_media_data(exiftool, tmp_path, monkeypatch,
+                                                      tags, speed_arg):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    commands = []
+    read_shard_tags = exiftool._read_shard_tags
+    def record_args(session, args, files):
+        commands.append(args)
+        return read_shard_tags(session, args, files)
+    monkeypatch.setattr(exiftool, "_read_shard_tags", record_args)
+
+    exiftool.read_tags([str(tmp_path / "IMG_0001.jpg")], tags, workers=1)
+
+    assert commands == [["-j", speed_arg] + ["-" + tag for tag in tags]]
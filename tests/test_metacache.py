@@ -0,0 +1,62 @@
+"""Persistent metadata cache."""
+
+# Public
+import os
+
+# Internal
+import metacache
+from media import list_names, write_file, write_jpeg
+
+
+def test_entries_survive_a_rename_but_not_a_change(tmp_path):
+    file = str(write_file(tmp_path / "a.jpg"))
+    with metacache.MetadataCache(str(tmp_path / "metadata.db")) as cache:
+        assert cache.get_many([file]) == ({}, [file])
+        cache.put_many({file: {"DateTimeOriginal": "2012:02:27 13:45:12"}})
+
+    renamed = str(tmp_path / "b.jpg")
+    os.rename(file, renamed)
+    with metacache.MetadataCache(str(tmp_path / "metadata.db")) as cache:
+        assert cache.get_many([renamed]) == (
+            {renamed: {"DateTimeOriginal": "2012:02:27 13:45:12"}}, [])
+
+        write_file(tmp_path / "b.jpg", b"changed")
+        assert cache.get_many([renamed]) == ({}, [renamed])
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_errors_arent_cached(tmp_path):
+    file = str(write_file(tmp_path / "a.jpg"))
+    with metacache.MetadataCache(str(tmp_path / "metadata.db")) as cache:
+        cache.get_many([file])
+        cache.put_many({file: {"Error": "File format error"}})
+
+        assert cache.get_many([file]) == ({}, [file])
+
+
+def test_evict_removes_old_entries(tmp_path):
+    file = str(write_file(tmp_path / "a.jpg"))
+    with metacache.MetadataCache(str(tmp_path / "metadata.db"), max_age_days=-1) as cache:
+        cache.put_many({file: {}})
+        cache.evict()
+
+        assert cache.get_many([file]) == ({}, [file])
+
+
+def test_parallel_rename_reads_cached_files_once(exiftool, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_file(media_path / "notes.txt")
+
+    with metacache.MetadataCache(str(tmp_path / "metadata.db")) as cache:
+        exiftool.rename_files_in_parallel(str(media_path), "", ["*.*"], True,
+                                          workers=1, cache=cache)
+        assert (cache.hits, cache.misses) == (0, 2)
+
+        exiftool.rename_files_in_parallel(str(media_path), "X_", ["*.*"], True,
+                                          workers=1, cache=cache)
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    # Files without a date are cached too
+    assert list_names(media_path) == ["X_2012-02-27_13h45m12s.jpg", "notes.txt"]
@@ -0,0 +1,55 @@
+"""Ring buffer, error index and spill file of OutputLog."""
+
+# Internal
+import outputlog
+
+
+def test_keeps_the_last_lines_with_their_numbers():
+    log = outputlog.OutputLog(max_lines=3)
+
+    log.append_text("a\nb\nc\nd\n")
+    log.append_text("e\n")
+
+    assert log.get_line_range() == (2, 5)
+    assert log.get_lines(0, 2) == ["c", "d"]
+    assert log.get_lines(3, 10) == ["d", "e"]
+
+
+def test_partial_line_is_completed_by_the_next_append():
+    log = outputlog.OutputLog()
+
+    log.append_text("first\r\nsec")
+    assert log.get_line_range() == (0, 1)
+    log.append_text("ond\n")
+
+    assert log.get_lines(0, 2) == ["first", "second"]
+
+
+def test_error_index():
+    log = outputlog.OutputLog(max_lines=5)
+    log.append_text("ok\nError: a\nok\nWarning: b\nok\n")
+
+    assert log.get_error_count() == 2
+    assert log.find_next_error(0) == 1
+    assert log.find_next_error(1) == 3
+    assert log.find_next_error(3) == None
+    assert log.find_previous_error(4) == 3
+    assert log.find_previous_error(1) == None
+
+    # Line 1 falls out of the buffer
+    log.append_text("ok\nok\n")
+    assert log.get_error_count() == 1
+    assert log.find_previous_error(3) == None
+
+
+def test_spill_file_keeps_everything(tmp_path):
+    spill_path = str(tmp_path / "logs" / "output.log")
+    (tmp_path / "logs").mkdir()
+    (tmp_path / "logs" / "output.log").write_text("previous run\n")
+    log = outputlog.OutputLog(max_lines=2, spill_path=spill_path)
+
+    log.append_text("a\nb\nc\n")
+    log.close()
+
+    assert open(spill_path).read() == "a\nb\nc\n"
+    assert open(spill_path + ".1").read() == "previous run\n"
@@ -0,0 +1,193 @@
+"""Command line runs, with the application data in tmp_path."""
+
+# Public
+import subprocess
+import sys
+
+import pytest
+
+# Internal
+import dedupe
+import exiftoolwrap
+import photorenamecli
+import photorenamecore
+from conftest import EXIFTOOL_FAKE_PATH, ROOT_PATH
+from media import list_names, write_file, write_jpeg
+
+
+def run(appdata, *argv):
+    """Runs the command line with the default settings and exiftoolfake.py.
+    return: the exit code
+
+    """
+
+    config_path = str(appdata / "missing.ini")
+    return photorenamecli.main(list(argv) + ["--exiftool", EXIFTOOL_FAKE_PATH,
+                                             "--config", config_path, "-q"])
+
+
+def test_rename_with_the_given_settings(appdata, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_jpeg(media_path / "notes.txt", "2012:02:27 13:45:12")
+
+    assert run(appdata, str(media_path), "--types", "*.jpg", "--prefix", "X_",
+               "--date-time") == 0
+
+    assert list_names(media_path) == ["X_2012-02-27_13h45m12s.jpg", "notes.txt"]
+
+
+def test_missing_medias_location_is_an_error(appdata):
+    assert run(appdata, "--all-types") == 2
+
+
+def test_rename_api(exiftool, tmp_path):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    input_info = {"InputMediaDirectory": str(tmp_path), "InputAllFileTypes": "1"}
+    output_info = {"OutputFileNamePrefix": "X_"}
+
+    results = photorenamecore.rename(exiftool, input_info, output_info)
+
+    assert [result.status for result in results] == [exiftoolwrap.RENAME_STATUS_RENAMED]
+    assert list_names(tmp_path) == ["X_2012-02-27_13h45m12s.jpg"]
+
+
+def test_command_line_doesnt_load_tkinter():
+    loaded = subprocess.check_output(
+        [sys.executable, "-c", "import sys, photorenamecli; print('tkinter' in sys.modules)"],
+        cwd=ROOT_PATH, text=True)
+
+    assert loaded.strip() == "False"
+
+
+def test_command_line_doesnt_load_dedupe():
+    loaded = subprocess.check_output(
+        [sys.executable, "-c", "import sys, photorenamecli; print('dedupe' in sys.modules)"],
+        cwd=ROOT_PATH, text=True)
+
+    assert loaded.strip() == "False"
+
+
+@pytest.mark.parametrize("action", dedupe.ACTIONS)
+def test_every_dedupe_action_is_accepted(tmp_path, action):
+    assert photorenamecli._parse_args([str(tmp_path), "--dedupe", action]).dedupe == action
+
+
+def test_several_directories_are_renamed_concurrently(appdata, tmp_path):
+    directories = []
+    for name in ("card1", "card2"):
+        directory = tmp_path / name
+        directory.mkdir()
+        write_jpeg(directory / "IMG_0001.jpg", "2012:02:27 13:45:12")
+        directories.append(str(directory))
+
+    assert run(appdata, *directories, "--all-types", "--date-time", "--jobs", "2") == 0
+
+    for directory in directories:
+        assert list_names(directory) == ["2012-02-27_13h45m12s.jpg"]
+
+
+def test_rename_then_undo(appdata, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+
+    assert run(appdata, str(media_path), "--types", "*.jpg", "--prefix", "X_",
+               "--date-time") == 0
+    assert list_names(media_path) == ["X_2012-02-27_13h45m12s.jpg"]
+
+    assert photorenamecli.main(["--undo", "-q"]) == 0
+    assert list_names(media_path) == ["IMG_0001.jpg"]
+
+
+def test_dedupe_skip_leaves_the_copies_alone(appdata, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_jpeg(media_path / "IMG_0002.jpg", "2012:02:27 13:45:12")
+
+    assert run(appdata, str(media_path), "--all-types", "--date-time", "--dedupe", "skip") == 0
+
+    assert list_names(media_path) == ["2012-02-27_13h45m12s.jpg", "IMG_0002.jpg"]
+
+
+def test_date_tags_chain(appdata, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_file(media_path / "notes.txt", modify_date="2014:07:14 09:00:00")
+
+    assert run(appdata, str(media_path), "--all-types", "--date-time",
+               "--date-tags", "DateTimeOriginal;FileModifyDate") == 0
+
+    assert list_names(media_path) == ["2012-02-27_13h45m12s.jpg", "2014-07-14_09h00m00s.txt"]
+
+
+def test_empty_type_selection_is_an_error(appdata, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+
+    assert run(appdata, str(media_path), "--types", ";", "--date-time") == 2
+    assert list_names(media_path) == ["IMG_0001.jpg"]
+
+
+@pytest.mark.parametrize("mode_args", [[], ["--queue"], ["--jobs", "2"]])
+def test_companions_are_grouped_in_every_mode(appdata, tmp_path, mode_args):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_file(media_path / "IMG_0001.xmp")
+    directories = [str(media_path)]
+    if "--jobs" in mode_args:
+        # Several directories
+        directories.append(str(tmp_path / "empty"))
+        (tmp_path / "empty").mkdir()
+
+    assert run(appdata, *directories, "--all-types", "--date-time",
+               "--group-companions", *mode_args) == 0
+
+    assert list_names(media_path) == ["2012-02-27_13h45m12s.jpg", "2012-02-27_13h45m12s.xmp"]
+
+
+def test_launch_rename_groups_companions(exiftool, tmp_path):
+    write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_file(tmp_path / "IMG_0001.xmp")
+    input_info = {"InputMediaDirectory": str(tmp_path), "InputAllFileTypes": "1"}
+    output_info = {"OutputFileNameGroupCompanions": "1"}
+
+    description, command = photorenamecore.launch_rename(exiftool, input_info, output_info)
+    command.communicate()
+
+    assert "companions grouped" in description
+    assert list_names(tmp_path) == ["2012-02-27_13h45m12s.jpg", "2012-02-27_13h45m12s.xmp"]
+
+
+def test_several_directories_report_the_source_tag(appdata, tmp_path, capsys):
+    directories = []
+    for name in ("card1", "card2"):
+        directory = tmp_path / name
+        directory.mkdir()
+        write_file(directory / "notes.txt", modify_date="2014:07:14 09:00:00")
+        directories.append(str(directory))
+
+    assert photorenamecli.main(directories + [
+        "--all-types", "--date-time", "--date-tags", "DateTimeOriginal;FileModifyDate",
+        "--exiftool", EXIFTOOL_FAKE_PATH, "--config", str(appdata / "missing.ini")]) == 0
+
+    assert capsys.readouterr().out.count("(from FileModifyDate)") == 2
+
+
+@pytest.mark.parametrize("mode_args, uses_cache", [
+    ([], False), (["-r"], False), (["--workers", "2"], True),
+    (["--group-companions"], True)])
+def test_metadata_cache_is_only_opened_when_used(appdata, tmp_path, mode_args, uses_cache):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+
+    assert run(appdata, str(media_path), "--all-types", "--date-time", *mode_args) == 0
+
+    assert list_names(media_path) == ["2012-02-27_13h45m12s.jpg"]
+    assert (appdata / "photorename" / "metadata.db").exists() == uses_cache
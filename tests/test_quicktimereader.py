@@ -0,0 +1,39 @@
+"""Native reads of the creation date of movies."""
+
+# Internal
+import quicktimereader
+from media import list_names, make_atom, write_file, write_jpeg, write_movie
+
+
+def test_reads_the_creation_date(tmp_path):
+    movie = write_movie(tmp_path / "MVI_0001.mov", "2013:05:01 10:20:30")
+
+    assert quicktimereader.read_date_tags(str(movie)) == {"CreateDate": "2013:05:01 10:20:30"}
+
+
+def test_movie_without_creation_time(tmp_path):
+    movie = write_movie(tmp_path / "MVI_0001.mov", None)
+
+    assert quicktimereader.read_date_tags(str(movie)) == {}
+
+
+def test_leaves_other_files_to_exiftool(tmp_path):
+    xmp_movie = write_movie(tmp_path / "MVI_0001.mov", "2013:05:01 10:20:30",
+                            [make_atom(b"uuid", b"\x00" * 16)])
+    photo = write_jpeg(tmp_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    truncated = write_file(tmp_path / "MVI_0002.mov",
+                           write_movie(tmp_path / "MVI_0002.mov", "2013:05:01 10:20:30")
+                           .read_bytes()[:-20])
+
+    for file in (xmp_movie, photo, truncated, tmp_path / "missing.mov"):
+        assert quicktimereader.read_date_tags(str(file)) == None
+
+
+def test_movies_are_named_from_their_create_date(exiftool, tmp_path):
+    movie = str(write_movie(tmp_path / "MVI_0001.mov", "2013:05:01 10:20:30"))
+    exiftool.set_date_tags(["DateTimeOriginal", "CreateDate"])
+
+    results = exiftool.rename_file_list_in_parallel([movie], "", True, workers=1)
+
+    assert [result.message for result in results] == ["from CreateDate"]
+    assert list_names(tmp_path) == ["2013-05-01_10h20m30s.mov"]
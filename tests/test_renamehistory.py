@@ -0,0 +1,51 @@
+"""Recording of the runs and their undo."""
+
+# Internal
+import exiftoolwrap
+import renamehistory
+from media import list_names, write_file, write_jpeg
+
+
+def test_undo_gives_the_names_back(exiftool, tmp_path):
+    media_path = tmp_path / "media"
+    media_path.mkdir()
+    write_jpeg(media_path / "IMG_0001.jpg", "2012:02:27 13:45:12")
+    write_jpeg(media_path / "IMG_0002.jpg", "2012:02:28 08:00:00")
+    history = renamehistory.RunHistory(str(tmp_path / "history"))
+
+    recorder = history.create_recorder("test")
+    for result in exiftool.rename_files(str(media_path), "X_", ["*.jpg"], True):
+        recorder.record(result)
+    recorder.close()
+    assert list_names(media_path) == ["X_2012-02-27_13h45m12s.jpg",
+                                      "X_2012-02-28_08h00m00s.jpg"]
+
+    results = history.undo()
+
+    assert all(result.status == exiftoolwrap.RENAME_STATUS_RENAMED for result in results)
+    assert list_names(media_path) == ["IMG_0001.jpg", "IMG_0002.jpg"]
+    # The undo is a run too
+    assert len(history.get_run_ids()) == 2
+
+
+def test_undo_leaves_changed_files_alone(tmp_path):
+    history = renamehistory.RunHistory(str(tmp_path / "history"))
+    file = write_file(tmp_path / "b.jpg", b"before")
+    recorder = history.create_recorder("test")
+    recorder.record(exiftoolwrap.RenameResult(
+        str(tmp_path / "a.jpg"), str(file), exiftoolwrap.RENAME_STATUS_RENAMED, ""))
+    recorder.close()
+    file.write_bytes(b"changed since")
+
+    results = history.undo()
+
+    assert [result.status for result in results] == [exiftoolwrap.RENAME_STATUS_ERROR]
+    assert list_names(tmp_path) == ["b.jpg", "history"]
+
+
+def test_run_renaming_nothing_is_not_kept(tmp_path):
+    history = renamehistory.RunHistory(str(tmp_path / "history"))
+    history.create_recorder("nothing").close()
+
+    assert history.get_run_ids() == []
+    assert history.undo() == None
@@ -0,0 +1,105 @@
+"""Resumable rename job queue and its journal."""
+
+# Public
+import os
+
+# Internal
+import exiftoolwrap
+import renamejobs
+from media import list_names, write_file, write_jpeg
+
+
+NAMES = ["2012-02-27_13h45m10s.jpg", "2012-02-27_13h45m11s.jpg", "2012-02-27_13h45m12s.jpg"]
+
+
+def make_card(path):
+    path.mkdir()
+    for index in range(3):
+        write_jpeg(path / ("IMG_000%d.jpg" % index), "2012:02:27 13:45:1%d" % index)
+    write_file(path / "notes.txt")
+    return path
+
+
+def interrupt_after_first_batch(queue, exiftool, monkeypatch):
+    """Runs queue until its first batch of renames is journaled, then stops
+    like a killed process would, without finishing the job.
+
+    """
+
+    monkeypatch.setattr(renamejobs.JobQueue, "COMMIT_INTERVAL", 1)
+    run = queue.run(exiftool)
+    job, results = next(run)
+    while results[0].status != exiftoolwrap.RENAME_STATUS_RENAMED:
+        job, results = next(run)
+    run.close()
+
+
+def test_run_renames_and_finishes_the_jobs(exiftool, tmp_path):
+    card = make_card(tmp_path / "card")
+    queue = renamejobs.JobQueue(str(tmp_path / "jobs"))
+    queued_job = queue.add(str(card), "", "*.*", True)
+
+    results = [result for job, results in queue.run(exiftool) for result in results]
+
+    assert list_names(card) == NAMES + ["notes.txt"]
+    assert sorted(result.status for result in results) == (
+        [exiftoolwrap.RENAME_STATUS_RENAMED] * 3 + [exiftoolwrap.RENAME_STATUS_WARNING])
+    assert queue.get_pending_jobs() == []
+    assert open(queued_job.path).read().endswith('["finished"]\n')
+
+
+def test_jobs_run_by_priority_then_in_order(tmp_path):
+    queue = renamejobs.JobQueue(str(tmp_path / "jobs"))
+    first = queue.add(str(tmp_path / "a"), "", "*.*", True)
+    second = queue.add(str(tmp_path / "b"), "", "*.*", True)
+    urgent = queue.add(str(tmp_path / "c"), "", "*.*", True, priority=1)
+
+    assert [job.id for job in queue.get_pending_jobs()] == [urgent.id, first.id, second.id]
+
+
+def test_resume_doesnt_read_the_metadata_again(exiftool, tmp_path, monkeypatch):
+    card = make_card(tmp_path / "card")
+    queue = renamejobs.JobQueue(str(tmp_path / "jobs"))
+    job = queue.add(str(card), "", "*.*", True)
+    interrupt_after_first_batch(queue, exiftool, monkeypatch)
+    assert list_names(card) == [NAMES[0], "IMG_0001.jpg", "IMG_0002.jpg", "notes.txt"]
+
+    # Renamed before the process died, but not journaled
+    os.rename(card / "IMG_0001.jpg", card / NAMES[1])
+    # Half a line written when the process died
+    with open(job.path, "a") as journal:
+        journal.write('["done","IMG_')
+
+    def plan_renames(*args, **kwargs):
+        raise AssertionError("The plan is read from the journal")
+    monkeypatch.setattr(exiftool, "plan_renames", plan_renames)
+    results = [result for job, results in queue.run(exiftool) for result in results]
+
+    assert list_names(card) == NAMES + ["notes.txt"]
+    assert [result.status for result in results] == [exiftoolwrap.RENAME_STATUS_RENAMED] * 2
+    assert queue.get_pending_jobs() == []
+
+
+def test_unplanned_job_is_planned_again(exiftool, tmp_path):
+    card = make_card(tmp_path / "card")
+    queue = renamejobs.JobQueue(str(tmp_path / "jobs"))
+    job = queue.add(str(card), "", "*.*", True)
+    with open(job.path, "a") as journal:
+        journal.write('["plan","IMG_0000.jpg","%s"]\n["plan","IMG' % NAMES[0])
+
+    for job, results in queue.run(exiftool):
+        pass
+
+    assert list_names(card) == NAMES + ["notes.txt"]
+
+
+def test_resumed_renames_report_their_source_tag(exiftool, tmp_path, monkeypatch):
+    card = make_card(tmp_path / "card")
+    exiftool.set_date_tags(["DateTimeOriginal", "FileModifyDate"])
+    queue = renamejobs.JobQueue(str(tmp_path / "jobs"))
+    queue.add(str(card), "", "*.jpg", True)
+    interrupt_after_first_batch(queue, exiftool, monkeypatch)
+
+    results = [result for job, results in queue.run(exiftool) for result in results]
+
+    assert [result.message for result in results] == ["from DateTimeOriginal"] * 2
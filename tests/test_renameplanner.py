@@ -0,0 +1,98 @@
+"""Copy numbers and rename ordering of renameplanner."""
+
+# Internal
+import renameplanner
+from media import list_names, write_file
+
+
+def test_copy_numbers_follow_exiftool(tmp_path):
+    write_file(tmp_path / "A.jpg")
+    files = [str(write_file(tmp_path / name)) for name in ("1.jpg", "2.jpg", "3.JPG")]
+    planner = renameplanner.RenamePlanner()
+
+    new_files = [planner.add(file, "A") for file in files]
+
+    assert new_files == [str(tmp_path / "A-1.jpg"), str(tmp_path / "A-2.jpg"),
+                         str(tmp_path / "A.JPG")]
+
+
+def test_file_already_named_keeps_its_name(tmp_path):
+    file = str(write_file(tmp_path / "A-1.jpg"))
+    write_file(tmp_path / "A.jpg")
+    planner = renameplanner.RenamePlanner()
+
+    assert planner.add(file, "A") == None
+    assert planner.add(str(write_file(tmp_path / "B.jpg")), "A") == str(tmp_path / "A-2.jpg")
+
+
+def test_copy_number_freed_by_a_rename_is_reused(tmp_path):
+    first = str(write_file(tmp_path / "A.jpg"))
+    second = str(write_file(tmp_path / "B.jpg"))
+    planner = renameplanner.RenamePlanner()
+
+    assert planner.add(first, "C") == str(tmp_path / "C.jpg")
+    assert planner.add(second, "A") == str(tmp_path / "A.jpg")
+
+
+def test_group_gets_a_copy_number_free_for_all_its_files(tmp_path):
+    write_file(tmp_path / "A.xmp")
+    files = [str(write_file(tmp_path / "IMG.CR2")), str(write_file(tmp_path / "IMG.xmp"))]
+    planner = renameplanner.RenamePlanner()
+
+    new_files = planner.add_group(files, "A")
+
+    assert new_files == [str(tmp_path / "A-1.CR2"), str(tmp_path / "A-1.xmp")]
+
+
+def test_copy_number_freed_by_a_group_is_reused(tmp_path):
+    extensions = [".CR2", ".CR2.xmp"]
+    def write_group(stem):
+        return [str(write_file(tmp_path / (stem + extension))) for extension in extensions]
+    write_group("A")
+    a1 = write_group("A-1")
+    x = write_group("X")
+    y = write_group("Y")
+    planner = renameplanner.RenamePlanner()
+
+    assert planner.add_group(x, "A", extensions) == [str(tmp_path / "A-2.CR2"),
+                                                     str(tmp_path / "A-2.CR2.xmp")]
+    assert planner.add_group(a1, "B", extensions) == [str(tmp_path / "B.CR2"),
+                                                      str(tmp_path / "B.CR2.xmp")]
+    assert planner.add_group(y, "A", extensions) == [str(tmp_path / "A-1.CR2"),
+                                                     str(tmp_path / "A-1.CR2.xmp")]
+
+
+def test_execute_renames_breaks_cycles(tmp_path):
+    a = str(write_file(tmp_path / "a", b"a"))
+    b = str(write_file(tmp_path / "b", b"b"))
+    c = str(write_file(tmp_path / "c", b"c"))
+
+    results = renameplanner.execute_renames([(a, b), (b, c), (c, a)])
+
+    assert [error for file, new_file, error in results] == [None, None, None]
+    assert (tmp_path / "a").read_bytes() == b"c"
+    assert (tmp_path / "b").read_bytes() == b"a"
+    assert (tmp_path / "c").read_bytes() == b"b"
+    assert list_names(tmp_path) == ["a", "b", "c"]
+
+
+def test_execute_renames_orders_chains(tmp_path):
+    a = str(write_file(tmp_path / "a", b"a"))
+    b = str(write_file(tmp_path / "b", b"b"))
+    c = str(tmp_path / "c")
+
+    results = renameplanner.execute_renames([(a, b), (b, c)])
+
+    assert [(file, new_file) for file, new_file, error in results] == [(b, c), (a, b)]
+    assert (tmp_path / "b").read_bytes() == b"a"
+    assert (tmp_path / "c").read_bytes() == b"b"
+
+
+def test_execute_renames_never_overwrites(tmp_path):
+    a = str(write_file(tmp_path / "a", b"a"))
+    b = str(write_file(tmp_path / "b", b"b"))
+
+    results = renameplanner.execute_renames([(a, b)])
+
+    assert results[0][2].startswith("File already exists")
+    assert (tmp_path / "b").read_bytes() == b"b"
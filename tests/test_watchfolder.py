@@ -0,0 +1,136 @@
+"""New arrivals reported by FolderWatcher, with inotify and by polling."""
+
+# Public
+import os
+import queue
+import threading
+
+import pytest
+
+# Internal
+import watchfolder
+from media import write_file
+
+
+SETTLE_TIME = 0.1
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def make_watcher(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(watchfolder, "_create_inotify_events", lambda path: None)
+
+    watchers = []
+
+    def make_watcher(path, file_types=("*.*",)):
+        watcher = watchfolder.FolderWatcher(str(path), file_types, SETTLE_TIME)
+        watchers.append(watcher)
+        return watcher
+
+    yield make_watcher
+    for watcher in watchers:
+        watcher.close()
+
+
+def start_batches(watcher):
+    """Iterates over watcher.batches() in a thread, as it never ends. The
+    thread stops when the watcher is closed, or with the tests when polling.
+
+    return: function returning the next batch, failing the test if none comes
+            within a few seconds
+
+    """
+
+    batches = queue.Queue()
+
+    def iterate():
+        try:
+            for batch in watcher.batches():
+                batches.put(batch)
+        except (OSError, ValueError):
+            pass # Closed
+
+    threading.Thread(target=iterate, daemon=True).start()
+    return lambda: batches.get(timeout=5)
+
+
+def test_reports_new_files_only(make_watcher, tmp_path):
+    write_file(tmp_path / "old.jpg")
+    next_batch = start_batches(make_watcher(tmp_path))
+
+    new_file = write_file(tmp_path / "new.jpg")
+
+    assert next_batch() == [str(new_file)]
+
+
+def test_reports_the_wanted_types_only(make_watcher, tmp_path):
+    next_batch = start_batches(make_watcher(tmp_path, ["*.jpg"]))
+
+    write_file(tmp_path / "notes.txt")
+    write_file(tmp_path / ".hidden.jpg")
+    write_file(tmp_path / "b.JPG")
+    write_file(tmp_path / "a.jpg")
+
+    files = next_batch()
+    if len(files) < 2:
+        # Settled at different times
+        files += next_batch()
+    assert sorted(files) == [str(tmp_path / "a.jpg"), str(tmp_path / "b.JPG")]
+
+
+def test_ignored_files_arent_reported(make_watcher, tmp_path):
+    watcher = make_watcher(tmp_path)
+    next_batch = start_batches(watcher)
+    file = write_file(tmp_path / "IMG_0001.jpg")
+    assert next_batch() == [str(file)]
+
+    # What the rename does with the reported file
+    renamed = str(tmp_path / "X.jpg")
+    watcher.ignore([renamed])
+    os.rename(file, renamed)
+    other = write_file(tmp_path / "IMG_0002.jpg")
+
+    assert next_batch() == [str(other)]
+
+
+def test_written_files_arent_new(make_watcher, tmp_path):
+    old_file = write_file(tmp_path / "old.jpg")
+    watcher = make_watcher(tmp_path)
+    next_batch = start_batches(watcher)
+    file = write_file(tmp_path / "IMG_0001.jpg")
+    assert next_batch() == [str(file)]
+    renamed = str(tmp_path / "X.jpg")
+    watcher.ignore([renamed])
+    os.rename(file, renamed)
+
+    with open(old_file, "ab") as f:
+        f.write(b"more")
+    with open(renamed, "ab") as f:
+        f.write(b"more")
+    other = write_file(tmp_path / "IMG_0002.jpg")
+
+    assert next_batch() == [str(other)]
+
+
+def test_rescan_after_lost_events_reports_new_files_only(tmp_path, monkeypatch):
+    write_file(tmp_path / "old.jpg")
+    watcher = watchfolder.FolderWatcher(str(tmp_path), settle_time=SETTLE_TIME)
+    if watcher._events == None:
+        pytest.skip("inotify isn't available")
+    read = watcher._events.read
+    reads = []
+
+    def read_losing_events(timeout):
+        reads.append(timeout)
+        names = read(timeout)
+        if len(reads) == 1:
+            # Like an overflow of the event queue
+            return None
+        return names
+
+    monkeypatch.setattr(watcher._events, "read", read_losing_events)
+    new_file = write_file(tmp_path / "new.jpg")
+    try:
+        assert start_batches(watcher)() == [str(new_file)]
+    finally:
+        watcher.close()
@@ -0,0 +1,301 @@
+"""Watches a folder for new files to rename.
+
+Tethered cameras and card readers keep dropping files in the same folder.
+FolderWatcher reports the new files once they are completely written, in
+small batches, so they can be renamed as they arrive:
+
+    watcher = FolderWatcher(path, ["*.jpg"], settle_time=2)
+    for files in watcher.batches():
+        ...rename files...
+        watcher.ignore(new_files)
+
+inotify is used on Linux. Elsewhere the folder is polled, and only rescanned
+when its modification time changes.
+
+"""
+
+# Public
+import os
+import os.path
+import select
+import struct
+import sys
+import time
+
+# Internal
+import dirscan
+
+
+class FolderWatcher:
+    """Reports new files of a folder (non recursive) once they are settled.
+
+    A file is settled when its size and modification time didn't change for
+    settle_time seconds. Only the files created or moved in after the
+    watcher is created are reported, writing to the others doesn't make them
+    new.
+
+    """
+
+    # Default number of seconds a file must stay unchanged
+    DEFAULT_SETTLE_TIME = 2.0
+
+    # Maximum number of files per batch
+    MAX_BATCH_SIZE = 500
+
+    _path = None
+    _file_types = None
+    _settle_time = DEFAULT_SETTLE_TIME
+    _poll_interval = None
+    _events = None
+
+    # Names seen in the folder, to tell the new files when it is rescanned
+    _known_names = None
+    _folder_mtime_ns = None
+
+    # Names of the files we are waiting on, to ((size, mtime_ns), time of
+    # the last change)
+    _candidates = None
+
+
+    def __init__(self, path, file_types=("*.*",), settle_time=DEFAULT_SETTLE_TIME):
+        """
+        Parameters:
+            path: folder to watch
+
+            file_types: file patterns of the files to report, see
+                       dirscan.scan_files()
+
+            settle_time: seconds a file must stay unchanged before it is
+                       reported. This drives the latency: files are reported
+                       at most about 1.5 times that long after their last
+                       write.
+
+        """
+
+        self._path = path
+        self._file_types = dirscan.parse_file_types(file_types)
+        self._settle_time = settle_time
+        self._poll_interval = max(settle_time / 4, 0.05)
+        self._candidates = {}
+
+        self._events = _create_inotify_events(path)
+        if self._events == None:
+            self._folder_mtime_ns = os.stat(path).st_mtime_ns
+        self._known_names = set(self._list_names())
+
+
+    #
+    # Public
+    #
+
+    def batches(self):
+        """Generator that yields lists of settled new files, forever."""
+
+        while True:
+            new_names, written_names = self._wait_for_changes(self._poll_interval)
+            for name in new_names:
+                if self._is_wanted(name):
+                    self._candidates.setdefault(name, (None, 0))
+
+            # Writes only delay the files we are already waiting on
+            now = time.monotonic()
+            for name in written_names:
+                if name in self._candidates:
+                    self._candidates[name] = (self._candidates[name][0], now)
+
+            settled_files = self._pop_settled_files()
+            while settled_files:
+                yield settled_files[:self.MAX_BATCH_SIZE]
+                settled_files = settled_files[self.MAX_BATCH_SIZE:]
+
+
+    def ignore(self, files):
+        """Don't report files, typically because we just renamed them."""
+
+        for file in files:
+            name = os.path.basename(file)
+            self._candidates.pop(name, None)
+            self._known_names.add(name)
+
+
+    def close(self):
+        if self._events != None:
+            self._events.close()
+            self._events = None
+
+    #
+    # Private
+    #
+
+    def _wait_for_changes(self, timeout):
+        """return: (names of the files that appeared, names of the files
+                   written to) since the last call. Only inotify reports the
+                   writes, polling relies on _pop_settled_files().
+
+        """
+
+        if self._events != None:
+            events = self._events.read(timeout)
+            if events != None:
+                return self._apply_events(events)
+            # The event queue overflowed. Rescan the folder.
+        else:
+            time.sleep(timeout)
+            try:
+                mtime_ns = os.stat(self._path).st_mtime_ns
+            except OSError:
+                return set(), set()
+            if mtime_ns == self._folder_mtime_ns:
+                return set(), set()
+            self._folder_mtime_ns = mtime_ns
+
+        names = set(self._list_names())
+        new_names = names - self._known_names
+        self._known_names = names
+        return new_names, set()
+
+
+    def _apply_events(self, events):
+        """return: same as _wait_for_changes()"""
+
+        new_names = set()
+        written_names = set()
+        for change, name in events:
+            if change == _InotifyEvents.ADDED:
+                # Files we renamed are known already, see ignore()
+                if name not in self._known_names:
+                    self._known_names.add(name)
+                    new_names.add(name)
+            elif change == _InotifyEvents.REMOVED:
+                self._known_names.discard(name)
+                new_names.discard(name)
+            else:
+                written_names.add(name)
+        return new_names, written_names
+
+
+    def _pop_settled_files(self):
+        now = time.monotonic()
+        settled_names = []
+        for name, (observation, last_change) in list(self._candidates.items()):
+            try:
+                stat = os.stat(os.path.join(self._path, name))
+            except OSError:
+                # Gone already (ex. moved away)
+                del self._candidates[name]
+                continue
+
+            new_observation = (stat.st_size, stat.st_mtime_ns)
+            if new_observation != observation:
+                self._candidates[name] = (new_observation, now)
+            elif now - last_change >= self._settle_time:
+                del self._candidates[name]
+                settled_names.append(name)
+
+        return [os.path.join(self._path, name) for name in sorted(settled_names)]
+
+
+    def _list_names(self):
+        try:
+            with os.scandir(self._path) as it:
+                return [entry.name for entry in it if entry.is_file()]
+        except OSError:
+            return []
+
+
+    def _is_wanted(self, name):
+        if name.startswith("."):
+            return False
+        extensions, patterns = self._file_types
+        return dirscan.has_file_type(name, extensions, patterns)
+
+
+class _InotifyEvents:
+    """Minimal ctypes binding of Linux inotify for a single folder."""
+
+    # Changes reported by read()
+    ADDED = "added"
+    REMOVED = "removed"
+    WRITTEN = "written"
+
+    _IN_MODIFY = 0x00000002
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    _fd = None
+
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        mask = (self._IN_MODIFY | self._IN_CLOSE_WRITE | self._IN_MOVED_FROM
+                | self._IN_MOVED_TO | self._IN_CREATE | self._IN_DELETE)
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+
+    def read(self, timeout):
+        """return: list of (change, name) for the events received within
+                   timeout seconds, in order. change is ADDED, REMOVED or
+                   WRITTEN. None if events were lost.
+
+        """
+
+        events = []
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return events
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += self._EVENT_HEADER.size
+            if mask & self._IN_Q_OVERFLOW:
+                return None
+            name = data[offset:offset + length].rstrip(b"\x00")
+            offset += length
+            if not name:
+                continue
+            if mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                change = self.ADDED
+            elif mask & (self._IN_DELETE | self._IN_MOVED_FROM):
+                change = self.REMOVED
+            else:
+                change = self.WRITTEN
+            events.append((change, os.fsdecode(name)))
+        return events
+
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _create_inotify_events(path):
+    """return: an _InotifyEvents or None if inotify isn't available"""
+
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _InotifyEvents(path)
+    except (OSError, AttributeError):
+        return None